@@ -0,0 +1,423 @@
+# Copyright (c) 2020 Uber Technologies, Inc.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+"""
+Micro-benchmarks for the per-call overhead of the client hooks.
+
+Every case runs the same call twice under an active parent span: once
+against the unpatched library ("baseline") and once with the hook
+installed ("traced"). Only local stand-ins are used: an in-process HTTP
+server, fakeredis and sqlite. Cases whose library is not installed are
+skipped.
+
+With pytest-benchmark, which stores the results as JSON under
+``.benchmarks/`` and can compare them between runs:
+
+.. code-block:: shell
+
+    py.test benchmarks/bench_client_hooks.py --no-cov \\
+        --benchmark-autosave --benchmark-compare
+
+As a standalone script, writing the per-call overhead of every hook
+as JSON to stdout or to the given file:
+
+.. code-block:: shell
+
+    python benchmarks/bench_client_hooks.py --output results.json
+"""
+from __future__ import absolute_import, print_function
+
+from future import standard_library
+standard_library.install_aliases()
+from builtins import object
+import abc
+import argparse
+import contextlib
+import http.server
+import json
+import platform
+import sqlite3
+import sys
+import threading
+import time
+import timeit
+
+import opentracing
+import six
+from basictracer.recorder import SpanRecorder
+from basictracer.tracer import BasicTracer
+from opentracing.scope_managers import ThreadLocalScopeManager
+
+from opentracing_instrumentation import span_in_context, traced_function
+from opentracing_instrumentation.client_hooks._dbapi2 import CursorWrapper
+from opentracing_instrumentation.http_server import before_request
+from opentracing_instrumentation.http_server import WSGIRequestWrapper
+
+try:
+    import pytest  # only needed to run the cases with pytest-benchmark
+except ImportError:
+    pytest = None
+
+
+class _NullRecorder(SpanRecorder):
+    """Drops finished spans, so that memory use stays flat."""
+
+    def record_span(self, span):
+        pass
+
+
+@contextlib.contextmanager
+def traced_environment():
+    """
+    Install a sampling BasicTracer as the global tracer and activate
+    a parent span for the duration of the block.
+    """
+    tracer = BasicTracer(recorder=_NullRecorder(),
+                         scope_manager=ThreadLocalScopeManager())
+    tracer.register_required_propagators()
+    old_tracer, opentracing.tracer = opentracing.tracer, tracer
+    try:
+        parent = tracer.start_span(operation_name='benchmark')
+        with span_in_context(parent):
+            yield tracer
+    finally:
+        opentracing.tracer = old_tracer
+
+
+@six.add_metaclass(abc.ABCMeta)
+class BenchmarkCase(object):
+    """
+    A call that can be run with and without the client hook installed.
+    """
+
+    name = None
+
+    @property
+    def available(self):
+        return True
+
+    def setup(self):
+        pass
+
+    def teardown(self):
+        pass
+
+    @abc.abstractmethod
+    def install(self):
+        pass
+
+    @abc.abstractmethod
+    def uninstall(self):
+        pass
+
+    @abc.abstractmethod
+    def call(self):
+        pass
+
+
+class _QuietHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class RequestsCase(BenchmarkCase):
+    name = 'requests.send_wrapper'
+
+    @property
+    def available(self):
+        from opentracing_instrumentation.client_hooks import requests
+        return requests.patcher.applicable
+
+    def setup(self):
+        import requests
+        self.server = http.server.HTTPServer(('127.0.0.1', 0), _QuietHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.url = 'http://127.0.0.1:%d/' % self.server.server_port
+        self.session = requests.Session()
+
+    def teardown(self):
+        self.session.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def install(self):
+        from opentracing_instrumentation.client_hooks import requests
+        requests.install_patches()
+
+    def uninstall(self):
+        from opentracing_instrumentation.client_hooks import requests
+        requests.reset_patches()
+
+    def call(self):
+        self.session.get(self.url)
+
+
+class StrictRedisCase(BenchmarkCase):
+    name = 'strict_redis.execute_command'
+
+    @property
+    def available(self):
+        try:
+            import fakeredis  # noqa
+        except ImportError:
+            return False
+        return True
+
+    def setup(self):
+        import fakeredis
+        self.client = fakeredis.FakeStrictRedis()
+        self.client.set('key', 'value')
+
+    def install(self):
+        from opentracing_instrumentation.client_hooks import strict_redis
+        strict_redis.install_patches()
+
+    def uninstall(self):
+        from opentracing_instrumentation.client_hooks import strict_redis
+        strict_redis.reset_patches()
+
+    def call(self):
+        self.client.get('key')
+
+
+class CursorWrapperCase(BenchmarkCase):
+    name = '_dbapi2.CursorWrapper.execute'
+
+    def setup(self):
+        self.connection = sqlite3.connect(':memory:')
+        self.raw_cursor = self.connection.cursor()
+        self.cursor = self.raw_cursor
+
+    def teardown(self):
+        self.connection.close()
+
+    def install(self):
+        self.cursor = CursorWrapper(cursor=self.raw_cursor,
+                                    module_name='sqlite3')
+
+    def uninstall(self):
+        self.cursor = self.raw_cursor
+
+    def call(self):
+        self.cursor.execute('SELECT 1')
+
+
+class SQLAlchemyCase(BenchmarkCase):
+    name = 'SQLAlchemyPatcher.before_cursor_execute'
+
+    @property
+    def available(self):
+        from opentracing_instrumentation.client_hooks import sqlalchemy
+        return sqlalchemy.patcher.applicable
+
+    def setup(self):
+        import sqlalchemy
+        self.engine = sqlalchemy.create_engine('sqlite://')
+        self.connection = self.engine.connect()
+        self.statement = sqlalchemy.text('SELECT 1')
+
+    def teardown(self):
+        self.connection.close()
+        self.engine.dispose()
+
+    def install(self):
+        from opentracing_instrumentation.client_hooks import sqlalchemy
+        sqlalchemy.install_patches()
+
+    def uninstall(self):
+        from opentracing_instrumentation.client_hooks import sqlalchemy
+        sqlalchemy.reset_patches()
+
+    def call(self):
+        self.connection.execute(self.statement).fetchall()
+
+
+def _noop(*args, **kwargs):
+    pass
+
+
+class TracedFunctionCase(BenchmarkCase):
+    name = 'traced_function'
+
+    def setup(self):
+        self.func = _noop
+
+    def install(self):
+        self.func = traced_function(_noop)
+
+    def uninstall(self):
+        self.func = _noop
+
+    def call(self):
+        self.func(1, key='value')
+
+
+class BeforeRequestCase(BenchmarkCase):
+    """
+    There is no unpatched counterpart on the server side, so the baseline
+    is empty and the traced call covers everything a middleware does.
+    """
+
+    name = 'http_server.before_request'
+
+    def setup(self):
+        self.environ = {
+            'wsgi.url_scheme': 'http',
+            'REQUEST_METHOD': 'GET',
+            'SCRIPT_NAME': '',
+            'PATH_INFO': '/api/v1/users/12345',
+            'QUERY_STRING': 'fields=name,email',
+            'SERVER_NAME': 'localhost',
+            'SERVER_PORT': '8080',
+            'REMOTE_ADDR': '10.0.0.1',
+            'REMOTE_PORT': '54321',
+            'HTTP_HOST': 'localhost:8080',
+            'HTTP_ACCEPT': 'application/json',
+            'HTTP_USER_AGENT': 'benchmark/1.0',
+            'HTTP_COOKIE': 'session=' + 'x' * 512,
+            'HTTP_AUTHORIZATION': 'Bearer ' + 'y' * 256,
+        }
+        self.func = _noop
+
+    def install(self):
+        self.func = self._before_request
+
+    def uninstall(self):
+        self.func = _noop
+
+    def _before_request(self):
+        request = WSGIRequestWrapper.from_wsgi_environ(self.environ)
+        before_request(request=request).finish()
+
+    def call(self):
+        self.func()
+
+
+CASES = [
+    RequestsCase(),
+    StrictRedisCase(),
+    CursorWrapperCase(),
+    SQLAlchemyCase(),
+    TracedFunctionCase(),
+    BeforeRequestCase(),
+]
+
+
+if pytest is not None:
+    @pytest.fixture(params=CASES, ids=lambda case: case.name)
+    def case(request):
+        case = request.param
+        if not case.available:
+            pytest.skip('%s is not available' % case.name)
+        case.setup()
+        try:
+            yield case
+        finally:
+            case.teardown()
+
+    @pytest.mark.parametrize('traced', [False, True],
+                             ids=['baseline', 'traced'])
+    def test_client_hook_overhead(benchmark, case, traced):
+        benchmark.group = case.name
+        with traced_environment():
+            if not traced:
+                benchmark(case.call)
+                return
+            case.install()
+            try:
+                benchmark(case.call)
+            finally:
+                case.uninstall()
+
+
+def _time_per_call(func, number, repeat):
+    # the minimum is the least noisy estimate, see timeit docs
+    timer = timeit.Timer(func)
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def measure(case, number, repeat):
+    """
+    Measure the per-call time of the case with and without the hook.
+
+    :return: a dict with the times in microseconds
+    """
+    case.setup()
+    try:
+        with traced_environment():
+            # warm up connections, caches and lazily computed attributes
+            case.call()
+            baseline = _time_per_call(case.call, number, repeat)
+            case.install()
+            try:
+                case.call()
+                traced = _time_per_call(case.call, number, repeat)
+            finally:
+                case.uninstall()
+    finally:
+        case.teardown()
+    return {
+        'baseline_us': baseline * 1e6,
+        'traced_us': traced * 1e6,
+        'overhead_us': (traced - baseline) * 1e6,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--number', type=int, default=1000,
+                        help='calls per timing run (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='timing runs per case (default: %(default)s)')
+    parser.add_argument('--output', help='write JSON to this file')
+    args = parser.parse_args(argv)
+
+    results = {}
+    for case in CASES:
+        if not case.available:
+            print('skipping %s: not available' % case.name, file=sys.stderr)
+            continue
+        results[case.name] = measure(case, args.number, args.repeat)
+
+    report = json.dumps({
+        'timestamp': time.time(),
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'number': args.number,
+        'repeat': args.repeat,
+        'results': results,
+    }, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report + '\n')
+    else:
+        print(report)
+
+
+if __name__ == '__main__':
+    main()
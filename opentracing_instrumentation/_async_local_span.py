@@ -0,0 +1,125 @@
+# Copyright (c) 2020 Uber Technologies, Inc.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+# traced_function wrappers for native coroutines and async generators.
+# This module uses Python 3.6+ syntax and must only be imported there.
+# The arguments are normalized by traced_function: on_start is either
+# a callable or None.
+
+import functools
+import inspect
+
+from . import get_current_span, local_span, span_in_context, utils
+
+
+def _start_span(operation_name, parent_span, on_start, args, kwargs):
+    span = utils.start_child_span(
+        operation_name=operation_name, parent=parent_span)
+    if on_start is not None:
+        on_start(span, *args, **kwargs)
+    return span
+
+
+def traced_coroutine_function(func, operation_name, on_start,
+                              require_active_trace):
+    """
+    Wrap an `async def` function, so that the span covers the awaited time
+    of the coroutine and is its current span while it runs.
+    """
+
+    @functools.wraps(func)
+    async def decorator(*args, **kwargs):
+        parent_span = get_current_span()
+        if require_active_trace and parent_span is None:
+            return await func(*args, **kwargs)
+
+        span = _start_span(operation_name, parent_span, on_start, args, kwargs)
+        try:
+            with span_in_context(span):
+                return await func(*args, **kwargs)
+        except Exception as e:
+            local_span._log_exception(span, e)
+            raise
+        finally:
+            span.finish()
+    return decorator
+
+
+def traced_async_generator_function(func, operation_name, on_start,
+                                    require_active_trace):
+    """
+    Wrap an async generator function, so that the span lasts until the
+    generator is exhausted or closed. The span is current only while the
+    generator computes the next item, not while the caller consumes it.
+
+    Like `yield from` in PEP 380, the values sent with `asend()` and the
+    exceptions thrown with `athrow()` are passed on to the generator.
+    """
+
+    @functools.wraps(func)
+    async def decorator(*args, **kwargs):
+        parent_span = get_current_span()
+        if require_active_trace and parent_span is None:
+            span = None
+        else:
+            span = _start_span(
+                operation_name, parent_span, on_start, args, kwargs)
+        agen = None
+        try:
+            agen = func(*args, **kwargs)
+            resume, value = agen.asend, None
+            while True:
+                with span_in_context(span):
+                    try:
+                        item = await resume(value)
+                    except StopAsyncIteration:
+                        break
+                try:
+                    value = yield item
+                    resume = agen.asend
+                except GeneratorExit:
+                    raise  # aclose(), handled below
+                except BaseException as e:
+                    resume, value = agen.athrow, e
+        except Exception as e:
+            if span is not None:
+                local_span._log_exception(span, e)
+            raise
+        finally:
+            try:
+                if agen is not None:
+                    # the caller may have stopped iterating early
+                    await agen.aclose()
+            finally:
+                if span is not None:
+                    span.finish()
+    return decorator
+
+
+def get_async_wrapper_factory(func):
+    """
+    :return: the traced_function wrapper factory for a native coroutine or
+        async generator function, or None for other callables
+    """
+    if inspect.iscoroutinefunction(func):
+        return traced_coroutine_function
+    if inspect.isasyncgenfunction(func):
+        return traced_async_generator_function
+    return None
@@ -36,6 +36,8 @@ def install_all_patches():
 
     If a specific module is not available on the path, it is ignored.
     """
+    from . import aiopg
+    from . import asyncpg
     from . import boto3
     from . import celery
     from . import mysqldb
@@ -47,6 +49,8 @@ def install_all_patches():
     from . import urllib2
     from . import requests
 
+    aiopg.install_patches()
+    asyncpg.install_patches()
     boto3.install_patches()
     celery.install_patches()
     mysqldb.install_patches()
@@ -0,0 +1,118 @@
+# Copyright (c) 2020 Uber Technologies, Inc.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+# Async counterparts of the DB API v2 utils, for the asyncio drivers.
+# This module uses Python 3.6+ syntax and must only be imported there.
+#
+# The statements are traced with the same db_span() as the sync drivers,
+# so that the spans get the same operation names and tags. db_span() only
+# starts a child span without activating it, so it can wrap an await.
+
+import functools
+
+from ._current_span import current_span_func
+from ._dbapi2 import db_span, _BEGIN, _COMMIT, _ROLLBACK
+
+_TRANSACTION_STATEMENTS = {
+    'BEGIN': _BEGIN,
+    'START': _BEGIN,
+    'COMMIT': _COMMIT,
+    'END': _COMMIT,
+    'ROLLBACK': _ROLLBACK,
+    'ABORT': _ROLLBACK,
+}
+
+
+def transaction_statement(sql_statement):
+    """
+    Async drivers run the transaction statements like any other, so map
+    them to the statements that db_span() names like the `begin()`,
+    `commit()` and `rollback()` of the sync drivers. Savepoints are left
+    alone.
+
+    :param sql_statement: SQL statement string
+    :return: one of 'begin-trans', 'commit' and 'rollback', or the statement
+    """
+    # only the first words are normalized, statements can be long
+    words = [word.rstrip(';').upper()
+             for word in sql_statement.split(None, 3)[:3]]
+    if not words:
+        return sql_statement
+    transaction = _TRANSACTION_STATEMENTS.get(words[0])
+    if transaction is None:
+        return sql_statement
+    if words[0] == 'START' and words[1:2] != ['TRANSACTION']:
+        return sql_statement
+    if 'TO' in words[1:]:  # ROLLBACK [WORK] TO SAVEPOINT
+        return sql_statement
+    return transaction
+
+
+def traced_coroutine_method(method, module_name, statement_args,
+                            executemany=False):
+    """
+    Wrap a coroutine method of a driver in a db_span().
+
+    :param method: the `async def` function to wrap
+    :param module_name: the prefix of the operation names, e.g. 'asyncpg'
+    :param statement_args: a function that takes the arguments of the
+        method, including self, and returns a tuple of the SQL statement
+        and its parameters
+    :param executemany: whether the parameters are a sequence of parameters
+    """
+
+    @functools.wraps(method)
+    async def traced_method(self, *args, **kwargs):
+        if current_span_func() is None:
+            return await method(self, *args, **kwargs)
+        try:
+            sql_statement, sql_parameters = \
+                statement_args(self, *args, **kwargs)
+        except TypeError:  # let the driver report the wrong arguments
+            return await method(self, *args, **kwargs)
+
+        with db_span(sql_statement=transaction_statement(sql_statement),
+                     sql_parameters=sql_parameters,
+                     module_name=module_name,
+                     executemany=executemany):
+            return await method(self, *args, **kwargs)
+    return traced_method
+
+
+def patch_method(orig_methods, cls, name, module_name, statement_args,
+                 executemany=False):
+    """
+    Replace a coroutine method of a driver class by its traced version.
+    Patching the classes rather than wrapping the connections means that
+    connections from the driver's pools are traced as well.
+
+    :param orig_methods: dict in which to record the original method,
+        keyed by (class, method name)
+    """
+    method = cls.__dict__[name]
+    orig_methods[(cls, name)] = method
+    setattr(cls, name, traced_coroutine_method(
+        method, module_name, statement_args, executemany))
+
+
+def reset_methods(orig_methods):
+    for (cls, name), method in orig_methods.items():
+        setattr(cls, name, method)
+    orig_methods.clear()
@@ -19,15 +19,27 @@
 # THE SOFTWARE.
 from __future__ import absolute_import
 from builtins import object
+import itertools
+import logging
+import re
+import time
 import contextlib2
+import six
 import wrapt
+if six.PY2:
+    from collections import Sequence
+else:
+    from collections.abc import Sequence
 
 from opentracing.ext import tags as ext_tags
 
 from ._current_span import current_span_func
 from .. import utils
+from ..config import CONFIG
 from ..local_span import func_span
 
+log = logging.getLogger(__name__)
+
 # Utils for instrumenting DB API v2 compatible drivers.
 # PEP-249 - https://www.python.org/dev/peps/pep-0249/
 
@@ -38,12 +50,209 @@ _TRANS_TAGS = [_BEGIN, _COMMIT, _ROLLBACK]
 
 NO_ARG = object()
 
+# Parsed statements are cached, since applications tend to run the same
+# few hundred statements over and over. Longer statements, e.g. bulk
+# inserts with inlined values, bypass the cache to keep its memory bounded,
+# and are not fingerprinted, which would take several regex passes over
+# the whole statement.
+SQL_CACHE_SIZE = 1024
+SQL_CACHE_MAX_STATEMENT_LENGTH = 4096
+
+# Policies for recording the parameters of statements,
+# see CONFIG.sql_params_policy and sql_params_tags()
+PARAMS_ALL = 'all'
+PARAMS_OFF = 'off'
+PARAMS_COUNT = 'count'
+PARAMS_FIRST_ROWS = 'first_rows'
+PARAMS_BYTE_BUDGET = 'byte_budget'
+_PARAMS_POLICIES = (PARAMS_ALL, PARAMS_OFF, PARAMS_COUNT, PARAMS_FIRST_ROWS,
+                    PARAMS_BYTE_BUDGET)
+_DEFAULT_PARAMS_POLICY = PARAMS_ALL
+_DEFAULT_EXECUTEMANY_PARAMS_POLICY = PARAMS_COUNT
+# The misconfigured policies that have been warned about
+_invalid_policies = set()
+
+# The size of executemany() parameters is extrapolated from the first rows
+_SIZE_SAMPLE_ROWS = 10
+# The byte budget is spent on at most this many rows, which bounds the
+# work for batches of empty rows
+_BYTE_BUDGET_MAX_ROWS = 1000
+
+_STRING_LITERAL_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL_RE = re.compile(r'(?<![\w$.])\d+(?:\.\d+)?\b')
+_WHITESPACE_RE = re.compile(r'\s+')
+_FIRST_WORD_RE = re.compile(r'\s*(\S*)\s')
+
+
+def sql_fingerprint(statement):
+    """
+    Normalize the SQL statement by replacing string and numeric literals
+    with `?` and collapsing whitespace, so that statements which differ
+    only in their inlined values share the same fingerprint.
+
+    :param statement: SQL statement string
+    :return: interned fingerprint
+    """
+    fingerprint = _STRING_LITERAL_RE.sub('?', statement)
+    fingerprint = _NUMBER_LITERAL_RE.sub('?', fingerprint)
+    fingerprint = _WHITESPACE_RE.sub(' ', fingerprint).strip()
+    if isinstance(fingerprint, str):  # Python 2 cannot intern unicode
+        fingerprint = six.moves.intern(fingerprint)
+    return fingerprint
+
+
+def _value_size(value):
+    if value is None:
+        return 0
+    if isinstance(value, (six.text_type, six.binary_type, bytearray)):
+        return len(value)
+    if isinstance(value, (bool, float) + six.integer_types):
+        return 8
+    return len(str(value))
+
+
+def _row_size(row):
+    if isinstance(row, dict):
+        row = row.values()
+    elif not isinstance(row, (list, tuple)):
+        return _value_size(row)
+    return sum(_value_size(value) for value in row)
+
+
+def _configured_params_policy(many):
+    """
+    :return: the configured policy, or the default policy if the
+        configured one is invalid, so that a tracing setting does not
+        break the statements of the application
+    """
+    if many:
+        policy = CONFIG.sql_executemany_params_policy
+        default = _DEFAULT_EXECUTEMANY_PARAMS_POLICY
+    else:
+        policy = CONFIG.sql_params_policy
+        default = _DEFAULT_PARAMS_POLICY
+    if policy in _PARAMS_POLICIES:
+        return policy
+    if policy not in _invalid_policies:
+        _invalid_policies.add(policy)
+        log.warning('SQL parameters policy must be one of %s, got %r, '
+                    'using %r', ', '.join(_PARAMS_POLICIES), policy, default)
+    return default
+
+
+def sql_params_tags(parameters, many=False, policy=None):
+    """
+    Build the span tags for the parameters of a statement, according to a
+    capture policy:
+
+    * 'all' records the parameters as they are, in the `sql.params` tag
+    * 'off' records nothing
+    * 'count' records the estimated size of the parameters, in bytes, in the
+      `sql.params.size` tag, and for executemany() the number of rows in the
+      `sql.params.rows` tag
+    * 'first_rows' additionally records the first `CONFIG.sql_params_max_rows`
+      rows of executemany(), or the parameters of a single statement
+    * 'byte_budget' additionally records as many rows as fit into
+      `CONFIG.sql_params_max_bytes`, up to 1000 rows
+
+    Only the sizes of the first few rows of executemany() are measured, and
+    parameters that are not a sequence, such as generators, are not
+    inspected at all, since they could be consumed only once.
+
+    :param parameters: the parameters of execute() or callproc(), or the
+        sequence of parameters of executemany()
+    :param many: whether the parameters are those of executemany()
+    :param policy: the capture policy, defaults to
+        `CONFIG.sql_executemany_params_policy` if `many` is true, and
+        to `CONFIG.sql_params_policy` otherwise. An invalid configured
+        policy is logged and replaced by the default policy.
+    :return: dict of tags
+    """
+    if policy is None:
+        policy = _configured_params_policy(many)
+    elif policy not in _PARAMS_POLICIES:
+        raise ValueError('SQL parameters policy must be one of %s, got %r' %
+                         (', '.join(_PARAMS_POLICIES), policy))
+    if policy == PARAMS_ALL:
+        return {'sql.params': parameters}
+    if policy == PARAMS_OFF:
+        return {}
+
+    if not many:
+        size = _row_size(parameters)
+        tags = {'sql.params.size': size}
+        within_budget = size <= CONFIG.sql_params_max_bytes
+        if policy == PARAMS_FIRST_ROWS or (
+                policy == PARAMS_BYTE_BUDGET and within_budget):
+            tags['sql.params'] = parameters
+        return tags
+
+    if not isinstance(parameters, Sequence):
+        return {}
+    rows = len(parameters)
+    sample = parameters[:_SIZE_SAMPLE_ROWS]
+    sample_size = sum(_row_size(row) for row in sample)
+    tags = {
+        'sql.params.rows': rows,
+        'sql.params.size': sample_size * rows // len(sample) if sample else 0,
+    }
+    if policy == PARAMS_FIRST_ROWS:
+        tags['sql.params'] = parameters[:CONFIG.sql_params_max_rows]
+    elif policy == PARAMS_BYTE_BUDGET:
+        budget = CONFIG.sql_params_max_bytes
+        captured = 0
+        for row in itertools.islice(parameters, _BYTE_BUDGET_MAX_ROWS):
+            budget -= _row_size(row)
+            if budget < 0:
+                break
+            captured += 1
+        if captured:
+            tags['sql.params'] = parameters[:captured]
+    return tags
+
+
+def _parse_sql_statement(module_name, sql_statement):
+    """
+    :return: a tuple of the span operation name and the value of the `sql`
+        tag, which is None for transaction statements
+    """
+    if bytes is not str and isinstance(sql_statement, bytes):
+        sql_statement = sql_statement.decode('utf-8', errors='ignore')
+
+    if sql_statement in _TRANS_TAGS:
+        return '%s:%s' % (module_name, sql_statement), None
+
+    fingerprint = sql_fingerprint(sql_statement)
+    space_idx = fingerprint.find(' ')
+    if space_idx == -1:
+        operation = ''  # unrecognized format of the query
+    else:
+        operation = fingerprint[0:space_idx]
+    return '%s:%s' % (module_name, operation), fingerprint
+
+
+_parse_cached_sql_statement = \
+    utils.lru_cache(maxsize=SQL_CACHE_SIZE)(_parse_sql_statement)
+
+
+def _parse_long_sql_statement(module_name, sql_statement):
+    """
+    Like `_parse_sql_statement`, but the `sql` tag is the statement itself
+    rather than its fingerprint.
+    """
+    if bytes is not str and isinstance(sql_statement, bytes):
+        sql_statement = sql_statement.decode('utf-8', errors='ignore')
+    match = _FIRST_WORD_RE.match(sql_statement)
+    operation = match.group(1) if match else ''
+    return '%s:%s' % (module_name, operation), sql_statement.strip()
+
 
 def db_span(sql_statement,
             module_name,
             sql_parameters=None,
             connect_params=None,
-            cursor_params=None):
+            cursor_params=None,
+            executemany=False):
     span = current_span_func()
 
     @contextlib2.contextmanager
@@ -53,39 +262,74 @@ def db_span(sql_statement,
     if span is None:
         return empty_ctx_mgr()
 
-    if bytes is not str and isinstance(sql_statement, bytes):
-        sql_statement = sql_statement.decode('utf-8', errors='ignore')
+    if utils.is_unsampled(span):
+        return utils.start_child_span(operation_name=module_name, parent=span)
 
-    statement = sql_statement.strip()
-    add_sql_tag = True
-    if sql_statement in _TRANS_TAGS:
-        operation = sql_statement
-        add_sql_tag = False
+    if len(sql_statement) > SQL_CACHE_MAX_STATEMENT_LENGTH:
+        operation_name, sql_tag = _parse_long_sql_statement(
+            module_name, sql_statement)
     else:
-        space_idx = statement.find(' ')
-        if space_idx == -1:
-            operation = ''  # unrecognized format of the query
-        else:
-            operation = statement[0:space_idx]
+        operation_name, sql_tag = _parse_cached_sql_statement(
+            module_name, sql_statement)
 
     tags = {ext_tags.SPAN_KIND: ext_tags.SPAN_KIND_RPC_CLIENT}
-    if add_sql_tag:
-        tags['sql'] = statement
+    if sql_tag is not None:
+        tags['sql'] = sql_tag
     if sql_parameters:
-        tags['sql.params'] = sql_parameters
+        tags.update(sql_params_tags(sql_parameters, many=executemany))
     if connect_params:
         tags['sql.conn'] = connect_params
     if cursor_params:
         tags['sql.cursor'] = cursor_params
 
     return utils.start_child_span(
-        operation_name='%s:%s' % (module_name, operation),
-        parent=span, tags=tags
+        operation_name=operation_name, parent=span, tags=tags
     )
 
 
+class _FetchSpan(object):
+    """
+    Aggregates the fetches of one result set into one span, which lasts
+    from the first fetch until the result set is exhausted or discarded.
+    The time spent in the fetch calls themselves is recorded separately,
+    so that slow consumers can be told apart from slow queries.
+    """
+    __slots__ = ('span', 'rows', 'batches', 'fetch_time')
+
+    def __init__(self, module_name):
+        parent = current_span_func()
+        if parent is None:
+            self.span = None
+        else:
+            self.span = utils.start_child_span(
+                operation_name='%s:fetch' % module_name, parent=parent,
+                tags={ext_tags.SPAN_KIND: ext_tags.SPAN_KIND_RPC_CLIENT})
+        self.rows = 0
+        self.batches = 0
+        self.fetch_time = 0.0
+
+    def record(self, fetch_time, rows):
+        self.fetch_time += fetch_time
+        self.rows += rows
+        self.batches += 1
+
+    def finish(self, error=None):
+        span = self.span
+        if span is None:
+            return
+        self.span = None
+        span.set_tag('sql.fetch.rows', self.rows)
+        span.set_tag('sql.fetch.batches', self.batches)
+        span.set_tag('sql.fetch.time_ms', self.fetch_time * 1000)
+        if error is not None:
+            span.set_tag(ext_tags.ERROR, True)
+            span.log(event='exception', payload=error)
+        span.finish()
+
+
 class CursorWrapper(wrapt.ObjectProxy):
-    __slots__ = ('_module_name', '_connect_params', '_cursor_params')
+    __slots__ = ('_module_name', '_connect_params', '_cursor_params',
+                 '_trace_fetches', '_fetch_span')
 
     def __init__(self, cursor, module_name,
                  connect_params=None, cursor_params=None):
@@ -93,10 +337,117 @@ class CursorWrapper(wrapt.ObjectProxy):
         self._module_name = module_name
         self._connect_params = connect_params
         self._cursor_params = cursor_params
+        self._trace_fetches = CONFIG.sql_trace_fetches and \
+            self._is_server_side()
+        self._fetch_span = None
         # We could also start a span now and then override close() to capture
         # the life time of the cursor
 
+    def _is_server_side(self):
+        """
+        Whether the rows are fetched from the server by the fetch calls,
+        rather than when the statement is executed, so that the fetches
+        are worth tracing. Overridden by the wrappers of drivers that
+        support server-side cursors.
+        """
+        return False
+
+    def _start_fetch(self):
+        if self._fetch_span is None:
+            self._fetch_span = _FetchSpan(self._module_name)
+        return time.time()
+
+    def _finish_fetch(self, error=None):
+        fetch_span, self._fetch_span = self._fetch_span, None
+        if fetch_span is not None:
+            fetch_span.finish(error)
+
+    def fetchone(self):
+        if not self._trace_fetches:
+            return self.__wrapped__.fetchone()
+        start_time = self._start_fetch()
+        try:
+            row = self.__wrapped__.fetchone()
+        except Exception as error:
+            self._finish_fetch(error)
+            raise
+        rows = 0 if row is None else 1
+        self._fetch_span.record(time.time() - start_time, rows)
+        if row is None:
+            self._finish_fetch()
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        if not self._trace_fetches:
+            return self.__wrapped__.fetchmany(*args, **kwargs)
+        start_time = self._start_fetch()
+        try:
+            rows = self.__wrapped__.fetchmany(*args, **kwargs)
+        except Exception as error:
+            self._finish_fetch(error)
+            raise
+        self._fetch_span.record(time.time() - start_time, len(rows))
+        if not rows:
+            self._finish_fetch()
+        return rows
+
+    def fetchall(self):
+        if not self._trace_fetches:
+            return self.__wrapped__.fetchall()
+        start_time = self._start_fetch()
+        try:
+            rows = self.__wrapped__.fetchall()
+        except Exception as error:
+            self._finish_fetch(error)
+            raise
+        self._fetch_span.record(time.time() - start_time, len(rows))
+        self._finish_fetch()
+        return rows
+
+    def __iter__(self):
+        if not self._trace_fetches:
+            return iter(self.__wrapped__)
+        return self._traced_iter()
+
+    def _traced_iter(self):
+        # one batch for the whole iteration, since the driver fetches
+        # the rows in batches of its own. The counters are updated per
+        # row, so that they are right even if the caller stops iterating
+        # early and the span is finished by close() or the next execute.
+        self._start_fetch()
+        fetch_span = self._fetch_span
+        fetch_span.batches += 1
+        iterator = iter(self.__wrapped__)
+        while True:
+            start_time = time.time()
+            try:
+                row = next(iterator)
+            except StopIteration:
+                break
+            except Exception as error:
+                self._finish_fetch(error)
+                raise
+            finally:
+                fetch_span.fetch_time += time.time() - start_time
+            fetch_span.rows += 1
+            yield row
+        if self._fetch_span is fetch_span:
+            self._finish_fetch()
+
+    def close(self):
+        self._finish_fetch()
+        return self.__wrapped__.close()
+
+    def __enter__(self):
+        self.__wrapped__.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self._finish_fetch()
+        return self.__wrapped__.__exit__(exc_type, exc_value, tb)
+
     def execute(self, sql, params=NO_ARG):
+        self._finish_fetch()
         with db_span(sql_statement=sql,
                      sql_parameters=params if params is not NO_ARG else None,
                      module_name=self._module_name,
@@ -108,13 +459,16 @@ class CursorWrapper(wrapt.ObjectProxy):
                 return self.__wrapped__.execute(sql, params)
 
     def executemany(self, sql, seq_of_parameters):
+        self._finish_fetch()
         with db_span(sql_statement=sql, sql_parameters=seq_of_parameters,
                      module_name=self._module_name,
                      connect_params=self._connect_params,
-                     cursor_params=self._cursor_params):
+                     cursor_params=self._cursor_params,
+                     executemany=True):
             return self.__wrapped__.executemany(sql, seq_of_parameters)
 
     def callproc(self, proc_name, params=NO_ARG):
+        self._finish_fetch()
         with db_span(sql_statement='sproc:%s' % proc_name,
                      sql_parameters=params if params is not NO_ARG else None,
                      module_name=self._module_name,
@@ -0,0 +1,73 @@
+# Copyright (c) 2020 Uber Technologies, Inc.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+# Patches for the asyncio clients of redis-py 4.2+ and aioredis 2.x, which
+# share their API. This module uses Python 3.6+ syntax and must only be
+# imported there.
+
+from .strict_redis import command_span, pipeline_span
+
+METHOD_NAMES = ['execute_command']
+PIPELINE_METHOD_NAMES = ['execute', 'immediate_execute_command']
+
+
+def _traced_execute_command(orig):
+    async def execute_command(self, cmd, *args, **kwargs):
+        with command_span(self, cmd, args):
+            return await orig(self, cmd, *args, **kwargs)
+    return execute_command
+
+
+def _traced_execute(orig):
+    async def execute(self, *args, **kwargs):
+        span = pipeline_span(self)
+        if span is None:
+            return await orig(self, *args, **kwargs)
+        with span:
+            return await orig(self, *args, **kwargs)
+    return execute
+
+
+_WRAPPERS = {
+    'execute_command': _traced_execute_command,
+    # WATCH and the commands issued while watching, before MULTI,
+    # bypass the pipeline's command stack
+    'immediate_execute_command': _traced_execute_command,
+    'execute': _traced_execute,
+}
+
+
+def install_patches(client_module, orig_methods):
+    """
+    Patch the Redis and Pipeline classes of an asyncio client module.
+
+    The spans are started when the command is awaited, so their parent is
+    the span that is current in the awaiting task.
+
+    :param client_module: `redis.asyncio.client` or `aioredis.client`
+    :param orig_methods: dict in which to record the original methods,
+        keyed by (class, method name)
+    """
+    for cls, names in ((client_module.Redis, METHOD_NAMES),
+                       (client_module.Pipeline, PIPELINE_METHOD_NAMES)):
+        for name in names:
+            orig = getattr(cls, name)
+            orig_methods[(cls, name)] = orig
+            setattr(cls, name, _WRAPPERS[name](orig))
@@ -0,0 +1,85 @@
+# Copyright (c) 2020 Uber Technologies, Inc.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+# Support for the asyncio extension of SQLAlchemy 1.4+. This module uses
+# Python 3.6+ syntax and must only be imported there.
+#
+# AsyncEngine, AsyncConnection and AsyncSession run the sync Engine and
+# Session in greenlets, via greenlet_spawn(), so the engine events fire as
+# usual, but inside a greenlet. Unless the greenlet shares the context of
+# the awaiting task, which depends on the versions of SQLAlchemy and
+# greenlet, the current span of the task is not visible there. The span is
+# therefore carried across explicitly.
+
+import functools
+import importlib
+
+import opentracing
+
+from .. import get_current_span, span_in_context
+from ..request_context import ContextVarsScopeManager
+
+ASYNC_MODULES = [
+    'sqlalchemy.ext.asyncio.engine',
+    'sqlalchemy.ext.asyncio.result',
+    'sqlalchemy.ext.asyncio.session',
+]
+
+
+def _carries_span():
+    # Scope managers that keep the active span in a thread-local would be
+    # corrupted by activations inside greenlets of interleaved tasks, and
+    # AsyncioScopeManager sees the task from the greenlet anyway.
+    # ContextVarsScopeManager is None without contextvars.
+    return ContextVarsScopeManager is not None and isinstance(
+        opentracing.tracer.scope_manager, ContextVarsScopeManager)
+
+
+def _traced_greenlet_spawn(greenlet_spawn):
+    @functools.wraps(greenlet_spawn)
+    async def traced_greenlet_spawn(fn, *args, **kwargs):
+        span = get_current_span()
+        if span is None or not _carries_span():
+            return await greenlet_spawn(fn, *args, **kwargs)
+
+        def run_in_span(*args, **kwargs):
+            with span_in_context(span):
+                return fn(*args, **kwargs)
+        return await greenlet_spawn(run_in_span, *args, **kwargs)
+    return traced_greenlet_spawn
+
+
+def install_patches(orig_functions):
+    """
+    Patch greenlet_spawn() in the modules of the asyncio extension.
+
+    :param orig_functions: dict in which to record the original functions,
+        keyed by module
+    """
+    for module_name in ASYNC_MODULES:
+        module = importlib.import_module(module_name)
+        orig_functions[module] = module.greenlet_spawn
+        module.greenlet_spawn = _traced_greenlet_spawn(module.greenlet_spawn)
+
+
+def reset_patches(orig_functions):
+    for module, greenlet_spawn in orig_functions.items():
+        module.greenlet_spawn = greenlet_spawn
+    orig_functions.clear()
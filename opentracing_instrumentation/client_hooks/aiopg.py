@@ -0,0 +1,66 @@
+# Copyright (c) 2020 Uber Technologies, Inc.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+from __future__ import absolute_import
+import logging
+
+from ._patcher import Patcher
+
+log = logging.getLogger(__name__)
+
+try:
+    import aiopg.connection
+except ImportError:
+    aiopg = None
+else:
+    from . import _async_dbapi2
+
+MODULE_NAME = 'aiopg'
+
+
+def _execute_args(cursor, operation, parameters=None, **kwargs):
+    return operation, parameters
+
+
+def _callproc_args(cursor, procname, parameters=None, **kwargs):
+    return 'sproc:%s' % procname, parameters
+
+
+class AiopgPatcher(Patcher):
+    applicable = aiopg is not None
+
+    def __init__(self):
+        super(AiopgPatcher, self).__init__()
+        self.original_methods = {}
+
+    def _install_patches(self):
+        log.info('Instrumenting aiopg methods for tracing')
+        # aiopg.sa and the pools run the statements through Cursor too
+        cursor_class = aiopg.connection.Cursor
+        _async_dbapi2.patch_method(self.original_methods, cursor_class,
+                                   'execute', MODULE_NAME, _execute_args)
+        _async_dbapi2.patch_method(self.original_methods, cursor_class,
+                                   'callproc', MODULE_NAME, _callproc_args)
+
+    def _reset_patches(self):
+        _async_dbapi2.reset_methods(self.original_methods)
+
+
+AiopgPatcher.configure_hook_module(globals())
@@ -0,0 +1,130 @@
+# Copyright (c) 2020 Uber Technologies, Inc.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+from __future__ import absolute_import
+import logging
+
+from ._patcher import Patcher
+
+log = logging.getLogger(__name__)
+
+try:
+    import asyncpg.connection
+    import asyncpg.prepared_stmt
+except ImportError:
+    asyncpg = None
+else:
+    from . import _async_dbapi2
+
+MODULE_NAME = 'asyncpg'
+
+
+def _query_args(connection, query, *args, **kwargs):
+    return query, args
+
+
+def _executemany_args(connection, command, args, **kwargs):
+    return command, args
+
+
+def _prepare_args(connection, query, **kwargs):
+    return 'PREPARE %s' % query, None
+
+
+def _table(table_name, schema_name=None):
+    if schema_name:
+        return '%s.%s' % (schema_name, table_name)
+    return table_name
+
+
+def _copy_records_args(connection, table_name, records=None,
+                       schema_name=None, **kwargs):
+    return 'COPY %s FROM STDIN' % _table(table_name, schema_name), records
+
+
+def _copy_to_table_args(connection, table_name, schema_name=None, **kwargs):
+    return 'COPY %s FROM STDIN' % _table(table_name, schema_name), None
+
+
+def _copy_from_table_args(connection, table_name, schema_name=None,
+                          **kwargs):
+    return 'COPY %s TO STDOUT' % _table(table_name, schema_name), None
+
+
+def _copy_from_query_args(connection, query, *args, **kwargs):
+    return 'COPY (%s) TO STDOUT' % query, args
+
+
+def _statement_args(statement, *args, **kwargs):
+    return statement.get_query(), args
+
+
+def _statement_executemany_args(statement, args, **kwargs):
+    return statement.get_query(), args
+
+
+# (method name, statement_args, executemany)
+CONNECTION_METHODS = [
+    ('execute', _query_args, False),
+    ('executemany', _executemany_args, True),
+    ('fetch', _query_args, False),
+    ('fetchrow', _query_args, False),
+    ('fetchval', _query_args, False),
+    ('prepare', _prepare_args, False),
+    ('copy_records_to_table', _copy_records_args, True),
+    ('copy_to_table', _copy_to_table_args, False),
+    ('copy_from_table', _copy_from_table_args, False),
+    ('copy_from_query', _copy_from_query_args, False),
+]
+
+PREPARED_STATEMENT_METHODS = [
+    ('fetch', _statement_args, False),
+    ('fetchrow', _statement_args, False),
+    ('fetchval', _statement_args, False),
+    ('executemany', _statement_executemany_args, True),
+]
+
+
+class AsyncpgPatcher(Patcher):
+    applicable = asyncpg is not None
+
+    def __init__(self):
+        super(AsyncpgPatcher, self).__init__()
+        self.original_methods = {}
+
+    def _install_patches(self):
+        log.info('Instrumenting asyncpg methods for tracing')
+        self._patch_methods(asyncpg.connection.Connection, CONNECTION_METHODS)
+        self._patch_methods(asyncpg.prepared_stmt.PreparedStatement,
+                            PREPARED_STATEMENT_METHODS)
+
+    def _reset_patches(self):
+        _async_dbapi2.reset_methods(self.original_methods)
+
+    def _patch_methods(self, cls, methods):
+        for name, statement_args, executemany in methods:
+            # e.g. PreparedStatement.executemany() is new in asyncpg 0.22
+            if name in cls.__dict__:
+                _async_dbapi2.patch_method(
+                    self.original_methods, cls, name, MODULE_NAME,
+                    statement_args, executemany)
+
+
+AsyncpgPatcher.configure_hook_module(globals())
@@ -130,9 +130,10 @@ class Boto3Patcher(Patcher):
             parent=get_current_span()
         )
 
-        span.set_tag(tags.SPAN_KIND, tags.SPAN_KIND_RPC_CLIENT)
-        span.set_tag(tags.COMPONENT, 'boto3')
-        span.set_tag('boto3.service_name', service_name)
+        if not utils.is_unsampled(span):
+            span.set_tag(tags.SPAN_KIND, tags.SPAN_KIND_RPC_CLIENT)
+            span.set_tag(tags.COMPONENT, 'boto3')
+            span.set_tag('boto3.service_name', service_name)
 
         with span, span_in_stack_context(span):
             try:
@@ -0,0 +1,153 @@
+# Copyright (c) 2020 Uber Technologies, Inc.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+from __future__ import absolute_import
+
+import functools
+import logging
+import time
+
+from .. import utils
+from ._current_span import current_span_func
+from ._patcher import Patcher
+
+# Optional instrumentation of the connection pools, which is not installed
+# by install_all_patches(). The checkout spans record how long the caller
+# waited for a connection, and both checkout and checkin spans record the
+# state of the pool, so that pool sizes can be tuned from the traces.
+
+log = logging.getLogger(__name__)
+
+try:
+    from sqlalchemy.pool import QueuePool
+except ImportError:
+    QueuePool = None
+
+try:
+    import psycopg2.pool as psycopg2_pool
+except ImportError:
+    psycopg2_pool = None
+
+PSYCOPG2_POOL_CLASSES = ['SimpleConnectionPool', 'ThreadedConnectionPool']
+
+
+def sqlalchemy_pool_tags(pool):
+    """
+    :param pool: a `sqlalchemy.pool.QueuePool`
+    :return: list of (tag key, tag value) tuples with the configured size
+        of the pool, the number of connections opened beyond it and the
+        number of connections checked out
+    """
+    return [
+        ('db.pool.size', pool.size()),
+        # QueuePool.overflow() is negative while the pool is not full
+        ('db.pool.overflow', max(0, pool.overflow())),
+        ('db.pool.checked_out', pool.checkedout()),
+    ]
+
+
+def psycopg2_pool_tags(pool):
+    """
+    :param pool: a `psycopg2.pool.AbstractConnectionPool`
+    :return: list of (tag key, tag value) tuples with the maximum number of
+        connections of the pool, the number of connections opened beyond
+        `minconn` and the number of connections checked out. The last two
+        are read from private attributes of the pool and are left out if
+        a version of psycopg2 does not have them.
+    """
+    tags = [('db.pool.size', pool.maxconn)]
+    used = getattr(pool, '_used', None)
+    if used is None:
+        return tags
+    checked_out = len(used)
+    idle = getattr(pool, '_pool', None)
+    if idle is not None:
+        tags.append(('db.pool.overflow',
+                     max(0, checked_out + len(idle) - pool.minconn)))
+    tags.append(('db.pool.checked_out', checked_out))
+    return tags
+
+
+def _traced_pool_method(method, operation_name, pool_tags, checkout):
+    @functools.wraps(method)
+    def traced_method(pool, *args, **kwargs):
+        parent = current_span_func()
+        if parent is None:
+            return method(pool, *args, **kwargs)
+
+        span = utils.start_child_span(
+            operation_name=operation_name, parent=parent)
+        with span:
+            start_time = time.time()
+            try:
+                return method(pool, *args, **kwargs)
+            finally:
+                if not utils.is_unsampled(span):
+                    if checkout:
+                        span.set_tag('db.pool.wait_ms',
+                                     (time.time() - start_time) * 1000)
+                    for tag_key, tag_val in pool_tags(pool):
+                        span.set_tag(tag_key, tag_val)
+    return traced_method
+
+
+class DBPoolPatcher(Patcher):
+    applicable = QueuePool is not None or psycopg2_pool is not None
+
+    def __init__(self):
+        super(DBPoolPatcher, self).__init__()
+        self.original_methods = {}
+
+    def _install_patches(self):
+        if QueuePool is not None:
+            log.info('Instrumenting SQLAlchemy QueuePool for tracing')
+            self._patch(QueuePool, '_do_get', 'sqlalchemy:pool.checkout',
+                        sqlalchemy_pool_tags, checkout=True)
+            self._patch(QueuePool, '_do_return_conn',
+                        'sqlalchemy:pool.checkin', sqlalchemy_pool_tags,
+                        checkout=False)
+        if psycopg2_pool is not None:
+            log.info('Instrumenting psycopg2 connection pools for tracing')
+            for class_name in PSYCOPG2_POOL_CLASSES:
+                cls = getattr(psycopg2_pool, class_name)
+                self._patch(cls, 'getconn', 'psycopg2:pool.getconn',
+                            psycopg2_pool_tags, checkout=True)
+                self._patch(cls, 'putconn', 'psycopg2:pool.putconn',
+                            psycopg2_pool_tags, checkout=False)
+
+    def _reset_patches(self):
+        for (cls, name), method in self.original_methods.items():
+            setattr(cls, name, method)
+        self.original_methods.clear()
+
+    def _patch(self, cls, name, operation_name, pool_tags, checkout):
+        # the plain function, rather than a Python 2 unbound method
+        method = cls.__dict__.get(name)
+        if method is None:
+            # SQLAlchemy's _do_get and _do_return_conn are private
+            log.warning('Cannot instrument %s.%s, which does not exist in '
+                        'this version', cls.__name__, name)
+            return
+        self.original_methods[(cls, name)] = method
+        setattr(cls, name, _traced_pool_method(
+            method, operation_name, pool_tags, checkout))
+
+
+DBPoolPatcher.configure_hook_module(globals())
@@ -20,25 +20,34 @@
 
 from __future__ import absolute_import
 from ._dbapi2 import ContextManagerConnectionWrapper as ConnectionWrapper
-from ._dbapi2 import ConnectionFactory
+from ._dbapi2 import ConnectionFactory, CursorWrapper
 from ._patcher import Patcher
 
 # Try to save the original entry points
 try:
     import MySQLdb
+    import MySQLdb.cursors
 except ImportError:
     pass
 else:
     _MySQLdb_connect = MySQLdb.connect
 
 
+class MySQLdbCursorWrapper(CursorWrapper):
+    def _is_server_side(self):
+        # SSCursor and SSDictCursor fetch the rows from the server
+        return isinstance(self.__wrapped__,
+                          MySQLdb.cursors.CursorUseResultMixIn)
+
+
 class MySQLdbPatcher(Patcher):
     applicable = '_MySQLdb_connect' in globals()
 
     def _install_patches(self):
         factory = ConnectionFactory(connect_func=MySQLdb.connect,
                                     module_name='MySQLdb',
-                                    conn_wrapper_ctor=ConnectionWrapper)
+                                    conn_wrapper_ctor=ConnectionWrapper,
+                                    cursor_wrapper=MySQLdbCursorWrapper)
         MySQLdb.connect = factory
         if hasattr(MySQLdb, 'Connect'):
             MySQLdb.Connect = factory
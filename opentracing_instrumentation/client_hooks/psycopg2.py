@@ -41,6 +41,10 @@ class Psycopg2CursorWrapper(CursorWrapper):
     ``psycopg2.sql.Composable`` that should be represented as string before the
     executing.
     """
+    def _is_server_side(self):
+        # named cursors fetch the rows from the server
+        return self.__wrapped__.name is not None
+
     def execute(self, sql, params=NO_ARG):
         if isinstance(sql, Composable):
             sql = sql.as_string(self)
@@ -54,6 +58,20 @@ class Psycopg2CursorWrapper(CursorWrapper):
         )
 
 
+class Psycopg2ConnectionFactory(ConnectionFactory):
+    """
+    Asynchronous connections are driven by coroutine libraries like aiopg,
+    whose hooks trace the statements for the whole time they are awaited.
+    Wrapping those connections would only add spans of the submission of
+    the statements, so they are left alone.
+    """
+    def __call__(self, *args, **kwargs):
+        if kwargs.get('async_') or kwargs.get('async'):
+            return self._connect_func(*args, **kwargs)
+        return super(Psycopg2ConnectionFactory, self).__call__(
+            *args, **kwargs)
+
+
 @singleton
 def install_patches():
     if 'psycopg2' not in globals():
@@ -74,10 +92,10 @@ def install_patches():
     psycopg2.extensions.register_type = register_type
     psycopg2.extensions.quote_ident = quote_ident
 
-    factory = ConnectionFactory(connect_func=psycopg2.connect,
-                                module_name='psycopg2',
-                                conn_wrapper_ctor=ConnectionWrapper,
-                                cursor_wrapper=Psycopg2CursorWrapper)
+    factory = Psycopg2ConnectionFactory(connect_func=psycopg2.connect,
+                                        module_name='psycopg2',
+                                        conn_wrapper_ctor=ConnectionWrapper,
+                                        cursor_wrapper=Psycopg2CursorWrapper)
     setattr(psycopg2, 'connect', factory)
     if hasattr(psycopg2, 'Connect'):
         setattr(psycopg2, 'Connect', factory)
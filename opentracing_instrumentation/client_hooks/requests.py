@@ -98,6 +98,10 @@ class RequestsPatcher(Patcher):
         def add_header(self, key, value):
             self.request.headers[key] = value
 
+        @property
+        def header_carrier(self):
+            return self.request.headers
+
         @property
         def method(self):
             return self.request.method
@@ -27,57 +27,136 @@ from opentracing import tags
 
 from .. import utils
 from ._current_span import current_span_func
+from ._dbapi2 import SQL_CACHE_MAX_STATEMENT_LENGTH
 from ._patcher import Patcher
 
 log = logging.getLogger(__name__)
 
 try:
     from sqlalchemy.engine import Engine
+    from sqlalchemy.engine.default import DefaultExecutionContext
     from sqlalchemy import event
 except ImportError:
     pass
 
+try:
+    import sqlalchemy.ext.asyncio  # noqa
+except ImportError:  # SQLAlchemy < 1.4, Python 2, or greenlet is missing
+    _sqlalchemy_async = None
+else:
+    from . import _sqlalchemy_async
+
+# Operation names of the statements that have no compiled cache key, e.g.
+# textual SQL or any statement on SQLAlchemy < 1.4, keyed by the statement.
+# Longer statements bypass the cache, like in the DB API v2 hooks.
+OPERATION_CACHE_SIZE = 1024
+
+_OPERATION_ATTR = '_opentracing_operation'
+_ENGINE_TAGS_ATTR = '_opentracing_tags'
+
+
+def _operation_name(statement):
+    statement = statement.lstrip()
+    if not statement:
+        return 'SQL'
+    return 'SQL %s' % statement.split(' ', 1)[0].upper()
+
+
+_cached_operation_name = \
+    utils.lru_cache(maxsize=OPERATION_CACHE_SIZE)(_operation_name)
+
+
+def operation_name(statement, compiled):
+    """
+    :param statement: the SQL statement string
+    :param compiled: the `Compiled` object of the statement, or None
+    :return: the span operation name, e.g. 'SQL SELECT'
+    """
+    # SQLAlchemy 1.4+ reuses the compiled objects that have a cache key
+    # for all the executions of the same statement, so they carry the name
+    if getattr(compiled, 'cache_key', None) is not None:
+        name = compiled.__dict__.get(_OPERATION_ATTR)
+        if name is None:
+            name = _operation_name(statement)
+            setattr(compiled, _OPERATION_ATTR, name)
+        return name
+    if len(statement) > SQL_CACHE_MAX_STATEMENT_LENGTH:
+        return _operation_name(statement)
+    return _cached_operation_name(statement)
+
+
+def engine_tags(engine):
+    """
+    Fetch the tags shared by all spans of the engine, which are computed
+    once, since `repr(engine.url)` is slow.
+
+    :param engine: an `Engine`
+    :return: dict of tags, which must not be modified
+    """
+    engine_tags = engine.__dict__.get(_ENGINE_TAGS_ATTR)
+    if engine_tags is None:
+        engine_tags = {
+            tags.SPAN_KIND: tags.SPAN_KIND_RPC_CLIENT,
+            tags.COMPONENT: 'sqlalchemy',
+            tags.DATABASE_TYPE: engine.name,
+            tags.DATABASE_INSTANCE: repr(engine.url),
+        }
+        setattr(engine, _ENGINE_TAGS_ATTR, engine_tags)
+    return engine_tags
+
 
 class SQLAlchemyPatcher(Patcher):
     applicable = 'event' in globals()
 
+    def __init__(self):
+        super(SQLAlchemyPatcher, self).__init__()
+        self.original_async_functions = {}
+
     def _install_patches(self):
         log.info('Instrumenting SQLAlchemy for tracing')
+        # so that after_cursor_execute can read the attribute directly,
+        # even for the executions that started before the installation
+        DefaultExecutionContext.opentracing_span = None
         event.listen(Engine, 'before_cursor_execute',
                      self.before_cursor_execute)
         event.listen(Engine, 'after_cursor_execute',
                      self.after_cursor_execute)
+        if _sqlalchemy_async is not None:
+            _sqlalchemy_async.install_patches(self.original_async_functions)
 
     def _reset_patches(self):
         event.remove(Engine, 'before_cursor_execute',
                      self.before_cursor_execute)
         event.remove(Engine, 'after_cursor_execute',
                      self.after_cursor_execute)
+        del DefaultExecutionContext.opentracing_span
+        if _sqlalchemy_async is not None:
+            _sqlalchemy_async.reset_patches(self.original_async_functions)
 
     @staticmethod
     def before_cursor_execute(conn, cursor, statement, parameters, context,
                               executemany):
-        operation = 'SQL'
-        statement = statement.strip()
-        if statement:
-            operation = '%s %s' % (operation,
-                                   statement.split(' ', 1)[0].upper())
-        span = utils.start_child_span(
-            operation_name=operation, parent=current_span_func())
-        span.set_tag(tags.SPAN_KIND, tags.SPAN_KIND_RPC_CLIENT)
-        span.set_tag(tags.COMPONENT, 'sqlalchemy')
-        if conn.engine:
-            span.set_tag(tags.DATABASE_TYPE, conn.engine.name)
-            span.set_tag(tags.DATABASE_INSTANCE, repr(conn.engine.url))
-        if statement:
-            span.set_tag(tags.DATABASE_STATEMENT, statement)
-        context.opentracing_span = span
+        parent = current_span_func()
+        span_tags = None
+        if not utils.is_unsampled(parent):
+            engine = conn.engine
+            span_tags = dict(engine_tags(engine)) if engine else {
+                tags.SPAN_KIND: tags.SPAN_KIND_RPC_CLIENT,
+                tags.COMPONENT: 'sqlalchemy',
+            }
+            statement_tag = statement.strip()
+            if statement_tag:
+                span_tags[tags.DATABASE_STATEMENT] = statement_tag
+        context.opentracing_span = utils.start_child_span(
+            operation_name=operation_name(statement, context.compiled),
+            parent=parent, tags=span_tags)
 
     @staticmethod
     def after_cursor_execute(conn, cursor, statement, parameters, context,
                              executemany):
-        if hasattr(context, 'opentracing_span') and context.opentracing_span:
-            context.opentracing_span.finish()
+        span = context.opentracing_span
+        if span is not None:
+            span.finish()
             context.opentracing_span = None
 
 
@@ -0,0 +1,205 @@
+# Copyright (c) 2020 Uber Technologies, Inc.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+from __future__ import absolute_import
+
+import functools
+import logging
+import threading
+
+from opentracing.ext import tags as ext_tags
+
+from .. import span_in_context, utils
+from ._current_span import current_span_func
+from ._patcher import Patcher
+
+# Optional spans for the ORM operations that run SQL statements on behalf
+# of the application: Session.flush(), Session.commit() and the loads of
+# relationships by the lazy, selectin and subquery loader strategies.
+# They are not installed by install_all_patches(). Each span is tagged
+# with the number of statements executed within it and the number of rows
+# written or instances loaded, so that N+1 lazy-load storms show up as
+# many small lazyload spans with one statement each. Joined eager loads
+# are part of the statement of the parent query and get no span.
+
+log = logging.getLogger(__name__)
+
+try:
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    from sqlalchemy.orm import Mapper, Session
+    from sqlalchemy.orm.strategies import LazyLoader
+except ImportError:
+    pass
+else:
+    from sqlalchemy.orm.strategies import SubqueryLoader
+    try:
+        from sqlalchemy.orm.strategies import SelectInLoader
+    except ImportError:  # SQLAlchemy < 1.2
+        SelectInLoader = None
+
+try:
+    from contextvars import ContextVar
+except ImportError:
+    ContextVar = None
+
+
+class _Operation(object):
+    """Counts the statements and rows of an ORM operation."""
+    __slots__ = ('parent', 'statements', 'rows')
+
+    def __init__(self, parent):
+        self.parent = parent
+        self.statements = 0
+        self.rows = 0
+
+    def finish(self, span):
+        span.set_tag('sqlalchemy.statements', self.statements)
+        span.set_tag('sqlalchemy.rows', self.rows)
+        # the statements of a flush are also those of the enclosing commit
+        if self.parent is not None:
+            self.parent.statements += self.statements
+            self.parent.rows += self.rows
+
+
+# The innermost ORM operation in progress. Asyncio sessions run the ORM
+# in greenlets, which SQLAlchemy gives the context of the awaiting task.
+if ContextVar is not None:
+    _current_operation = ContextVar('opentracing_sqlalchemy_orm_operation',
+                                    default=None)
+    _get_operation = _current_operation.get
+    _set_operation = _current_operation.set
+else:
+    _local = threading.local()
+
+    def _get_operation():
+        return getattr(_local, 'operation', None)
+
+    def _set_operation(operation):
+        _local.operation = operation
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context,
+                          executemany):
+    operation = _get_operation()
+    if operation is not None:
+        operation.statements += 1
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context,
+                         executemany):
+    operation = _get_operation()
+    # the number of rows is only known for DML statements
+    if operation is not None and cursor.rowcount > 0:
+        operation.rows += cursor.rowcount
+
+
+def on_load(target, context):
+    operation = _get_operation()
+    if operation is not None:
+        operation.rows += 1
+
+
+def _traced_method(method, operation_name, span_tags=None, skip=None):
+    @functools.wraps(method)
+    def traced_method(self, *args, **kwargs):
+        parent_span = current_span_func()
+        if parent_span is None or (skip is not None and skip(self)):
+            return method(self, *args, **kwargs)
+
+        span = utils.start_child_span(
+            operation_name=operation_name, parent=parent_span,
+            tags=span_tags(self) if span_tags is not None else None)
+        operation = _Operation(_get_operation())
+        _set_operation(operation)
+        with span:
+            try:
+                with span_in_context(span):
+                    return method(self, *args, **kwargs)
+            finally:
+                _set_operation(operation.parent)
+                operation.finish(span)
+    return traced_method
+
+
+def _relationship_tags(loader):
+    return {
+        ext_tags.COMPONENT: 'sqlalchemy',
+        # e.g. 'User.addresses'
+        'sqlalchemy.relationship': str(loader.parent_property),
+    }
+
+
+def _component_tags(obj):
+    return {ext_tags.COMPONENT: 'sqlalchemy'}
+
+
+class SQLAlchemyORMPatcher(Patcher):
+    applicable = 'LazyLoader' in globals()
+
+    def __init__(self):
+        super(SQLAlchemyORMPatcher, self).__init__()
+        self.original_methods = {}
+
+    def _install_patches(self):
+        log.info('Instrumenting SQLAlchemy ORM for tracing')
+        event.listen(Engine, 'before_cursor_execute', before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', after_cursor_execute)
+        event.listen(Mapper, 'load', on_load)
+        # autoflush calls flush() before every query, but there is
+        # usually nothing to flush
+        self._patch(Session, 'flush', 'sqlalchemy:flush', _component_tags,
+                    skip=lambda session: session._is_clean())
+        self._patch(Session, 'commit', 'sqlalchemy:commit', _component_tags)
+        self._patch(LazyLoader, '_load_for_state', 'sqlalchemy:lazyload',
+                    _relationship_tags)
+        # one statement for the relationship of all the parent instances
+        if SelectInLoader is not None:
+            self._patch(SelectInLoader, '_load_for_path',
+                        'sqlalchemy:selectinload', _relationship_tags)
+        # the collections know the query, but not the relationship
+        subquery_collections = getattr(
+            SubqueryLoader, '_SubqCollections', None)
+        if subquery_collections is not None:
+            self._patch(subquery_collections, '_load',
+                        'sqlalchemy:subqueryload', _component_tags)
+
+    def _reset_patches(self):
+        event.remove(Engine, 'before_cursor_execute', before_cursor_execute)
+        event.remove(Engine, 'after_cursor_execute', after_cursor_execute)
+        event.remove(Mapper, 'load', on_load)
+        for (cls, name), method in self.original_methods.items():
+            setattr(cls, name, method)
+        self.original_methods.clear()
+
+    def _patch(self, cls, name, operation_name, span_tags, **kwargs):
+        # the plain function, rather than a Python 2 unbound method
+        method = cls.__dict__.get(name)
+        if method is None:
+            # the loader methods are private to SQLAlchemy
+            log.warning('Cannot instrument %s.%s, which does not exist in '
+                        'this version', cls.__name__, name)
+            return
+        self.original_methods[(cls, name)] = method
+        setattr(cls, name, _traced_method(
+            method, operation_name, span_tags, **kwargs))
+
+
+SQLAlchemyORMPatcher.configure_hook_module(globals())
@@ -20,8 +20,11 @@
 
 from __future__ import absolute_import
 
+from collections import Counter
 from opentracing.ext import tags as ext_tags
 import re
+import six
+import warnings
 
 from ._current_span import current_span_func
 from ._singleton import singleton
@@ -32,88 +35,314 @@ try:
 except ImportError:
     redis = None
 
+try:
+    from redis.asyncio import client as redis_asyncio_client  # redis-py 4.2+
+except ImportError:
+    redis_asyncio_client = None
+
+try:
+    from aioredis import client as aioredis_client  # aioredis 2.x
+except (ImportError, TypeError):
+    # aioredis 2.0 fails with TypeError on Python 3.11
+    aioredis_client = None
+
+try:
+    from types import MappingProxyType
+except ImportError:  # Python 2
+    MappingProxyType = dict
+
 
 # regex to match an ipv4 address
 IPV4_RE = re.compile(r'^\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}$')
 
-METHOD_NAMES = ['execute_command', 'get', 'set', 'setex', 'setnx']
+METHOD_NAMES = ['execute_command']
 ORIG_METHODS = {}
 
+PIPELINE_METHOD_NAMES = ['execute', 'immediate_execute_command']
+ORIG_PIPELINE_METHODS = {}
+
+# (class, method name) -> original method of the asyncio clients
+ORIG_ASYNC_METHODS = {}
+
+# Commands whose first key directly follows the command name
+_FIRST_ARG_KEY_COMMANDS = """
+    APPEND BITCOUNT BITFIELD BITPOS DECR DECRBY GET GETBIT GETDEL GETEX
+    GETRANGE GETSET INCR INCRBY INCRBYFLOAT MGET MSET MSETNX PSETEX SET
+    SETBIT SETNX SETRANGE STRLEN SUBSTR
+    COPY DEL DUMP EXISTS EXPIRE EXPIREAT MOVE PERSIST PEXPIRE PEXPIREAT PTTL
+    RENAME RENAMENX RESTORE SORT TOUCH TTL TYPE UNLINK WATCH
+    HDEL HEXISTS HGET HGETALL HINCRBY HINCRBYFLOAT HKEYS HLEN HMGET HMSET
+    HRANDFIELD HSCAN HSET HSETNX HSTRLEN HVALS
+    BLMOVE BLPOP BRPOP BRPOPLPUSH LINDEX LINSERT LLEN LMOVE LPOP LPOS LPUSH
+    LPUSHX LRANGE LREM LSET LTRIM RPOP RPOPLPUSH RPUSH RPUSHX
+    SADD SCARD SDIFF SDIFFSTORE SINTER SINTERSTORE SISMEMBER SMEMBERS
+    SMISMEMBER SMOVE SPOP SRANDMEMBER SREM SSCAN SUNION SUNIONSTORE
+    BZPOPMAX BZPOPMIN ZADD ZCARD ZCOUNT ZDIFFSTORE ZINCRBY ZINTERSTORE
+    ZLEXCOUNT ZMSCORE ZPOPMAX ZPOPMIN ZRANDMEMBER ZRANGE ZRANGEBYLEX
+    ZRANGEBYSCORE ZRANGESTORE ZRANK ZREM ZREMRANGEBYLEX ZREMRANGEBYRANK
+    ZREMRANGEBYSCORE ZREVRANGE ZREVRANGEBYLEX ZREVRANGEBYSCORE ZREVRANK
+    ZSCAN ZSCORE ZUNIONSTORE
+    PFADD PFCOUNT PFMERGE
+    GEOADD GEODIST GEOHASH GEOPOS GEORADIUS GEORADIUSBYMEMBER GEOSEARCH
+    GEOSEARCHSTORE
+    XACK XADD XAUTOCLAIM XCLAIM XDEL XLEN XPENDING XRANGE XREVRANGE XSETID
+    XTRIM
+""".split() + [
+    'DEBUG OBJECT', 'MEMORY USAGE', 'XGROUP CREATE', 'XGROUP CREATECONSUMER',
+    'XGROUP DELCONSUMER', 'XGROUP DESTROY', 'XGROUP SETID', 'XINFO CONSUMERS',
+    'XINFO GROUPS', 'XINFO STREAM',
+]
+
+# Commands whose first key follows another argument, such as the
+# operation of BITOP or the number of keys of ZUNION
+_SECOND_ARG_KEY_COMMANDS = ['BITOP', 'OBJECT', 'ZDIFF', 'ZINTER', 'ZUNION']
+
+# Command name -> tuple of (tag key, position of the tag value among the
+# arguments following the command name). Commands without an entry, such
+# as PING or EVAL, get no per-command tags.
+COMMAND_TAGS = {}
+COMMAND_TAGS.update(
+    (command, (('redis.key', 0), )) for command in _FIRST_ARG_KEY_COMMANDS)
+COMMAND_TAGS.update(
+    (command, (('redis.key', 1), )) for command in _SECOND_ARG_KEY_COMMANDS)
+COMMAND_TAGS['SETEX'] = (('redis.key', 0), ('redis.ttl', 1))
+
+
+_PEER_TAGS_ATTR = '_opentracing_peer_tags'
+
+
+def _build_peer_tags(connection_pool):
+    tags = {
+        ext_tags.SPAN_KIND: ext_tags.SPAN_KIND_RPC_CLIENT,
+        ext_tags.PEER_SERVICE: 'redis',
+    }
+    # cluster pools connect to several nodes and sentinel pools discover
+    # the master, so host and port may be missing
+    conn_info = getattr(connection_pool, 'connection_kwargs', None) or {}
+    host = conn_info.get('host')
+    if host:
+        if IPV4_RE.match(host):
+            tags[ext_tags.PEER_HOST_IPV4] = host
+        else:
+            tags[ext_tags.PEER_HOSTNAME] = host
+    port = conn_info.get('port')
+    if port:
+        tags[ext_tags.PEER_PORT] = port
+    path = conn_info.get('path')
+    if path:
+        tags[ext_tags.PEER_ADDRESS] = path
+    service_name = getattr(connection_pool, 'service_name', None)
+    if service_name:
+        tags['redis.sentinel.service'] = service_name
+    return MappingProxyType(tags)
+
+
+def peer_tags(connection_pool):
+    """
+    Fetch the tags shared by all spans of a connection pool: the span kind,
+    the peer service and the remote host/port.
+
+    They are computed once and cached on the pool, since they won't change.
+
+    :param connection_pool: a redis connection pool
+    :return: read-only mapping of tag keys to values
+    """
+    tags = getattr(connection_pool, _PEER_TAGS_ATTR, None)
+    if tags is None:
+        tags = _build_peer_tags(connection_pool)
+        try:
+            setattr(connection_pool, _PEER_TAGS_ATTR, tags)
+        except AttributeError:
+            pass
+    return tags
+
+
+def _client_peer_tags(self):
+    """
+    Deprecated, use `peer_tags(client.connection_pool)` instead.
+
+    :return: list of the peer host/port tags as (tag key, tag value)
+        tuples
+    """
+    warnings.warn('StrictRedis.peer_tags() is deprecated, use '
+                  'strict_redis.peer_tags(client.connection_pool)',
+                  DeprecationWarning, stacklevel=2)
+    tags = peer_tags(self.connection_pool)
+    return [(key, tags[key]) for key in (ext_tags.PEER_HOST_IPV4,
+                                         ext_tags.PEER_HOSTNAME,
+                                         ext_tags.PEER_PORT)
+            if key in tags]
+
+
+def _span_tags(client, parent):
+    if utils.is_unsampled(parent):
+        return None
+    # tracers may keep the dict they are given, so the cached peer tags
+    # are copied rather than passed as is
+    return dict(peer_tags(client.connection_pool))
+
+
+def command_tags(command, args):
+    """
+    :param command: the command name, e.g. 'GET'
+    :param args: the arguments following the command name
+    :return: tuple of (tag key, tag value) tuples, such as the key the
+        command operates on
+    """
+    positions = COMMAND_TAGS.get(command)
+    if positions is None:
+        if not isinstance(command, six.string_types) or command.isupper():
+            return ()
+        positions = COMMAND_TAGS.get(command.upper(), ())
+    return tuple((tag_key, args[position])
+                 for tag_key, position in positions
+                 if position < len(args))
+
+
+def _pipeline_class():
+    # redis-py 2.x keeps the pipeline logic in BasePipeline
+    return getattr(redis.client, 'BasePipeline', None) or \
+        redis.client.Pipeline
+
+
+def _arg_size(arg):
+    if isinstance(arg, six.text_type):
+        return len(arg.encode('utf-8'))
+    if isinstance(arg, (six.binary_type, bytearray, memoryview)):
+        return len(arg)
+    return len(str(arg))
+
+
+def pipeline_tags(commands):
+    """
+    Summarize the commands queued in a pipeline.
+
+    :param commands: the pipeline's command stack, a list of
+        `(args, options)` tuples
+    :return: list of (tag key, tag value) tuples with the number of
+        commands, a histogram of the command names (e.g. 'GET:2,SET:1')
+        and the size in bytes of the arguments
+    """
+    histogram = Counter()
+    payload_size = 0
+    for args, _ in commands:
+        command = args[0]
+        if isinstance(command, (six.binary_type, bytearray)):
+            command = command.decode('utf-8', 'replace')
+        histogram[command] += 1
+        for arg in args:
+            payload_size += _arg_size(arg)
+    return [
+        ('redis.pipeline.length', len(commands)),
+        ('redis.pipeline.commands', ','.join(
+            '%s:%d' % item for item in sorted(histogram.items()))),
+        ('redis.pipeline.payload_size', payload_size),
+    ]
+
+
+def command_span(client, cmd, args):
+    # All per-call state lives in local variables, so that a client
+    # shared between threads can be used concurrently
+    parent = current_span_func()
+    tags = _span_tags(client, parent)
+    if tags is not None:
+        # for certain commands we'll add extra attributes such as the
+        # redis key
+        tags.update(command_tags(cmd, args))
+    return utils.start_child_span(
+        operation_name='redis:%s' % (cmd,), parent=parent, tags=tags)
+
+
+def pipeline_span(pipeline):
+    """
+    Start the span of a pipeline's execution.
+
+    :param pipeline: a sync or asyncio pipeline
+    :return: the span, or None if the pipeline has nothing to execute
+    """
+    commands = pipeline.command_stack
+    if not commands and not pipeline.watching:
+        return None
+
+    # the commands are sent wrapped in MULTI/EXEC; on asyncio pipelines
+    # the flag is named is_transaction, as transaction is a method there
+    transaction = getattr(pipeline, 'is_transaction', None)
+    if transaction is None:
+        transaction = pipeline.transaction
+    transaction = bool(transaction or pipeline.explicit_transaction)
+    operation_name = 'redis:transaction' if transaction \
+        else 'redis:pipeline'
+    parent = current_span_func()
+    tags = _span_tags(pipeline, parent)
+    if tags is not None:
+        tags['redis.transaction'] = transaction
+        tags.update(pipeline_tags(commands))
+    return utils.start_child_span(
+        operation_name=operation_name, parent=parent, tags=tags)
+
+
+def _async_client_modules():
+    return [module for module in (redis_asyncio_client, aioredis_client)
+            if module is not None]
+
 
 @singleton
 def install_patches():
+    async_modules = _async_client_modules()
+    if async_modules:
+        from . import _redis_async
+        for module in async_modules:
+            _redis_async.install_patches(module, ORIG_ASYNC_METHODS)
+
     if redis is None:
         return
 
-    def peer_tags(self):
-        """Fetch the peer host/port tags for opentracing.
-
-        We do this lazily and cache the result since the host/port won't
-        change.
-        """
-        if not hasattr(self, '_peer_tags'):
-            self._peer_tags = []
-            conn_info = self.connection_pool.connection_kwargs
-            host = conn_info.get('host')
-            if host:
-                if IPV4_RE.match(host):
-                    self._peer_tags.append((ext_tags.PEER_HOST_IPV4, host))
-                else:
-                    self._peer_tags.append((ext_tags.PEER_HOSTNAME, host))
-            port = conn_info.get('port')
-            if port:
-                self._peer_tags.append((ext_tags.PEER_PORT, port))
-        return self._peer_tags
-
-    redis.StrictRedis.peer_tags = peer_tags
+    # kept for the applications that called it before peer_tags() took
+    # the connection pool
+    redis.StrictRedis.peer_tags = _client_peer_tags
 
     for name in METHOD_NAMES:
         ORIG_METHODS[name] = getattr(redis.StrictRedis, name)
 
-    def get(self, name, **kwargs):
-        self._extra_tags = [('redis.key', name)]
-        return ORIG_METHODS['get'](self, name, **kwargs)
-
-    def set(self, name, value, ex=None, px=None, nx=False, xx=False, **kwargs):
-        self._extra_tags = [('redis.key', name)]
-        return ORIG_METHODS['set'](self, name, value,
-                                   ex=ex, px=px, nx=nx, xx=xx,
-                                   **kwargs)
-
-    def setex(self, name, time, value, **kwargs):
-        self._extra_tags = [('redis.key', name),
-                            ('redis.ttl', time)]
-        return ORIG_METHODS['setex'](self, name, time, value, **kwargs)
-
-    def setnx(self, name, value, **kwargs):
-        self._extra_tags = [('redis.key', name)]
-        return ORIG_METHODS['setnx'](self, name, value, **kwargs)
-
     def execute_command(self, cmd, *args, **kwargs):
-        operation_name = 'redis:%s' % (cmd,)
-        span = utils.start_child_span(
-            operation_name=operation_name, parent=current_span_func())
-        span.set_tag(ext_tags.SPAN_KIND, ext_tags.SPAN_KIND_RPC_CLIENT)
-        span.set_tag(ext_tags.PEER_SERVICE, 'redis')
+        with command_span(self, cmd, args):
+            return ORIG_METHODS['execute_command'](self, cmd, *args, **kwargs)
 
-        # set the peer information (remote host/port)
-        for tag_key, tag_val in self.peer_tags():
-            span.set_tag(tag_key, tag_val)
+    for name in METHOD_NAMES:
+        setattr(redis.StrictRedis, name, locals()[name])
 
-        # for certain commands we'll add extra attributes such as the redis key
-        for tag_key, tag_val in getattr(self, '_extra_tags', []):
-            span.set_tag(tag_key, tag_val)
-        self._extra_tags = []
+    pipeline_class = _pipeline_class()
+    for name in PIPELINE_METHOD_NAMES:
+        ORIG_PIPELINE_METHODS[name] = getattr(pipeline_class, name)
 
+    def execute(self, *args, **kwargs):
+        span = pipeline_span(self)
+        if span is None:
+            return ORIG_PIPELINE_METHODS['execute'](self, *args, **kwargs)
         with span:
-            return ORIG_METHODS['execute_command'](self, cmd, *args, **kwargs)
+            return ORIG_PIPELINE_METHODS['execute'](self, *args, **kwargs)
 
-    for name in METHOD_NAMES:
-        setattr(redis.StrictRedis, name, locals()[name])
+    def immediate_execute_command(self, cmd, *args, **kwargs):
+        # WATCH and the commands issued while watching, before MULTI,
+        # bypass the pipeline's command stack
+        with command_span(self, cmd, args):
+            return ORIG_PIPELINE_METHODS['immediate_execute_command'](
+                self, cmd, *args, **kwargs)
+
+    for name in PIPELINE_METHOD_NAMES:
+        setattr(pipeline_class, name, locals()[name])
 
 
 def reset_patches():
-    for name in METHOD_NAMES:
-        setattr(redis.StrictRedis, name, ORIG_METHODS[name])
-    ORIG_METHODS.clear()
+    for (cls, name), method in ORIG_ASYNC_METHODS.items():
+        setattr(cls, name, method)
+    ORIG_ASYNC_METHODS.clear()
+    if ORIG_METHODS:
+        for name in METHOD_NAMES:
+            setattr(redis.StrictRedis, name, ORIG_METHODS[name])
+        ORIG_METHODS.clear()
+        pipeline_class = _pipeline_class()
+        for name in PIPELINE_METHOD_NAMES:
+            setattr(pipeline_class, name, ORIG_PIPELINE_METHODS[name])
+        ORIG_PIPELINE_METHODS.clear()
     install_patches.reset()
@@ -153,6 +153,10 @@ class TornadoRequestWrapper(AbstractRequestWrapper):
     def add_header(self, key, value):
         self.request.headers[key] = value
 
+    @property
+    def header_carrier(self):
+        return self.request.headers
+
     @property
     def _headers(self):
         if self._norm_headers is None:
@@ -74,6 +74,12 @@ def install_patches():
         def add_header(self, key, value):
             self.request.add_header(key, value)
 
+        def add_headers(self, headers):
+            # the keys are normalized like by Request.add_header()
+            self.request.headers.update(
+                (key.capitalize(), value)
+                for key, value in six.iteritems(headers))
+
         @property
         def method(self):
             return self.request.get_method()
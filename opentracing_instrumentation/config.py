@@ -38,6 +38,53 @@ class _Config(object):
         # being called
         self.callee_endpoint_headers = []
 
+        # HTTP headers that carry the tracing context of an inbound call,
+        # e.g. ['uber-trace-id']. When this or the list of prefixes below
+        # is not empty, only the matching headers are passed to
+        # tracer.extract(), instead of a copy of all the headers.
+        self.propagation_headers = []
+
+        # Prefixes of HTTP headers that carry the tracing context, such as
+        # baggage, e.g. ('uberctx-', )
+        self.propagation_header_prefixes = ()
+
+        # Whether looking up a header of a WSGI request also finds the
+        # `HTTP_*` keys of the environment that are not upper-case with
+        # underscores, as PEP 3333 servers make them. Finding them requires
+        # a scan of the environment on the first missing header.
+        self.wsgi_irregular_headers = False
+
+        # How the instrumentation of DB API v2 drivers records the
+        # parameters of statements in span tags, one of 'all', 'off',
+        # 'count', 'first_rows' or 'byte_budget', see
+        # client_hooks._dbapi2.sql_params_tags. The policy for
+        # executemany() defaults to recording only the number of rows and
+        # the estimated size of the parameters. An invalid policy is logged
+        # and replaced by the default one.
+        self.sql_params_policy = 'all'
+        self.sql_executemany_params_policy = 'count'
+        self.sql_params_max_rows = 10
+        self.sql_params_max_bytes = 4096
+
+        # Whether the rows fetched from server-side cursors, such as
+        # psycopg2 named cursors and MySQLdb SSCursor, are traced. All the
+        # fetches of a result set are aggregated into one span.
+        self.sql_trace_fetches = False
+
+        # Optional http_router.Router that maps the paths of inbound HTTP
+        # requests to route templates, which are used in the operation
+        # names of their spans, e.g. 'GET:/users/{id}'
+        self.http_server_router = None
+
+        # Optional http_client.HTTPClientRules that decide per outbound
+        # HTTP request whether it is traced, only propagates the tracing
+        # context, or is skipped altogether
+        self.http_client_rules = None
+
+        # Optional span_finisher.BackgroundSpanFinisher that finishes the
+        # spans started by the instrumentation on a background thread
+        self.span_finisher = None
+
 
 # create a singleton
 CONFIG = _Config()
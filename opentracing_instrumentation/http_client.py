@@ -26,11 +26,81 @@ import six
 
 from opentracing import Format
 from opentracing.ext import tags
+from six.moves.urllib.parse import urlsplit
 
 from opentracing_instrumentation.config import CONFIG
 from opentracing_instrumentation.interceptors import ClientInterceptors
 from opentracing_instrumentation import utils
 
+try:
+    from basictracer import BasicTracer
+except ImportError:
+    BasicTracer = None
+
+# The tracer seen last and its HTTP_HEADERS injector, see _get_injector()
+_injector_cache = (None, None)
+
+
+def _build_injector(tracer):
+    """
+    :return: a function that injects a span context into a carrier in the
+        HTTP_HEADERS format, or None for the no-op tracer
+    """
+    if type(tracer) is opentracing.Tracer:  # the no-op tracer
+        return None
+    inject = tracer.inject
+    if BasicTracer is not None and getattr(inject, '__func__', None) is \
+            six.get_unbound_function(BasicTracer.inject):
+        # One lookup of the propagator instead of the two of inject().
+        # The propagator is looked up on every request, since it may be
+        # registered or replaced after the first one.
+        def inject_with_propagator(span_context, carrier):
+            propagator = tracer._propagators.get(Format.HTTP_HEADERS)
+            if propagator is None:
+                # raises UnsupportedFormatException
+                inject(span_context, Format.HTTP_HEADERS, carrier)
+            else:
+                propagator.inject(span_context, carrier)
+        return inject_with_propagator
+    return lambda span_context, carrier: \
+        inject(span_context, Format.HTTP_HEADERS, carrier)
+
+
+def _get_injector():
+    global _injector_cache
+    tracer = opentracing.tracer
+    cached_tracer, injector = _injector_cache
+    if cached_tracer is not tracer:
+        injector = _build_injector(tracer)
+        _injector_cache = (tracer, injector)
+    return injector
+
+
+def inject_headers(span, request):
+    """
+    Inject the context of the span into the headers of the outbound
+    request. The headers are written straight into the header mapping of
+    the request, if it exposes one, and otherwise added in one call to
+    `request.add_headers()`.
+
+    :param span: the span of the request
+    :param request: request must match API defined by AbstractRequestWrapper
+    """
+    injector = _get_injector()
+    if injector is None:
+        return
+    carrier = request.header_carrier
+    try:
+        if carrier is not None:
+            injector(span.context, carrier)
+            return
+        carrier = {}
+        injector(span.context, carrier)
+    except opentracing.UnsupportedFormatException:
+        return
+    if carrier:
+        request.add_headers(carrier)
+
 
 def before_http_request(request, current_span_extractor):
     """
@@ -42,48 +112,207 @@ def before_http_request(request, current_span_extractor):
     :param request: request must match API defined by AbstractRequestWrapper
     :param current_span_extractor: function that extracts current span
         from some context
-    :return: returns child tracing span encapsulating this request
+    :return: returns child tracing span encapsulating this request, or
+        a span that records nothing if `CONFIG.http_client_rules` say
+        that the request is not to be traced
     """
 
+    parent = current_span_extractor()
+    rules = CONFIG.http_client_rules
+    if rules is not None:
+        action = rules.match(request)
+        if action != TRACE:
+            # neither tags nor interceptors for spans nobody records
+            span = utils.non_recording_span(parent)
+            if action == PROPAGATE and parent is not None:
+                inject_headers(span, request)
+            return span
+
     span = utils.start_child_span(
         operation_name=request.operation,
-        parent=current_span_extractor()
+        parent=parent
     )
 
-    span.set_tag(tags.SPAN_KIND, tags.SPAN_KIND_RPC_CLIENT)
-    span.set_tag(tags.HTTP_URL, request.full_url)
+    # nobody reads the tags of an unsampled span, but its context still
+    # has to be injected below
+    if not utils.is_unsampled(span):
+        span.set_tag(tags.SPAN_KIND, tags.SPAN_KIND_RPC_CLIENT)
+        span.set_tag(tags.HTTP_URL, request.full_url)
 
-    service_name = request.service_name
-    host, port = request.host_port
-    if service_name:
-        span.set_tag(tags.PEER_SERVICE, service_name)
-    if host:
-        span.set_tag(tags.PEER_HOST_IPV4, host)
-    if port:
-        span.set_tag(tags.PEER_PORT, port)
+        service_name = request.service_name
+        host, port = request.host_port
+        if service_name:
+            span.set_tag(tags.PEER_SERVICE, service_name)
+        if host:
+            span.set_tag(tags.PEER_HOST_IPV4, host)
+        if port:
+            span.set_tag(tags.PEER_PORT, port)
 
     # fire interceptors
-    for interceptor in ClientInterceptors.get_interceptors():
-        interceptor.process(request=request, span=span)
-
-    try:
-        carrier = {}
-        opentracing.tracer.inject(span_context=span.context,
-                                  format=Format.HTTP_HEADERS,
-                                  carrier=carrier)
-        for key, value in six.iteritems(carrier):
-            request.add_header(key, value)
-    except opentracing.UnsupportedFormatException:
-        pass
+    chain = ClientInterceptors.get_chain()
+    if chain:
+        for process, matches in chain:
+            if matches is None or matches(request):
+                process(request=request, span=span)
 
+    inject_headers(span, request)
     return span
 
 
+# Actions of the rules for outbound requests, see HTTPClientRules
+SKIP = 'skip'
+TRACE = 'trace'
+PROPAGATE = 'propagate'
+_ACTIONS = (SKIP, TRACE, PROPAGATE)
+
+
+class _PathNode(object):
+    __slots__ = ('action', 'children')
+
+    def __init__(self):
+        self.action = None
+        self.children = {}
+
+
+def _path_segments(path):
+    return [segment for segment in path.split('/') if segment]
+
+
+class HTTPClientRules(object):
+    """
+    Decides per outbound HTTP request whether the client hooks trace it.
+
+    Every rule matches requests on any combination of host, port, method
+    and path prefix, and chooses one of three actions:
+
+    * 'trace' (`TRACE`) traces the request as usual
+    * 'propagate' (`PROPAGATE`) injects the current tracing context into
+      the request headers, without recording a span
+    * 'skip' (`SKIP`) neither records a span nor injects headers, e.g. for
+      health checks or the polling of metadata services
+
+    .. code-block:: python
+
+        from opentracing_instrumentation.config import CONFIG
+        from opentracing_instrumentation.http_client import HTTPClientRules
+
+        CONFIG.http_client_rules = HTTPClientRules([
+            {'host': '169.254.169.254', 'action': 'skip'},
+            {'path_prefix': '/health', 'action': 'skip'},
+            {'host': 'cache', 'method': 'GET', 'action': 'propagate'},
+        ])
+
+    Path prefixes match whole segments: '/health' matches '/health' and
+    '/health/live', but not '/healthz'. The rule with the longest
+    matching path prefix wins. Among rules with the same prefix, one with
+    a host is preferred to one with a port, which is preferred to one
+    with a method. Of several rules with the same host, port, method
+    and path prefix, the first one declared wins. Requests matched by no
+    rule are traced.
+
+    The rules are compiled into a trie when they are created, so that
+    a lookup takes time proportional to the depth of the request path.
+
+    :param rules: iterable of dicts with an `action` and the optional
+        `host`, `port`, `method` and `path_prefix` keys
+    """
+
+    def __init__(self, rules):
+        # host -> port -> method -> root of the path trie, where None
+        # matches any value
+        self._hosts = {}
+        for rule in rules:
+            self._add(**rule)
+
+    def _add(self, action, host=None, port=None, method=None,
+             path_prefix=None):
+        if action not in _ACTIONS:
+            raise ValueError('HTTP client rule action must be one of %s, '
+                             'got %r' % (', '.join(_ACTIONS), action))
+        if host is not None:
+            host = host.lower()
+        if port is not None:
+            port = int(port)
+        if method is not None:
+            method = method.upper()
+        ports = self._hosts.setdefault(host, {})
+        methods = ports.setdefault(port, {})
+        node = methods.setdefault(method, _PathNode())
+        for segment in _path_segments(path_prefix or ''):
+            node = node.children.setdefault(segment, _PathNode())
+        if node.action is None:  # the first of duplicate rules wins
+            node.action = action
+
+    def match(self, request):
+        """
+        :param request: request must match API defined by
+            AbstractRequestWrapper
+        :return: the action for the request, TRACE if no rule matches
+        """
+        hosts = self._hosts
+        host, port = request.host_port
+        roots = []
+        for host_key, host_rank in ((host and host.lower(), 4), (None, 0)):
+            ports = hosts.get(host_key)
+            if ports is None:
+                continue
+            for port_key, port_rank in ((port, 2), (None, 0)):
+                methods = ports.get(port_key)
+                if methods is None:
+                    continue
+                for method_key, method_rank in ((request.method, 1),
+                                                (None, 0)):
+                    root = methods.get(method_key)
+                    if root is not None:
+                        roots.append(
+                            (host_rank + port_rank + method_rank, root))
+        if not roots:
+            return TRACE
+
+        # every (depth, rank) identifies a single rule, so there are no ties
+        best, action = (-1, -1), TRACE
+        segments = None
+        for rank, node in roots:
+            depth = 0
+            if node.action is not None and (depth, rank) > best:
+                best, action = (depth, rank), node.action
+            if node.children:
+                if segments is None:
+                    segments = _path_segments(request.path)
+                for segment in segments:
+                    node = node.children.get(segment)
+                    if node is None:
+                        break
+                    depth += 1
+                    if node.action is not None and (depth, rank) > best:
+                        best, action = (depth, rank), node.action
+        return action
+
+
 class AbstractRequestWrapper(object):
 
     def add_header(self, key, value):
         pass
 
+    def add_headers(self, headers):
+        """
+        Add several headers at once. Wrappers of requests whose header
+        mapping is costly to update should override it.
+
+        :param headers: dict of headers
+        """
+        for key, value in six.iteritems(headers):
+            self.add_header(key, value)
+
+    @property
+    def header_carrier(self):
+        """
+        The mutable mapping of the outbound headers of the request, into
+        which the trace headers can be injected directly, or None if they
+        must be added with `add_headers()`.
+        """
+        return None
+
     @property
     def _headers(self):
         return {}
@@ -112,6 +341,10 @@ class AbstractRequestWrapper(object):
     def method(self):
         raise NotImplementedError
 
+    @property
+    def path(self):
+        return urlsplit(self.full_url).path
+
     @property
     def full_url(self):
         raise NotImplementedError
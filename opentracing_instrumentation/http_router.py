@@ -0,0 +1,276 @@
+# Copyright (c) 2020 Uber Technologies, Inc.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+from __future__ import absolute_import
+from builtins import object
+import re
+
+from . import utils
+
+# Operation names built from raw paths, e.g. 'GET /users/12345', have
+# an unbounded cardinality. The router maps the paths of inbound requests
+# to the templates of the routes they match, e.g. '/users/{id}'.
+
+ROUTE_CACHE_SIZE = 1024
+
+_PARAM_RE = re.compile(r'^\{(\w*)\}$')
+_REST_PARAM_RE = re.compile(r'^\{(\w*):path\}$')
+_SEGMENT_PARAM_RE = re.compile(r'\{(\w*)\}')
+# <converter(arguments):name> or <name> of werkzeug and Django routes
+_CONVERTER_RE = re.compile(r'<(?:(\w+)(?:\([^)]*\))?:)?(\w+)>')
+
+
+class _RouteNode(object):
+    __slots__ = ('template', 'literals', 'patterns', 'param', 'rest')
+
+    def __init__(self):
+        self.template = None
+        self.literals = {}
+        self.patterns = []  # (regex of the segment, _RouteNode)
+        self.param = None
+        self.rest = None  # template of a {name:path} route
+
+
+def _segments(path):
+    return [segment for segment in path.split('/') if segment]
+
+
+def _segment_regex(segment):
+    parts = _SEGMENT_PARAM_RE.split(segment)
+    # the odd parts are the names of the parameters
+    return re.compile('^%s$' % ''.join(
+        '[^/]+?' if i % 2 else re.escape(part)
+        for i, part in enumerate(parts)))
+
+
+def _converted_template(route):
+    """
+    Convert a werkzeug or Django route, e.g. '/users/<int:id>', into
+    a template, e.g. '/users/{id}'.
+    """
+    def replace(match):
+        converter, name = match.groups()
+        if converter == 'path':
+            return '{%s:path}' % name
+        return '{%s}' % name
+    return _CONVERTER_RE.sub(replace, route)
+
+
+def regex_template(pattern):
+    """
+    Approximate the template of a route given as a regular expression:
+    the groups are replaced by their names in braces, or by `{}` if they
+    are not named, and the anchors, escapes and quantifiers outside the
+    groups are removed, e.g. '^/users/(?P<id>[0-9]+)/?$' becomes
+    '/users/{id}/'.
+
+    :param pattern: regular expression string
+    :return: route template
+    """
+    template = []
+    depth = 0
+    group_start = None
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == '\\' and i + 1 < len(pattern):
+            if depth == 0 and pattern[i + 1] not in 'AZbBdDsSwW':
+                template.append(pattern[i + 1])
+            i += 2
+            continue
+        if char == '(':
+            if depth == 0:
+                group_start = i
+            depth += 1
+        elif char == ')' and depth > 0:
+            depth -= 1
+            if depth == 0:
+                group = pattern[group_start + 1:i]
+                name = re.match(r'\?P<(\w+)>', group)
+                if name is not None:
+                    template.append('{%s}' % name.group(1))
+                elif not group.startswith('?') or group.startswith('?:'):
+                    template.append('{}')
+        elif depth == 0 and char not in '^$?*+':
+            template.append(char)
+        i += 1
+    return ''.join(template)
+
+
+class Router(object):
+    """
+    Maps request paths to the templates of the routes they match.
+
+    Templates are paths whose segments may be parameters: `{name}`
+    matches one segment, `{name:path}` at the end of a template matches
+    the rest of the path, and parameters may be mixed with literal text
+    within a segment, e.g. `{name}.json`. The templates are compiled
+    into a trie of segments, in which literal segments take precedence
+    over parameters. Routes that cannot be expressed as templates are
+    given as regular expressions, which are tried in order when no
+    template matches.
+
+    The results are cached in a bounded LRU cache, see `match`.
+
+    :param templates: iterable of route templates, e.g. '/users/{id}'
+    :param regex_routes: iterable of (regular expression, template)
+        pairs. The expression is matched against the start of the path.
+    :param cache_size: maximum number of paths whose results are cached
+    """
+
+    def __init__(self, templates=(), regex_routes=(),
+                 cache_size=ROUTE_CACHE_SIZE):
+        self._root = _RouteNode()
+        for template in templates:
+            self._add(template)
+        self._regex_routes = [(re.compile(regex), template)
+                              for regex, template in regex_routes]
+        self._cached_match = utils.lru_cache(maxsize=cache_size)(self._match)
+
+    def _add(self, template):
+        node = self._root
+        segments = _segments(template)
+        for i, segment in enumerate(segments):
+            if _REST_PARAM_RE.match(segment):
+                if i != len(segments) - 1:
+                    raise ValueError('{name:path} must be the last segment '
+                                     'of the template %r' % template)
+                if node.rest is None:
+                    node.rest = template
+                return
+            if _PARAM_RE.match(segment):
+                if node.param is None:
+                    node.param = _RouteNode()
+                node = node.param
+            elif _SEGMENT_PARAM_RE.search(segment):
+                regex = _segment_regex(segment)
+                for pattern, child in node.patterns:
+                    if pattern.pattern == regex.pattern:
+                        node = child
+                        break
+                else:
+                    child = _RouteNode()
+                    node.patterns.append((regex, child))
+                    node = child
+            else:
+                node = node.literals.setdefault(segment, _RouteNode())
+        # like the frameworks, the route added first wins
+        if node.template is None:
+            node.template = template
+
+    def match(self, path):
+        """
+        :param path: the path of a request
+        :return: the template of the route that the path matches, or None
+        """
+        return self._cached_match(path)
+
+    def _match(self, path):
+        template = self._match_node(self._root, _segments(path), 0)
+        if template is not None:
+            return template
+        for regex, template in self._regex_routes:
+            if regex.match(path):
+                return template
+        return None
+
+    def _match_node(self, node, segments, index):
+        if index == len(segments):
+            return node.template
+        segment = segments[index]
+        child = node.literals.get(segment)
+        if child is not None:
+            template = self._match_node(child, segments, index + 1)
+            if template is not None:
+                return template
+        for regex, child in node.patterns:
+            if regex.match(segment):
+                template = self._match_node(child, segments, index + 1)
+                if template is not None:
+                    return template
+        if node.param is not None:
+            template = self._match_node(node.param, segments, index + 1)
+            if template is not None:
+                return template
+        return node.rest
+
+    @classmethod
+    def from_werkzeug(cls, url_map, **kwargs):
+        """
+        :param url_map: `werkzeug.routing.Map`
+        :return: Router of the rules of the map
+        """
+        return cls(templates=[_converted_template(rule.rule)
+                              for rule in url_map.iter_rules()], **kwargs)
+
+    @classmethod
+    def from_flask(cls, app, **kwargs):
+        """
+        :param app: `flask.Flask` application
+        :return: Router of the URL rules of the application
+        """
+        return cls.from_werkzeug(app.url_map, **kwargs)
+
+    @classmethod
+    def from_django(cls, urlpatterns, **kwargs):
+        """
+        :param urlpatterns: the `urlpatterns` of the root URLconf
+        :return: Router of the URL patterns, including the included ones
+        """
+        templates = []
+        regex_routes = []
+        _add_django_routes(urlpatterns, [], templates, regex_routes)
+        return cls(templates=templates, regex_routes=regex_routes,
+                   **kwargs)
+
+    @classmethod
+    def from_tornado(cls, app, **kwargs):
+        """
+        :param app: `tornado.web.Application`
+        :return: Router of the handlers of the application, whose regular
+            expressions are tried in order
+        """
+        regex_routes = []
+        for rule in app.wildcard_router.rules:
+            regex = getattr(rule.matcher, 'regex', None)
+            if regex is not None:  # not e.g. a HostMatches
+                regex_routes.append((regex, regex_template(regex.pattern)))
+        return cls(regex_routes=regex_routes, **kwargs)
+
+
+def _add_django_routes(urlpatterns, prefixes, templates, regex_routes):
+    from django.urls.resolvers import RoutePattern
+
+    for url_pattern in urlpatterns:
+        pattern = url_pattern.pattern
+        parts = prefixes + [pattern]
+        included = getattr(url_pattern, 'url_patterns', None)
+        if included is not None:
+            _add_django_routes(included, parts, templates, regex_routes)
+            continue
+        if all(isinstance(part, RoutePattern) for part in parts):
+            templates.append(_converted_template(
+                '/' + ''.join(str(part) for part in parts)))
+            continue
+        # the patterns of included URLconfs are matched against what the
+        # patterns of the including ones leave over
+        regex = ''.join(part.regex.pattern.lstrip('^') for part in parts)
+        regex = '^/' + regex.replace('$', '').replace('\\Z', '') + '$'
+        regex_routes.append((regex, regex_template(regex)))
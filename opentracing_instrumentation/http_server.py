@@ -27,16 +27,28 @@ import logging
 import urllib.parse
 import opentracing
 import six
+if six.PY2:
+    from collections import Mapping
+else:
+    from collections.abc import Mapping
 from opentracing import Format
 from opentracing.ext import tags
 from opentracing_instrumentation import config
+from opentracing_instrumentation import utils
+from opentracing_instrumentation.interceptors import ServerInterceptors
+
+# A server sees only a few distinct scheme/host/script name combinations,
+# but many distinct paths, so both caches are bounded.
+URL_PREFIX_CACHE_SIZE = 64
+QUOTED_PATH_CACHE_SIZE = 1024
 
 
 def before_request(request, tracer=None):
     """
     Attempts to extract a tracing span from incoming request.
     If no tracing context is passed in the headers, or the data
-    cannot be parsed, a new root span is started.
+    cannot be parsed, a new root span is started. The interceptors
+    registered with `interceptors.ServerInterceptors` are then run.
 
     :param request: HTTP request with `.headers` property exposed
         that satisfies a regular dictionary interface
@@ -69,9 +81,7 @@ def before_request(request, tracer=None):
 
     operation = request.operation
     try:
-        carrier = {}
-        for key, value in six.iteritems(request.headers):
-            carrier[key] = value
+        carrier = _extract_carrier(request.headers)
         parent_ctx = tracer.extract(
             format=Format.HTTP_HEADERS, carrier=carrier
         )
@@ -84,9 +94,50 @@ def before_request(request, tracer=None):
         child_of=parent_ctx,
         tags=tags_dict)
 
+    if config.CONFIG.span_finisher is not None:
+        span = config.CONFIG.span_finisher.wrap(span)
+
+    # fire interceptors
+    chain = ServerInterceptors.get_chain()
+    if chain:
+        for process, matches in chain:
+            if matches is None or matches(request):
+                process(request=request, span=span)
     return span
 
 
+def _extract_carrier(headers):
+    """
+    Copy the headers that may carry tracing context into a dictionary.
+
+    Unless `CONFIG.propagation_headers` or
+    `CONFIG.propagation_header_prefixes` narrow them down, all headers
+    are copied.
+    """
+    names = config.CONFIG.propagation_headers
+    prefixes = config.CONFIG.propagation_header_prefixes
+    carrier = {}
+    if not names and not prefixes:
+        for key, value in six.iteritems(headers):
+            carrier[key] = value
+        return carrier
+
+    for name in names:
+        value = headers.get(name)
+        if value is not None:
+            carrier[name] = value
+    if prefixes:
+        prefixes = tuple(prefixes)
+        if isinstance(headers, WSGIHeaders):
+            items = headers.iter_prefixed(prefixes)
+        else:
+            items = ((key, value) for key, value in six.iteritems(headers)
+                     if key.lower().startswith(prefixes))
+        for key, value in items:
+            carrier[key] = value
+    return carrier
+
+
 class AbstractRequestWrapper(object):
     """
     Exposes several properties used by the tracing methods.
@@ -108,6 +159,22 @@ class AbstractRequestWrapper(object):
     def headers(self):
         raise NotImplementedError('headers')
 
+    @property
+    def path(self):
+        """
+        The unquoted path of the request, used by the `path_pattern` of the
+        server interceptors.
+        """
+        return urllib.parse.unquote(urllib.parse.urlsplit(self.full_url).path)
+
+    @property
+    def route_path(self):
+        """
+        The path of the request that the routes of the application are
+        matched against, see `config.CONFIG.http_server_router`.
+        """
+        return self.path
+
     @property
     def method(self):
         raise NotImplementedError('method')
@@ -126,6 +193,16 @@ class AbstractRequestWrapper(object):
 
     @property
     def operation(self):
+        """
+        The method of the request, followed by the template of the route
+        that the request matches if `config.CONFIG.http_server_router` is
+        set, e.g. 'GET:/users/{id}'.
+        """
+        router = config.CONFIG.http_server_router
+        if router is not None:
+            template = router.match(self.route_path)
+            if template is not None:
+                return '%s:%s' % (self.method, template)
         return self.method
 
 
@@ -146,6 +223,10 @@ class TornadoRequestWrapper(AbstractRequestWrapper):
     def headers(self):
         return self.request.headers
 
+    @property
+    def path(self):
+        return urllib.parse.unquote(self.request.path)
+
     @property
     def method(self):
         return self.request.method
@@ -155,6 +236,71 @@ class TornadoRequestWrapper(AbstractRequestWrapper):
         return self.request.remote_ip
 
 
+class WSGIHeaders(Mapping):
+    """
+    A read-only, case-insensitive view of the HTTP headers in a WSGI
+    environment.
+
+    Looking up a header reads the corresponding `HTTP_*` key of the
+    environment directly, so a missing header costs a single dict lookup.
+    Servers following PEP 3333 upper-case those keys and replace dashes
+    with underscores; keys that are not normalized that way are only looked
+    up when `config.CONFIG.wsgi_irregular_headers` is set, and are always
+    seen when the view is iterated. The full dictionary of headers, as
+    returned by `WSGIRequestWrapper._parse_wsgi_headers`, is only built
+    then.
+    """
+
+    __slots__ = ('_environ', '_headers', '_irregular')
+
+    def __init__(self, wsgi_environ):
+        self._environ = wsgi_environ
+        self._headers = None
+        self._irregular = None
+
+    def __getitem__(self, key):
+        try:
+            return self._environ['HTTP_' + key.upper().replace('-', '_')]
+        except KeyError:
+            if self._headers is not None:
+                return self._headers[key.lower()]
+            if not config.CONFIG.wsgi_irregular_headers:
+                raise
+            if self._irregular is None:
+                self._irregular = {
+                    k[5:].replace('_', '-').lower(): v
+                    for k, v in self._environ.items()
+                    if k.startswith('HTTP_') and not
+                    (k.isupper() and '-' not in k)}
+            return self._irregular[key.lower()]
+
+    def __iter__(self):
+        return iter(self._materialize())
+
+    def __len__(self):
+        return len(self._materialize())
+
+    def _materialize(self):
+        if self._headers is None:
+            self._headers = WSGIRequestWrapper._parse_wsgi_headers(
+                self._environ)
+        return self._headers
+
+    def iter_prefixed(self, prefixes):
+        """
+        Iterate over the headers starting with any of the given lower-case
+        prefixes without building the full dictionary of headers.
+
+        :param prefixes: tuple of header name prefixes, e.g. ('uberctx-',)
+        :return: iterator of (header name, value) pairs
+        """
+        env_prefixes = tuple(
+            'HTTP_' + prefix.upper().replace('-', '_') for prefix in prefixes)
+        for key, value in self._environ.items():
+            if key.startswith(env_prefixes):
+                yield key[5:].replace('_', '-').lower(), value
+
+
 class WSGIRequestWrapper(AbstractRequestWrapper):
     """
     Wraps WSGI environment and exposes several properties
@@ -168,7 +314,7 @@ class WSGIRequestWrapper(AbstractRequestWrapper):
     @classmethod
     def from_wsgi_environ(cls, wsgi_environ):
         instance = cls(wsgi_environ=wsgi_environ,
-                       headers=cls._parse_wsgi_headers(wsgi_environ))
+                       headers=WSGIHeaders(wsgi_environ))
         return instance
 
     @staticmethod
@@ -200,30 +346,35 @@ class WSGIRequestWrapper(AbstractRequestWrapper):
         :return: Reconstructed URL from WSGI environment.
         """
         environ = self.wsgi_environ
-        url = environ['wsgi.url_scheme'] + '://'
-
-        if environ.get('HTTP_HOST'):
-            url += environ['HTTP_HOST']
+        host = environ.get('HTTP_HOST')
+        if host:
+            prefix = _url_prefix(environ['wsgi.url_scheme'], host, None, None,
+                                 environ.get('SCRIPT_NAME', ''))
         else:
-            url += environ['SERVER_NAME']
-
-            if environ['wsgi.url_scheme'] == 'https':
-                if environ['SERVER_PORT'] != '443':
-                    url += ':' + environ['SERVER_PORT']
-            else:
-                if environ['SERVER_PORT'] != '80':
-                    url += ':' + environ['SERVER_PORT']
-
-        url += urllib.parse.quote(environ.get('SCRIPT_NAME', ''))
-        url += urllib.parse.quote(environ.get('PATH_INFO', ''))
-        if environ.get('QUERY_STRING'):
-            url += '?' + environ['QUERY_STRING']
-        return url
+            prefix = _url_prefix(environ['wsgi.url_scheme'], None,
+                                 environ['SERVER_NAME'],
+                                 environ['SERVER_PORT'],
+                                 environ.get('SCRIPT_NAME', ''))
+        path = _quote_path(environ.get('PATH_INFO', ''))
+        query = environ.get('QUERY_STRING')
+        if query:
+            return ''.join((prefix, path, '?', query))
+        return prefix + path
 
     @property
     def headers(self):
         return self._headers
 
+    @property
+    def path(self):
+        environ = self.wsgi_environ
+        return environ.get('SCRIPT_NAME', '') + environ.get('PATH_INFO', '')
+
+    @property
+    def route_path(self):
+        # applications route PATH_INFO, wherever they are mounted
+        return self.wsgi_environ.get('PATH_INFO', '')
+
     @property
     def method(self):
         return self.wsgi_environ.get('REQUEST_METHOD')
@@ -239,3 +390,30 @@ class WSGIRequestWrapper(AbstractRequestWrapper):
     @property
     def server_port(self):
         return self.wsgi_environ.get('SERVER_PORT', None)
+
+
+@utils.lru_cache(maxsize=URL_PREFIX_CACHE_SIZE)
+def _url_prefix(scheme, host, server_name, server_port, script_name):
+    """
+    Build the part of the URL preceding PATH_INFO, following
+    http://legacy.python.org/dev/peps/pep-3333/#url-reconstruction
+    """
+    url = scheme + '://'
+    if host:
+        url += host
+    else:
+        url += server_name
+
+        if scheme == 'https':
+            if server_port != '443':
+                url += ':' + server_port
+        else:
+            if server_port != '80':
+                url += ':' + server_port
+
+    return url + urllib.parse.quote(script_name)
+
+
+@utils.lru_cache(maxsize=QUOTED_PATH_CACHE_SIZE)
+def _quote_path(path):
+    return urllib.parse.quote(path)
@@ -21,6 +21,8 @@
 from __future__ import absolute_import
 
 import abc
+import re
+import threading
 
 import six
 
@@ -46,35 +48,48 @@ class OpenTracingInterceptor(object):
             def process(self, request, span):
                 span.set_baggage_item(..)
 
+    An interceptor that is only interested in some requests can declare
+    a filter, which is checked before ``process(..)`` is called:
+
+    * ``url_pattern``, a regular expression, searched for in the full URL
+      of the request
+    * ``hosts``, an iterable of host names, matched against the host of
+      outbound requests (``ClientInterceptors`` only)
+    * ``path_pattern``, a regular expression, matched against the path of
+      inbound requests (``ServerInterceptors`` only)
+
+    The filter is compiled when the interceptor is added to
+    ``ClientInterceptors`` or ``ServerInterceptors``, later changes are
+    not picked up.
     """
 
+    hosts = None
+    url_pattern = None
+    path_pattern = None
+
     @abc.abstractmethod
     def process(self, request, span):
         """Fire the interceptor."""
         pass
 
 
-class ClientInterceptors(object):
+class _Interceptors(object):
     """
-    Client interceptors executed between span creation and injection.
-
-    Subclassed implementations of ``OpenTracingInterceptor`` can be added
-    and are executed in order in which they are added, after child
-    span for current request is created, but before the span baggage
-    contents are injected into the outbound request.
-
-    A code sample of expected usage:
-
-    from opentracing_instrumentation.interceptors import ClientInterceptors
-
-    from my_project.interceptors import CustomOpenTracingInterceptor
+    Registry of interceptors, the base of ``ClientInterceptors`` and
+    ``ServerInterceptors``.
 
-    my_interceptor = CustomOpenTracingInterceptor()
-    ClientInterceptors.append(my_interceptor)
+    The interceptors can be added and removed from any thread at any time.
+    Every change publishes new immutable tuples of the interceptors and of
+    the compiled chain, which the requests read without locking.
 
+    Subclasses must define their own ``_interceptors``, ``_chain`` and
+    ``_lock`` class attributes.
     """
 
-    _interceptors = []
+    _interceptors = ()
+    # tuple of (process method, filter function or None)
+    _chain = ()
+    _lock = None
 
     @classmethod
     def append(cls, interceptor):
@@ -85,7 +100,8 @@ class ClientInterceptors(object):
               does not extend ``OpenTracingInterceptor``
         """
         cls._check(interceptor)
-        cls._interceptors.append(interceptor)
+        with cls._lock:
+            cls._publish(cls._interceptors + (interceptor, ))
 
     @classmethod
     def insert(cls, index, interceptor):
@@ -96,20 +112,141 @@ class ClientInterceptors(object):
               does not extend ``OpenTracingInterceptor``
         """
         cls._check(interceptor)
-        cls._interceptors.insert(index, interceptor)
+        with cls._lock:
+            interceptors = list(cls._interceptors)
+            interceptors.insert(index, interceptor)
+            cls._publish(tuple(interceptors))
+
+    @classmethod
+    def _publish(cls, interceptors):
+        chain = tuple((interceptor.process, cls._compile_filter(interceptor))
+                      for interceptor in interceptors)
+        # a request may read the attributes in between, so the chain,
+        # which is what the requests run, is swapped last
+        cls._interceptors = interceptors
+        cls._chain = chain
 
     @classmethod
     def _check(cls, interceptor):
         if not isinstance(interceptor, OpenTracingInterceptor):
-            raise ValueError('ClientInterceptors only accepts instances '
-                             'of OpenTracingInterceptor')
+            raise ValueError('%s only accepts instances '
+                             'of OpenTracingInterceptor' % cls.__name__)
+
+    @classmethod
+    def _compile_filter(cls, interceptor):
+        """
+        :return: a function that tells whether the interceptor applies to
+            a request, or None if it applies to all requests
+        """
+        raise NotImplementedError
 
     @classmethod
     def get_interceptors(cls):
-        """Return a list of interceptors."""
-        return cls._interceptors
+        """Return a copy of the list of the interceptors."""
+        return list(cls._interceptors)
+
+    @classmethod
+    def get_chain(cls):
+        """
+        Return the compiled chain of the interceptors, a tuple of
+        ``(process, filter)`` pairs, where ``filter`` is either None or a
+        function that tells whether ``process`` should be called for the
+        request.
+        """
+        return cls._chain
 
     @classmethod
     def clear(cls):
         """Clear the internal list of interceptors."""
-        del cls._interceptors[:]
+        with cls._lock:
+            cls._publish(())
+
+
+class ClientInterceptors(_Interceptors):
+    """
+    Client interceptors executed between span creation and injection.
+
+    Subclassed implementations of ``OpenTracingInterceptor`` can be added
+    and are executed in order in which they are added, after child
+    span for current request is created, but before the span baggage
+    contents are injected into the outbound request.
+
+    A code sample of expected usage:
+
+    from opentracing_instrumentation.interceptors import ClientInterceptors
+
+    from my_project.interceptors import CustomOpenTracingInterceptor
+
+    my_interceptor = CustomOpenTracingInterceptor()
+    ClientInterceptors.append(my_interceptor)
+
+    """
+
+    _interceptors = ()
+    _chain = ()
+    _lock = threading.Lock()
+
+    @classmethod
+    def _compile_filter(cls, interceptor):
+        hosts = interceptor.hosts
+        url_search = _compile_search(interceptor.url_pattern)
+        if hosts is None and url_search is None:
+            return None
+        if hosts is not None:
+            hosts = frozenset(hosts)
+
+        def matches(request):
+            if hosts is not None and request.host_port[0] not in hosts:
+                return False
+            return url_search is None or \
+                url_search(request.full_url) is not None
+        return matches
+
+
+class ServerInterceptors(_Interceptors):
+    """
+    Server interceptors executed by ``http_server.before_request``, after
+    the tracing context has been extracted from the inbound request and
+    its span has been started, e.g. to add tags or baggage derived from
+    the request.
+
+    Subclassed implementations of ``OpenTracingInterceptor`` can be added
+    and are executed in order in which they are added. The ``request``
+    passed to them is the server request wrapper. Interceptors that only
+    apply to some routes can declare a ``path_pattern``, so that costly
+    enrichment only runs where it is needed:
+
+    .. code-block:: python
+
+        class TenantInterceptor(OpenTracingInterceptor):
+            path_pattern = r'/tenants/(?P<tenant>[^/]+)/'
+
+            def process(self, request, span):
+                span.set_tag('tenant', lookup_tenant(request))
+
+        ServerInterceptors.append(TenantInterceptor())
+    """
+
+    _interceptors = ()
+    _chain = ()
+    _lock = threading.Lock()
+
+    @classmethod
+    def _compile_filter(cls, interceptor):
+        url_search = _compile_search(interceptor.url_pattern)
+        path_match = interceptor.path_pattern
+        if path_match is not None:
+            path_match = re.compile(path_match).match
+        if url_search is None and path_match is None:
+            return None
+
+        def matches(request):
+            if path_match is not None and path_match(request.path) is None:
+                return False
+            return url_search is None or \
+                url_search(request.full_url) is not None
+        return matches
+
+
+def _compile_search(pattern):
+    return re.compile(pattern).search if pattern is not None else None
@@ -20,12 +20,19 @@
 from __future__ import absolute_import
 from builtins import str
 import functools
+import sys
 import contextlib2
 import tornado.concurrent
 import opentracing
 from opentracing.scope_managers.tornado import TornadoScopeManager
 from . import get_current_span, span_in_stack_context, span_in_context, utils
 
+if sys.version_info >= (3, 6):
+    from ._async_local_span import get_async_wrapper_factory
+else:
+    def get_async_wrapper_factory(func):
+        return None
+
 
 def func_span(func, tags=None, require_active_trace=False):
     """
@@ -63,36 +70,63 @@ def func_span(func, tags=None, require_active_trace=False):
         operation_name=operation_name, parent=current_span, tags=tags)
 
 
-class _DummyStackContext(object):
-    """
-    Stack context that restores previous scope after exit.
-    Will be returned by helper `_span_in_stack_context` when tracer scope
-    manager is not `TornadoScopeManager`.
-    """
-    def __init__(self, context):
-        self._context = context
-
-    def __enter__(self):
-        # Need for compatibility with `span_in_stack_context`.
-        return lambda: None
+def _log_exception(span, exception):
+    span.log(event='exception', payload=exception)
+    span.set_tag('error', 'true')
 
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        if self._context:
-            self._context.close()
 
-
-def _span_in_stack_context(span):
-    if isinstance(opentracing.tracer.scope_manager, TornadoScopeManager):
-        return span_in_stack_context(span)
+def _finish_span_when_done(span, future, deactivate_cb=None):
+    """
+    Finish the span once the future is completed, in order to accurately
+    capture the function's execution time.
+    """
+    def done_callback(future):
+        if deactivate_cb is not None:
+            deactivate_cb()
+        # exception() raises if the future was cancelled
+        exception = None if future.cancelled() else future.exception()
+        if exception is not None:
+            _log_exception(span, exception)
+        span.finish()
+
+    if future.done():
+        done_callback(future)
     else:
-        return _DummyStackContext(span_in_context(span))
+        future.add_done_callback(done_callback)
+
+
+def _call_in_stack_context(span, func, args, kwargs):
+    # We explicitly invoke deactivation callback for the StackContext,
+    # because there are scenarios when it gets retained forever, for
+    # example when a Periodic Callback is scheduled lazily while in the
+    # scope of a tracing StackContext.
+    with span_in_stack_context(span) as deactivate_cb:
+        try:
+            res = func(*args, **kwargs)
+        except Exception as e:
+            deactivate_cb()
+            _log_exception(span, e)
+            span.finish()
+            raise
+        if tornado.concurrent.is_future(res):
+            _finish_span_when_done(span, res, deactivate_cb)
+        else:
+            deactivate_cb()
+            span.finish()
+        return res
 
 
 def traced_function(func=None, name=None, on_start=None,
                     require_active_trace=False):
     """
-    A decorator that enables tracing of the wrapped function or
-    Tornado co-routine provided there is a parent span already established.
+    A decorator that enables tracing of the wrapped function, Tornado
+    co-routine, or (on Python 3.6+) `async def` function or async generator,
+    provided there is a parent span already established.
+
+    For native coroutines and async generators the span covers the awaited
+    time and is made current with `span_in_context()`, so the tracer should
+    use a scope manager that follows asyncio tasks, such as
+    `ContextVarsScopeManager`.
 
     .. code-block:: python
 
@@ -100,7 +134,8 @@ def traced_function(func=None, name=None, on_start=None,
         def my_function1(arg1, arg2=None)
             ...
 
-    :param func: decorated function or Tornado co-routine
+    :param func: decorated function, Tornado co-routine, `async def`
+        function or async generator function
     :param name: optional name to use as the Span.operation_name.
         If not provided, func.__name__ will be used.
     :param on_start: an optional callback to be executed once the child span
@@ -137,47 +172,63 @@ def traced_function(func=None, name=None, on_start=None,
     else:
         operation_name = func.__name__
 
-    @functools.wraps(func)
-    def decorator(*args, **kwargs):
-        parent_span = get_current_span()
-        if parent_span is None and require_active_trace:
-            return func(*args, **kwargs)
+    # Everything that does not change between calls is decided here,
+    # so that the wrapper below only runs the branches it needs.
+    if not callable(on_start):
+        on_start = None
 
-        span = utils.start_child_span(
-            operation_name=operation_name, parent=parent_span)
-        if callable(on_start):
-            on_start(span, *args, **kwargs)
+    async_wrapper_factory = get_async_wrapper_factory(func)
+    if async_wrapper_factory is not None:
+        return async_wrapper_factory(func, operation_name, on_start,
+                                     require_active_trace)
+
+    # Tornado co-routines always return futures, other functions may
+    returns_future = getattr(func, '__tornado_coroutine__', False)
+    is_future = tornado.concurrent.is_future
 
-        # We explicitly invoke deactivation callback for the StackContext,
-        # because there are scenarios when it gets retained forever, for
-        # example when a Periodic Callback is scheduled lazily while in the
-        # scope of a tracing StackContext.
-        with _span_in_stack_context(span) as deactivate_cb:
-            try:
-                res = func(*args, **kwargs)
-                # Tornado co-routines usually return futures, so we must wait
-                # until the future is completed, in order to accurately
-                # capture the function's execution time.
-                if tornado.concurrent.is_future(res):
-                    def done_callback(future):
-                        deactivate_cb()
-                        exception = future.exception()
-                        if exception is not None:
-                            span.log(event='exception', payload=exception)
-                            span.set_tag('error', 'true')
-                        span.finish()
-                    if res.done():
-                        done_callback(res)
-                    else:
-                        res.add_done_callback(done_callback)
-                else:
-                    deactivate_cb()
-                    span.finish()
-                return res
-            except Exception as e:
-                deactivate_cb()
-                span.log(event='exception', payload=e)
-                span.set_tag('error', 'true')
-                span.finish()
-                raise
+    if on_start is None:
+        def start_span(parent_span, args, kwargs):
+            return utils.start_child_span(
+                operation_name=operation_name, parent=parent_span)
+    else:
+        def start_span(parent_span, args, kwargs):
+            span = utils.start_child_span(
+                operation_name=operation_name, parent=parent_span)
+            on_start(span, *args, **kwargs)
+            return span
+
+    def traced_call(parent_span, args, kwargs):
+        span = start_span(parent_span, args, kwargs)
+
+        # the tracer, and with it the scope manager, may be replaced
+        # after decoration
+        if isinstance(opentracing.tracer.scope_manager, TornadoScopeManager):
+            return _call_in_stack_context(span, func, args, kwargs)
+
+        scope = span_in_context(span)
+        try:
+            res = func(*args, **kwargs)
+        except Exception as e:
+            scope.close()
+            _log_exception(span, e)
+            span.finish()
+            raise
+        scope.close()
+        if returns_future or is_future(res):
+            _finish_span_when_done(span, res)
+        else:
+            span.finish()
+        return res
+
+    if require_active_trace:
+        @functools.wraps(func)
+        def decorator(*args, **kwargs):
+            parent_span = get_current_span()
+            if parent_span is None:
+                return func(*args, **kwargs)
+            return traced_call(parent_span, args, kwargs)
+    else:
+        @functools.wraps(func)
+        def decorator(*args, **kwargs):
+            return traced_call(get_current_span(), args, kwargs)
     return decorator
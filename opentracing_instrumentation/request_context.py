@@ -27,6 +27,17 @@ from opentracing.scope_managers.tornado import TornadoScopeManager
 from opentracing.scope_managers.tornado import tracer_stack_context
 from opentracing.scope_managers.tornado import ThreadSafeStackContext  # noqa
 
+try:
+    from opentracing.scope_managers.contextvars import ContextVarsScopeManager
+except ImportError:  # Python < 3.7 or opentracing < 2.3
+    ContextVarsScopeManager = None
+
+try:
+    # private, so get_current_span() falls back to scope_manager.active
+    from opentracing.scope_managers.contextvars import _SCOPE
+except ImportError:
+    _SCOPE = None
+
 
 class RequestContext(object):
     """
@@ -64,6 +75,10 @@ class RequestContextManager(object):
     _state = threading.local()
     _state.context = None
 
+    # flipped on first use, so that get_current_span() does not have to
+    # look into the thread-local state of applications that never use it
+    _used = False
+
     @classmethod
     def current_context(cls):
         """Get the current request context.
@@ -84,6 +99,7 @@ class RequestContextManager(object):
             self._context = context
 
     def __enter__(self):
+        RequestContextManager._used = True
         self._prev_context = self.__class__.current_context()
         self.__class__._state.context = self._context
         return self._context
@@ -121,14 +137,25 @@ def get_current_span():
         Return current span associated with the current request context.
         If no request context is present in thread local, or the context
         has no span, return None.
+
+    When the tracer uses `ContextVarsScopeManager`, the active scope is
+    read straight from its ContextVar, which makes this a single O(1)
+    lookup that works across threads, asyncio tasks and Tornado 5+
+    coroutines without StackContext.
     """
     # Check against the old, ScopeManager-less implementation,
     # for backwards compatibility.
-    context = RequestContextManager.current_context()
-    if context is not None:
-        return context.span
-
-    active = opentracing.tracer.scope_manager.active
+    if RequestContextManager._used:
+        context = RequestContextManager.current_context()
+        if context is not None:
+            return context.span
+
+    scope_manager = opentracing.tracer.scope_manager
+    if type(scope_manager) is ContextVarsScopeManager and \
+            _SCOPE is not None:
+        active = _SCOPE.get(None)
+    else:
+        active = scope_manager.active
     return active.span if active else None
 
 
@@ -136,7 +163,8 @@ def span_in_context(span):
     """
     Create a context manager that stores the given span in the thread-local
     request context. This function should only be used in single-threaded
-    applications like Flask / uWSGI.
+    applications like Flask / uWSGI, or with `ContextVarsScopeManager`,
+    which also isolates threads, asyncio tasks and Tornado 5+ coroutines.
 
     ## Usage example in WSGI middleware:
 
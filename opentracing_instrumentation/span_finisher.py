@@ -0,0 +1,269 @@
+# Copyright (c) 2020 Uber Technologies, Inc.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+from __future__ import absolute_import
+from builtins import object
+import collections
+import logging
+import os
+import threading
+import time
+import weakref
+
+import opentracing
+import wrapt
+
+log = logging.getLogger(__name__)
+
+# What to do with a finished span when the queue is full
+DROP_NEWEST = 'drop_newest'
+DROP_OLDEST = 'drop_oldest'
+FINISH_INLINE = 'finish_inline'
+
+_DROP_POLICIES = (DROP_NEWEST, DROP_OLDEST, FINISH_INLINE)
+
+# Python 3.7+, otherwise forks are detected by comparing the pid on every
+# finish
+_register_at_fork = getattr(os, 'register_at_fork', None)
+
+
+class BackgroundSpanFinisher(object):
+    """
+    Moves `span.finish()`, and with it the work of the tracer's recorder
+    or reporter, off the request thread.
+
+    The finish time is taken when the span is finished by the
+    instrumentation, then the span is appended to a bounded queue, which
+    a background thread drains by calling `span.finish(finish_time)`.
+    Appending to and popping from `collections.deque` are atomic, so
+    the request thread never waits for a lock.
+
+    To enable it for the spans started by `utils.start_child_span` and
+    `http_server.before_request`:
+
+    .. code-block:: python
+
+        from opentracing_instrumentation.config import CONFIG
+        from opentracing_instrumentation.span_finisher import \
+            BackgroundSpanFinisher
+
+        CONFIG.span_finisher = BackgroundSpanFinisher(max_queue_size=10000)
+
+    The counters (`enqueued`, `dropped`, `finished` and `errors`) are
+    best effort: concurrent increments on the request threads may be lost.
+
+    :param max_queue_size: maximum number of spans waiting to be finished
+    :param drop_policy: what to do with a span when the queue is full:
+        DROP_NEWEST discards that span, DROP_OLDEST discards the span that
+        has been waiting the longest, and FINISH_INLINE finishes the span
+        on the calling thread, so that no span is lost.
+    :param flush_interval: how often, in seconds, the background thread
+        drains the queue
+    """
+
+    def __init__(self, max_queue_size=10000, drop_policy=DROP_NEWEST,
+                 flush_interval=0.01):
+        if drop_policy not in _DROP_POLICIES:
+            raise ValueError('drop_policy must be one of %s, got %r' %
+                             (', '.join(_DROP_POLICIES), drop_policy))
+        self.max_queue_size = max_queue_size
+        self.drop_policy = drop_policy
+        self.flush_interval = flush_interval
+
+        self.enqueued = 0
+        self.dropped = 0
+        self.finished = 0
+        self.errors = 0
+
+        if drop_policy == DROP_OLDEST:
+            self._queue = collections.deque(maxlen=max_queue_size)
+        else:
+            self._queue = collections.deque()
+        self._stopped = threading.Event()
+        self._closed = False
+        self._thread = None
+        self._started = False
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._check_pid = _register_at_fork is None
+        if not self._check_pid:
+            # a weak reference, since the hook cannot be unregistered
+            ref = weakref.ref(self)
+
+            def after_in_child():
+                finisher = ref()
+                if finisher is not None:
+                    finisher._after_fork()
+
+            _register_at_fork(after_in_child=after_in_child)
+
+    def wrap(self, span):
+        """
+        :param span: a started span
+        :return: a proxy of the span, whose `finish()` hands the span
+            over to this finisher
+        """
+        return _DeferredFinishSpan(span, self)
+
+    def finish(self, span, finish_time=None):
+        """
+        Queue the span to be finished by the background thread.
+
+        :param span: the span to finish
+        :param finish_time: the finish time, defaults to now
+        """
+        if finish_time is None:
+            finish_time = time.time()
+        if self._closed:
+            self._finish_span(span, finish_time)
+            return
+        if not self._started or \
+                (self._check_pid and self._pid != os.getpid()):
+            self._start()
+
+        queue = self._queue
+        if len(queue) >= self.max_queue_size:
+            if self.drop_policy == DROP_NEWEST:
+                self.dropped += 1
+                return
+            if self.drop_policy == FINISH_INLINE:
+                self._finish_span(span, finish_time)
+                return
+            self.dropped += 1  # the deque discards the oldest span
+        queue.append((span, finish_time))
+        self.enqueued += 1
+
+    def flush(self, timeout=None):
+        """
+        Finish the queued spans on the calling thread.
+
+        :param timeout: optional number of seconds after which to give up
+        :return: True if the queue was drained
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while self._queue:
+            if deadline is not None and time.time() > deadline:
+                return False
+            self._drain(deadline)
+        return True
+
+    def close(self, timeout=None):
+        """
+        Stop the background thread and finish the spans still queued.
+        Spans finished afterwards are finished on the calling thread.
+
+        :param timeout: optional number of seconds to wait for the queue
+            to be drained
+        :return: True if the queue was drained
+        """
+        self._closed = True
+        self._stopped.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout)
+        return self.flush(timeout)
+
+    def _start(self):
+        with self._start_lock:
+            # after a fork only the forking thread survives in the child
+            if self._started and self._pid == os.getpid():
+                return
+            self._thread = threading.Thread(
+                target=self._run, name='opentracing-span-finisher')
+            self._thread.daemon = True
+            self._thread.start()
+            self._pid = os.getpid()
+            self._started = True
+
+    def _after_fork(self):
+        # the lock may have been held by another thread of the parent
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self._started = False
+
+    def _run(self):
+        while not self._stopped.wait(self.flush_interval):
+            self._drain()
+
+    def _drain(self, deadline=None):
+        queue = self._queue
+        while queue:
+            if deadline is not None and time.time() > deadline:
+                return
+            try:
+                span, finish_time = queue.popleft()
+            except IndexError:  # drained by another thread
+                return
+            self._finish_span(span, finish_time)
+
+    def _finish_span(self, span, finish_time):
+        try:
+            span.finish(finish_time=finish_time)
+            self.finished += 1
+        except Exception:
+            self.errors += 1
+            log.exception('Failed to finish span')
+
+
+class _DeferredFinishSpan(wrapt.ObjectProxy):
+    """
+    A span proxy that hands the span over to a `BackgroundSpanFinisher`
+    when it is finished, including when used as a context manager.
+    """
+    __slots__ = ('_finisher', )
+
+    def __init__(self, span, finisher):
+        super(_DeferredFinishSpan, self).__init__(wrapped=span)
+        self._finisher = finisher
+
+    def finish(self, finish_time=None):
+        self._finisher.finish(self.__wrapped__, finish_time)
+
+    # the methods returning the span return the proxy, so that chained
+    # calls such as span.set_tag(...).finish() go through the finisher
+
+    def set_operation_name(self, operation_name):
+        self.__wrapped__.set_operation_name(operation_name)
+        return self
+
+    def set_tag(self, key, value):
+        self.__wrapped__.set_tag(key, value)
+        return self
+
+    def set_baggage_item(self, key, value):
+        self.__wrapped__.set_baggage_item(key, value)
+        return self
+
+    def log_kv(self, key_values, timestamp=None):
+        self.__wrapped__.log_kv(key_values, timestamp)
+        return self
+
+    def log_event(self, event, payload=None):
+        self.__wrapped__.log_event(event, payload)
+        return self
+
+    def log(self, **kwargs):
+        self.__wrapped__.log(**kwargs)
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        opentracing.Span.__exit__(self, exc_type, exc_val, exc_tb)
@@ -21,12 +21,79 @@ from __future__ import absolute_import
 
 import opentracing
 
+from .config import CONFIG
+
+try:
+    from functools import lru_cache
+except ImportError:  # Python 2
+    def lru_cache(maxsize=128):
+        """A stand-in for functools.lru_cache that does not cache."""
+        return lambda func: func
+
+
+class _NonRecordingSpan(opentracing.Span):
+    """
+    A span that records nothing, see `non_recording_span`.
+
+    It carries the parent's SpanContext, so that the context keeps
+    propagating to nested calls and downstream services, while tags, logs
+    and finish() are no-ops inherited from `opentracing.Span`.
+
+    Baggage is written to a copy of the context made by its
+    `with_baggage_item()`, as with basictracer and Jaeger contexts, and
+    is dropped for contexts that cannot be copied that way.
+    """
+
+    def set_baggage_item(self, key, value):
+        with_baggage_item = getattr(self._context, 'with_baggage_item', None)
+        if with_baggage_item is not None:
+            self._context = with_baggage_item(key, value)
+        return self
+
+    def get_baggage_item(self, key):
+        return self.context.baggage.get(key)
+
+
+class _UnsampledSpan(_NonRecordingSpan):
+    """
+    A non-recording child of a span that is known to be unsampled, which
+    keeps the sampling decision propagating.
+    """
+
+
+def is_unsampled(span):
+    """
+    Check whether the span is known to be excluded from sampling.
+
+    Tracers are not required to expose the sampling decision, so only
+    Jaeger-like spans (`span.is_sampled()`) and basictracer-like contexts
+    (`span.context.sampled`) are recognized. When the decision is unknown
+    the span is assumed to be sampled.
+
+    :param span: Span or None
+    :return: True if the span is known to be unsampled
+    """
+    if span is None:
+        return False
+    if isinstance(span, _UnsampledSpan):
+        return True
+    is_sampled = getattr(span, 'is_sampled', None)
+    if callable(is_sampled):
+        return not is_sampled()
+    return getattr(span.context, 'sampled', True) is False
+
 
 def start_child_span(operation_name, tracer=None, parent=None, tags=None):
     """
     Start a new span as a child of parent_span. If parent_span is None,
     start a new root span.
 
+    If the parent is known to be unsampled (see `is_unsampled`), the tracer
+    is not called at all and a no-op span sharing the parent's context is
+    returned instead.
+
+    If `CONFIG.span_finisher` is set, the returned span is finished by it.
+
     :param operation_name: operation name
     :param tracer: Tracer or None (defaults to opentracing.tracer)
     :param parent: parent Span or None
@@ -34,8 +101,36 @@ def start_child_span(operation_name, tracer=None, parent=None, tags=None):
     :return: new span
     """
     tracer = tracer or opentracing.tracer
-    return tracer.start_span(
+    if is_unsampled(parent):
+        # a span of its own, so that the baggage set on it does not leak
+        # into the parent
+        return _UnsampledSpan(tracer=tracer, context=parent.context)
+    span = tracer.start_span(
         operation_name=operation_name,
         child_of=parent.context if parent else None,
         tags=tags
     )
+    if CONFIG.span_finisher is not None:
+        span = CONFIG.span_finisher.wrap(span)
+    return span
+
+
+def non_recording_span(parent=None, tracer=None):
+    """
+    Return a span that records nothing, e.g. for a request that is not to
+    be traced. It carries the parent's context, if any, so that the
+    context can still be propagated to downstream services.
+
+    The span is only reported as unsampled by `is_unsampled` if the
+    parent is.
+
+    :param parent: parent Span or None
+    :param tracer: Tracer or None (defaults to opentracing.tracer)
+    :return: new span
+    """
+    tracer = tracer or opentracing.tracer
+    if is_unsampled(parent):
+        return _UnsampledSpan(tracer=tracer, context=parent.context)
+    context = parent.context if parent is not None \
+        else opentracing.SpanContext()
+    return _NonRecordingSpan(tracer=tracer, context=context)
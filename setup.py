@@ -40,10 +40,14 @@ setup(
     ],
     extras_require={
         'tests': [
+            'aiopg; python_version>="3.7"',
+            'aiosqlite; python_version>="3.7"',
+            'asyncpg; python_version>="3.6"',
             'boto3',
             'botocore',
             'celery',
             'doubles',
+            'fakeredis',
             'flake8',
             'flake8-quotes',
             'mock',
@@ -52,6 +56,7 @@ setup(
             'psycopg2-binary',
             'sqlalchemy>=1.3.7',
             'pytest',
+            'pytest-benchmark',
             'pytest-cov',
             'pytest-localserver',
             'pytest-mock',
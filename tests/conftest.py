@@ -18,6 +18,8 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
+import sys
+
 import opentracing
 import pytest
 from opentracing.scope_managers.tornado import TornadoScopeManager
@@ -52,3 +54,30 @@ def thread_safe_tracer():
         yield dummy_tracer
     finally:
         opentracing.tracer = old_tracer
+
+
+@pytest.fixture
+def contextvars_tracer():
+    from opentracing_instrumentation.request_context import (
+        ContextVarsScopeManager,
+    )
+    if ContextVarsScopeManager is None:
+        pytest.skip('contextvars are not available')
+
+    old_tracer, dummy_tracer = _get_tracers(ContextVarsScopeManager())
+    try:
+        yield dummy_tracer
+    finally:
+        opentracing.tracer = old_tracer
+
+
+collect_ignore = []
+if sys.version_info < (3, 6):
+    collect_ignore.append(
+        'opentracing_instrumentation/test_traced_function_asyncio.py')
+    collect_ignore.append(
+        'opentracing_instrumentation/test_redis_asyncio.py')
+    collect_ignore.append(
+        'opentracing_instrumentation/test_sqlalchemy_asyncio.py')
+    collect_ignore.append('opentracing_instrumentation/test_asyncpg.py')
+    collect_ignore.append('opentracing_instrumentation/test_aiopg.py')
@@ -0,0 +1,99 @@
+# Copyright (c) 2016 Uber Technologies, Inc.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+# Python 3.6+ only, see collect_ignore in tests/conftest.py
+
+import asyncio
+
+import mock
+import pytest
+
+from opentracing_instrumentation import span_in_context
+from opentracing_instrumentation.client_hooks import aiopg, psycopg2
+
+aiopg_client = pytest.importorskip('aiopg')
+
+Cursor = aiopg_client.connection.Cursor
+
+
+@pytest.fixture
+def driver_calls(monkeypatch):
+    """
+    Replace the methods of the cursor, before they are patched, by
+    coroutines that record their calls instead of talking to a server.
+    """
+    calls = []
+
+    def fake_method(name):
+        async def method(self, *args, **kwargs):
+            await asyncio.sleep(0)
+            calls.append((name, args, kwargs))
+        return method
+
+    monkeypatch.setattr(Cursor, 'execute', fake_method('execute'))
+    monkeypatch.setattr(Cursor, 'callproc', fake_method('callproc'))
+    aiopg.install_patches()
+    try:
+        yield calls
+    finally:
+        aiopg.reset_patches()
+
+
+def test_cursor_methods(contextvars_tracer, driver_calls):
+    cursor = object.__new__(Cursor)
+
+    async def queries():
+        parent = contextvars_tracer.start_span(operation_name='parent')
+        with span_in_context(parent):
+            await cursor.execute('BEGIN')
+            await cursor.execute('SELECT * FROM users WHERE id = %s', (42,))
+            await cursor.callproc('get_user', [42], timeout=1)
+            await cursor.execute('COMMIT')
+        parent.finish()
+
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(queries())
+    finally:
+        loop.close()
+
+    assert driver_calls[2] == ('callproc', ('get_user', [42]),
+                               {'timeout': 1})
+    *spans, parent = contextvars_tracer.recorder.get_spans()
+    assert [span.operation_name for span in spans] == [
+        'aiopg:begin-trans', 'aiopg:SELECT', 'aiopg:', 'aiopg:commit']
+    assert spans[1].tags['sql'] == 'SELECT * FROM users WHERE id = %s'
+    assert spans[1].tags['sql.params'] == (42,)
+    # named like callproc() of the sync drivers
+    assert spans[2].tags['sql'] == 'sproc:get_user'
+    assert spans[2].tags['sql.params'] == [42]
+    for span in spans:
+        assert span.parent_id == parent.context.span_id
+
+
+def test_psycopg2_async_connections_are_not_wrapped():
+    connection = mock.Mock()
+    connect = mock.Mock(return_value=connection)
+    factory = psycopg2.Psycopg2ConnectionFactory(
+        connect_func=connect, module_name='psycopg2')
+
+    assert factory('dbname=test', async_=True) is connection
+    assert factory('dbname=test', **{'async': 1}) is connection
+    assert factory('dbname=test').__wrapped__ is connection
@@ -0,0 +1,243 @@
+# Copyright (c) 2016 Uber Technologies, Inc.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+# Python 3.6+ only, see collect_ignore in tests/conftest.py
+
+import asyncio
+
+import pytest
+from opentracing.ext import tags
+
+from opentracing_instrumentation import span_in_context
+from opentracing_instrumentation.client_hooks import asyncpg
+from opentracing_instrumentation.client_hooks._async_dbapi2 import (
+    transaction_statement,
+)
+
+asyncpg_client = pytest.importorskip('asyncpg')
+
+Connection = asyncpg_client.connection.Connection
+PreparedStatement = asyncpg_client.prepared_stmt.PreparedStatement
+
+
+class FakeConnection(Connection):
+    """A connection without a server, see driver_calls."""
+    __slots__ = ()
+
+    def __init__(self):
+        pass
+
+    def __del__(self):
+        pass
+
+
+class FakePreparedStatement(PreparedStatement):
+    __slots__ = ()
+
+    def __init__(self):
+        pass
+
+    def __del__(self):
+        pass
+
+    def get_query(self):
+        return 'SELECT * FROM users WHERE id = $1'
+
+
+@pytest.fixture
+def driver_calls(monkeypatch):
+    """
+    Replace the methods of the driver, before they are patched, by
+    coroutines that record their calls instead of talking to a server.
+    """
+    calls = []
+
+    def fake_method(name):
+        async def method(self, *args, **kwargs):
+            await asyncio.sleep(0)
+            calls.append((name, args, kwargs))
+            if name == 'fetchval' and args[0] == 'FAIL':
+                raise RuntimeError('failed')
+            return name
+        return method
+
+    for cls, methods in [(Connection, asyncpg.CONNECTION_METHODS),
+                         (PreparedStatement,
+                          asyncpg.PREPARED_STATEMENT_METHODS)]:
+        for name, _, _ in methods:
+            monkeypatch.setattr(cls, name, fake_method(name))
+
+    asyncpg.install_patches()
+    try:
+        yield calls
+    finally:
+        asyncpg.reset_patches()
+
+
+def run_traced(tracer, coro_func):
+    async def traced():
+        parent = tracer.start_span(operation_name='parent')
+        with span_in_context(parent):
+            result = await coro_func()
+        parent.finish()
+        return result
+
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(traced())
+    finally:
+        loop.close()
+
+
+def child_spans(tracer):
+    return [span for span in tracer.recorder.get_spans()
+            if span.operation_name != 'parent']
+
+
+def test_connection_methods(contextvars_tracer, driver_calls):
+    connection = FakeConnection()
+
+    async def queries():
+        await connection.execute('INSERT INTO users VALUES ($1)', 'alice')
+        await connection.fetch('SELECT * FROM users WHERE id = $1', 42)
+        await connection.fetchrow('SELECT 1')
+        return await connection.fetchval('SELECT 2', column=0)
+
+    assert run_traced(contextvars_tracer, queries) == 'fetchval'
+    assert driver_calls[-1] == ('fetchval', ('SELECT 2',), {'column': 0})
+
+    spans = child_spans(contextvars_tracer)
+    assert [span.operation_name for span in spans] == [
+        'asyncpg:INSERT', 'asyncpg:SELECT', 'asyncpg:SELECT',
+        'asyncpg:SELECT']
+    insert, fetch = spans[:2]
+    assert insert.tags['sql'] == 'INSERT INTO users VALUES ($1)'
+    assert insert.tags['sql.params'] == ('alice',)
+    assert insert.tags[tags.SPAN_KIND] == tags.SPAN_KIND_RPC_CLIENT
+    assert fetch.tags['sql.params'] == (42,)
+    assert 'sql.params' not in spans[2].tags
+    parent = contextvars_tracer.recorder.get_spans()[-1]
+    for span in spans:
+        assert span.parent_id == parent.context.span_id
+
+
+def test_executemany_and_copy(contextvars_tracer, driver_calls):
+    connection = FakeConnection()
+    rows = [(i, 'name') for i in range(100)]
+
+    async def queries():
+        await connection.executemany('INSERT INTO users VALUES ($1, $2)',
+                                     rows)
+        await connection.copy_records_to_table(
+            'users', records=rows, schema_name='public')
+        await connection.copy_from_query('SELECT * FROM users', output='f')
+
+    run_traced(contextvars_tracer, queries)
+
+    executemany, copy_in, copy_out = child_spans(contextvars_tracer)
+    assert executemany.operation_name == 'asyncpg:INSERT'
+    assert executemany.tags['sql.params.rows'] == 100
+    assert 'sql.params' not in executemany.tags
+    assert copy_in.operation_name == 'asyncpg:COPY'
+    assert copy_in.tags['sql'] == 'COPY public.users FROM STDIN'
+    assert copy_in.tags['sql.params.rows'] == 100
+    assert copy_out.tags['sql'] == 'COPY (SELECT * FROM users) TO STDOUT'
+
+
+def test_prepared_statement(contextvars_tracer, driver_calls):
+    connection = FakeConnection()
+    statement = FakePreparedStatement()
+
+    async def queries():
+        await connection.prepare('SELECT * FROM users WHERE id = $1')
+        await statement.fetch(42)
+        await statement.executemany([(1,), (2,)])
+
+    run_traced(contextvars_tracer, queries)
+
+    prepare, fetch, executemany = child_spans(contextvars_tracer)
+    assert prepare.operation_name == 'asyncpg:PREPARE'
+    assert fetch.operation_name == 'asyncpg:SELECT'
+    assert fetch.tags['sql'] == 'SELECT * FROM users WHERE id = $1'
+    assert fetch.tags['sql.params'] == (42,)
+    assert executemany.tags['sql.params.rows'] == 2
+
+
+def test_transaction_statements(contextvars_tracer, driver_calls):
+    connection = FakeConnection()
+
+    async def queries():
+        await connection.execute('BEGIN ISOLATION LEVEL SERIALIZABLE;')
+        await connection.execute('SAVEPOINT sp')
+        await connection.execute('ROLLBACK TO sp;')
+        await connection.execute('COMMIT;')
+
+    run_traced(contextvars_tracer, queries)
+
+    assert [span.operation_name
+            for span in child_spans(contextvars_tracer)] == [
+        'asyncpg:begin-trans', 'asyncpg:SAVEPOINT', 'asyncpg:ROLLBACK',
+        'asyncpg:commit']
+
+
+def test_error(contextvars_tracer, driver_calls):
+    connection = FakeConnection()
+
+    async def query():
+        with pytest.raises(RuntimeError):
+            await connection.fetchval('FAIL')
+
+    run_traced(contextvars_tracer, query)
+    span, = child_spans(contextvars_tracer)
+    assert span.tags[tags.ERROR] is True
+
+
+def test_no_parent_span(contextvars_tracer, driver_calls):
+    connection = FakeConnection()
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(connection.execute('SELECT 1'))
+    finally:
+        loop.close()
+    assert driver_calls == [('execute', ('SELECT 1',), {})]
+    assert contextvars_tracer.recorder.get_spans() == []
+
+
+def test_reset_patches(driver_calls):
+    fetch = Connection.fetch
+    asyncpg.reset_patches()
+    assert Connection.fetch is not fetch
+    assert Connection.fetch.__name__ == 'method'
+
+
+@pytest.mark.parametrize('statement,expected', [
+    ('BEGIN', 'begin-trans'),
+    ('begin;', 'begin-trans'),
+    ('START TRANSACTION READ ONLY', 'begin-trans'),
+    ('START', 'START'),
+    ('COMMIT', 'commit'),
+    ('END TRANSACTION;', 'commit'),
+    ('ROLLBACK WORK', 'rollback'),
+    ('ROLLBACK WORK TO SAVEPOINT sp', 'ROLLBACK WORK TO SAVEPOINT sp'),
+    ('SELECT 1', 'SELECT 1'),
+    ('', ''),
+])
+def test_transaction_statement(statement, expected):
+    assert transaction_statement(statement) == expected
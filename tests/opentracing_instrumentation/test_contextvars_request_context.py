@@ -0,0 +1,92 @@
+# Copyright (c) 2016 Uber Technologies, Inc.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+from __future__ import absolute_import
+
+import threading
+
+from opentracing_instrumentation.request_context import (
+    RequestContext,
+    RequestContextManager,
+    get_current_span,
+    span_in_context,
+)
+from opentracing_instrumentation.client_hooks import _current_span
+
+
+def test_get_current_span(contextvars_tracer):
+    assert get_current_span() is None
+    span = contextvars_tracer.start_span(operation_name='parent')
+    with span_in_context(span):
+        assert get_current_span() is span
+        assert _current_span.current_span_func() is span
+        child = contextvars_tracer.start_span(operation_name='child')
+        with span_in_context(child):
+            assert get_current_span() is child
+        assert get_current_span() is span
+    assert get_current_span() is None
+
+
+def test_span_started_by_tracer_is_visible(contextvars_tracer):
+    with contextvars_tracer.start_active_span('parent') as scope:
+        assert get_current_span() is scope.span
+
+
+def test_request_context_manager_takes_precedence(contextvars_tracer):
+    span = contextvars_tracer.start_span(operation_name='parent')
+    legacy_span = contextvars_tracer.start_span(operation_name='legacy')
+    with span_in_context(span):
+        with RequestContextManager(RequestContext(span=legacy_span)):
+            assert get_current_span() is legacy_span
+        assert get_current_span() is span
+
+
+def test_threads_do_not_share_current_span(contextvars_tracer):
+    span = contextvars_tracer.start_span(operation_name='parent')
+    seen = []
+
+    def worker():
+        seen.append(get_current_span())
+
+    with span_in_context(span):
+        thread = threading.Thread(target=worker)
+        thread.start()
+        thread.join()
+    assert seen == [None]
+
+
+def test_asyncio_callbacks_inherit_current_span(contextvars_tracer):
+    import asyncio
+
+    loop = asyncio.new_event_loop()
+    span = contextvars_tracer.start_span(operation_name='parent')
+    seen = []
+
+    def callback():
+        seen.append(get_current_span())
+        loop.stop()
+
+    try:
+        with span_in_context(span):
+            loop.call_soon(callback)
+        assert get_current_span() is None
+        loop.run_forever()
+    finally:
+        loop.close()
+    assert seen == [span]
@@ -0,0 +1,156 @@
+# Copyright (c) 2016 Uber Technologies, Inc.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+from builtins import object
+import sqlite3
+
+import pytest
+
+from opentracing_instrumentation import span_in_context
+from opentracing_instrumentation.client_hooks import db_pool
+
+
+@pytest.fixture(autouse=True)
+def patch_pools():
+    db_pool.install_patches()
+    try:
+        yield
+    finally:
+        db_pool.reset_patches()
+
+
+@pytest.fixture
+def parent_span(tracer):
+    span = tracer.start_span(operation_name='parent')
+    with span_in_context(span):
+        yield span
+
+
+def pool_spans(tracer):
+    return [span for span in tracer.recorder.get_spans()
+            if span.operation_name != 'parent']
+
+
+def test_sqlalchemy_queue_pool(tracer, parent_span):
+    from sqlalchemy.pool import QueuePool
+    pool = QueuePool(creator=lambda: sqlite3.connect(':memory:'),
+                     pool_size=1, max_overflow=1)
+    first = pool.connect()
+    second = pool.connect()
+    second.close()
+    first.close()
+
+    spans = pool_spans(tracer)
+    assert [span.operation_name for span in spans] == [
+        'sqlalchemy:pool.checkout', 'sqlalchemy:pool.checkout',
+        'sqlalchemy:pool.checkin', 'sqlalchemy:pool.checkin',
+    ]
+    for span in spans:
+        assert span.parent_id == parent_span.context.span_id
+        assert span.tags['db.pool.size'] == 1
+
+    checkout = spans[1]
+    assert checkout.tags['db.pool.wait_ms'] >= 0
+    assert checkout.tags['db.pool.overflow'] == 1
+    assert checkout.tags['db.pool.checked_out'] == 2
+    assert 'db.pool.wait_ms' not in spans[2].tags
+    assert spans[3].tags['db.pool.checked_out'] == 0
+
+
+def test_sqlalchemy_queue_pool_without_parent(tracer):
+    from sqlalchemy.pool import QueuePool
+    pool = QueuePool(creator=lambda: sqlite3.connect(':memory:'))
+    pool.connect().close()
+    assert tracer.recorder.get_spans() == []
+
+
+class FakeConnection(object):
+    closed = False
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.mark.parametrize('pool_class', db_pool.PSYCOPG2_POOL_CLASSES)
+def test_psycopg2_pool(monkeypatch, tracer, parent_span, pool_class):
+    psycopg2_pool = pytest.importorskip('psycopg2.pool')
+    monkeypatch.setattr(psycopg2_pool.psycopg2, 'connect',
+                        lambda *args, **kwargs: FakeConnection())
+    pool = getattr(psycopg2_pool, pool_class)(0, 2)
+    conn = pool.getconn()
+    pool.putconn(conn)
+    assert conn.closed
+
+    getconn, putconn = pool_spans(tracer)
+    assert getconn.operation_name == 'psycopg2:pool.getconn'
+    assert getconn.tags['db.pool.wait_ms'] >= 0
+    assert getconn.tags['db.pool.size'] == 2
+    assert getconn.tags['db.pool.overflow'] == 1
+    assert getconn.tags['db.pool.checked_out'] == 1
+    assert putconn.operation_name == 'psycopg2:pool.putconn'
+    assert putconn.tags['db.pool.checked_out'] == 0
+
+
+def test_psycopg2_pool_exhausted(monkeypatch, tracer, parent_span):
+    psycopg2_pool = pytest.importorskip('psycopg2.pool')
+    monkeypatch.setattr(psycopg2_pool.psycopg2, 'connect',
+                        lambda *args, **kwargs: FakeConnection())
+    pool = psycopg2_pool.ThreadedConnectionPool(0, 1)
+    pool.getconn()
+    with pytest.raises(psycopg2_pool.PoolError):
+        pool.getconn()
+
+    span = pool_spans(tracer)[-1]
+    assert span.tags['error'] is True
+    assert span.tags['db.pool.checked_out'] == 1
+
+
+def test_psycopg2_pool_tags_without_private_attributes():
+    class Pool(object):
+        minconn = 0
+        maxconn = 2
+
+    pool = Pool()
+    assert db_pool.psycopg2_pool_tags(pool) == [('db.pool.size', 2)]
+    pool._used = {1: None}
+    assert db_pool.psycopg2_pool_tags(pool) == [
+        ('db.pool.size', 2), ('db.pool.checked_out', 1)]
+
+
+def test_missing_pool_method_is_skipped():
+    from sqlalchemy.pool import QueuePool
+
+    class RenamedPool(QueuePool):
+        pass
+
+    db_pool.reset_patches()
+    patcher = db_pool.patcher
+    patcher._patch(RenamedPool, '_do_get', 'sqlalchemy:pool.checkout',
+                   db_pool.sqlalchemy_pool_tags, checkout=True)
+    assert (RenamedPool, '_do_get') not in patcher.original_methods
+    assert '_do_get' not in RenamedPool.__dict__
+
+
+def test_reset_patches():
+    from sqlalchemy.pool import QueuePool
+    patched = QueuePool._do_get
+    db_pool.reset_patches()
+    assert QueuePool._do_get is not patched
+    assert not db_pool.patcher.original_methods
@@ -0,0 +1,159 @@
+# Copyright (c) 2016 Uber Technologies, Inc.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+from builtins import object
+import sqlite3
+
+import pytest
+
+from opentracing_instrumentation import span_in_context
+from opentracing_instrumentation.client_hooks._dbapi2 import CursorWrapper
+from opentracing_instrumentation.config import CONFIG
+
+
+class ServerSideCursorWrapper(CursorWrapper):
+    def _is_server_side(self):
+        return True
+
+
+@pytest.fixture
+def trace_fetches(monkeypatch):
+    monkeypatch.setattr(CONFIG, 'sql_trace_fetches', True)
+
+
+@pytest.fixture
+def cursor():
+    connection = sqlite3.connect(':memory:')
+    connection.execute('CREATE TABLE numbers (n INTEGER)')
+    connection.executemany('INSERT INTO numbers VALUES (?)',
+                           [(n, ) for n in range(10)])
+    try:
+        yield ServerSideCursorWrapper(cursor=connection.cursor(),
+                                      module_name='sqlite3')
+    finally:
+        connection.close()
+
+
+@pytest.fixture
+def parent_span(tracer):
+    span = tracer.start_span(operation_name='parent')
+    with span_in_context(span):
+        yield span
+
+
+def fetch_spans(tracer):
+    return [span for span in tracer.recorder.get_spans()
+            if span.operation_name == 'sqlite3:fetch']
+
+
+@pytest.mark.parametrize('fetch', [
+    lambda cursor: cursor.fetchall(),
+    lambda cursor: [row for row in cursor],
+    lambda cursor: iter(cursor.fetchone, None),
+    lambda cursor: iter(lambda: cursor.fetchmany(4), []),
+], ids=['fetchall', 'iteration', 'fetchone', 'fetchmany'])
+def test_fetch_span(tracer, trace_fetches, parent_span, cursor, fetch):
+    cursor.execute('SELECT n FROM numbers')
+    rows = list(fetch(cursor))
+    assert len(rows) in (10, 3)  # ten rows, or three batches
+
+    span, = fetch_spans(tracer)
+    assert span.parent_id == parent_span.context.span_id
+    assert span.tags['sql.fetch.rows'] == 10
+    assert span.tags['sql.fetch.time_ms'] >= 0
+
+
+def test_fetch_batches(tracer, trace_fetches, parent_span, cursor):
+    cursor.execute('SELECT n FROM numbers')
+    while cursor.fetchmany(4):
+        pass
+
+    span, = fetch_spans(tracer)
+    # 4 + 4 + 2 rows, then an empty batch
+    assert span.tags['sql.fetch.batches'] == 4
+
+
+def test_iteration_stopped_early(tracer, trace_fetches, parent_span,
+                                 cursor):
+    cursor.execute('SELECT n FROM numbers')
+    rows = iter(cursor)
+    for i, _ in enumerate(rows):
+        if i == 4:
+            break
+    # the span stays open while the iterator is still referenced
+    assert fetch_spans(tracer) == []
+    cursor.close()
+
+    span, = fetch_spans(tracer)
+    assert span.tags['sql.fetch.rows'] == 5
+    assert span.tags['sql.fetch.batches'] == 1
+    assert span.tags['sql.fetch.time_ms'] >= 0
+
+
+def test_fetch_span_finished_by_execute(tracer, trace_fetches, parent_span,
+                                        cursor):
+    cursor.execute('SELECT n FROM numbers')
+    cursor.fetchone()
+    cursor.fetchone()
+    assert fetch_spans(tracer) == []
+
+    cursor.execute('SELECT n FROM numbers')
+    cursor.fetchone()
+    cursor.close()
+
+    first, second = fetch_spans(tracer)
+    assert first.tags['sql.fetch.rows'] == 2
+    assert second.tags['sql.fetch.rows'] == 1
+
+
+def test_fetches_not_traced_by_default(tracer, parent_span, cursor):
+    cursor.execute('SELECT n FROM numbers')
+    assert len(cursor.fetchall()) == 10
+    assert fetch_spans(tracer) == []
+
+
+def test_client_side_cursor(tracer, trace_fetches, parent_span, cursor):
+    client_side = CursorWrapper(cursor=cursor.__wrapped__,
+                                module_name='sqlite3')
+    client_side.execute('SELECT n FROM numbers')
+    assert len(client_side.fetchall()) == 10
+    assert fetch_spans(tracer) == []
+
+
+def test_fetch_without_parent(tracer, trace_fetches, cursor):
+    cursor.execute('SELECT n FROM numbers')
+    assert len(cursor.fetchall()) == 10
+    assert tracer.recorder.get_spans() == []
+
+
+@pytest.mark.parametrize('name,server_side', [('stream', True),
+                                              (None, False)])
+def test_psycopg2_named_cursor(name, server_side):
+    pytest.importorskip('psycopg2')
+    from opentracing_instrumentation.client_hooks.psycopg2 import \
+        Psycopg2CursorWrapper
+
+    class Cursor(object):
+        pass
+
+    cursor = Cursor()
+    cursor.name = name
+    wrapper = Psycopg2CursorWrapper(cursor=cursor, module_name='psycopg2')
+    assert wrapper._is_server_side() is server_side
@@ -0,0 +1,159 @@
+# Copyright (c) 2017 Uber Technologies, Inc.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+from __future__ import absolute_import
+from __future__ import absolute_import
+
+import opentracing
+import pytest
+from six.moves.urllib.parse import urlsplit
+
+from opentracing_instrumentation import http_client, utils
+from opentracing_instrumentation.config import CONFIG
+from opentracing_instrumentation.http_client import (
+    AbstractRequestWrapper,
+    HTTPClientRules,
+    before_http_request,
+)
+
+
+class Request(AbstractRequestWrapper):
+    def __init__(self, url, method='GET'):
+        self.url = url
+        self._method = method
+        self.headers = {}
+
+    @property
+    def header_carrier(self):
+        return self.headers
+
+    @property
+    def method(self):
+        return self._method
+
+    @property
+    def full_url(self):
+        return self.url
+
+    @property
+    def host_port(self):
+        netloc = urlsplit(self.url).netloc
+        return http_client.split_host_and_port(netloc)
+
+
+RULES = [
+    {'host': '169.254.169.254', 'action': 'skip'},
+    {'path_prefix': '/health', 'action': 'skip'},
+    {'host': 'users', 'path_prefix': '/health/deep', 'action': 'trace'},
+    {'host': 'cache', 'method': 'get', 'action': 'propagate'},
+    {'host': 'cache', 'port': 8080, 'method': 'GET', 'action': 'trace'},
+    {'host': 'cache', 'path_prefix': '/api/v1/keys', 'action': 'skip'},
+]
+
+
+@pytest.mark.parametrize('url,method,action', [
+    ('http://169.254.169.254/latest/meta-data', 'GET', 'skip'),
+    ('http://users/health', 'GET', 'skip'),
+    ('http://users/health/', 'GET', 'skip'),
+    ('http://users/health/live', 'GET', 'skip'),
+    ('http://users/healthz', 'GET', 'trace'),
+    ('http://users/health/deep/db', 'GET', 'trace'),
+    ('http://USERS/api/users', 'GET', 'trace'),
+    ('http://cache/api/v2/keys', 'GET', 'propagate'),
+    ('http://cache/api/v2/keys', 'PUT', 'trace'),
+    ('http://cache:8080/api/v2/keys', 'GET', 'trace'),
+    # the longest path prefix wins over the more specific rule
+    ('http://cache:8080/api/v1/keys/a', 'GET', 'skip'),
+    ('http://orders/api', 'GET', 'trace'),
+])
+def test_rules_match(url, method, action):
+    rules = HTTPClientRules(RULES)
+    assert rules.match(Request(url, method)) == action
+
+
+def test_rules_first_duplicate_wins():
+    rules = HTTPClientRules([
+        {'host': 'users', 'path_prefix': '/api', 'action': 'trace'},
+        {'host': 'users', 'path_prefix': '/api', 'action': 'skip'},
+        {'host': 'users', 'path_prefix': '/admin', 'action': 'skip'},
+        {'host': 'users', 'path_prefix': '/admin', 'action': 'propagate'},
+    ])
+    assert rules.match(Request('http://users/api/users', 'GET')) == 'trace'
+    assert rules.match(Request('http://users/admin', 'GET')) == 'skip'
+
+
+def test_rules_reject_unknown_actions():
+    with pytest.raises(ValueError):
+        HTTPClientRules([{'host': 'users', 'action': 'sample'}])
+
+
+@pytest.fixture
+def rules():
+    CONFIG.http_client_rules = HTTPClientRules(RULES)
+    try:
+        yield
+    finally:
+        CONFIG.http_client_rules = None
+
+
+def _send(url, parent, method='GET'):
+    request = Request(url, method)
+    span = before_http_request(request=request,
+                               current_span_extractor=lambda: parent)
+    span.set_tag('http.status_code', 200)
+    span.finish()
+    return span, request.headers
+
+
+def test_before_http_request_with_rules(tracer, rules):
+    parent = tracer.start_span(operation_name='parent')
+
+    span, headers = _send('http://users/health', parent)
+    assert isinstance(span, utils._NonRecordingSpan)
+    # the trace is sampled, the request is just not recorded
+    assert not utils.is_unsampled(span)
+    assert headers == {}
+
+    span, headers = _send('http://cache/api/v2/keys', parent)
+    assert isinstance(span, utils._NonRecordingSpan)
+    assert not utils.is_unsampled(span)
+    ctx = tracer.extract(opentracing.Format.HTTP_HEADERS, headers)
+    assert ctx.span_id == parent.context.span_id
+
+    span, headers = _send('http://users/api/users', parent)
+    ctx = tracer.extract(opentracing.Format.HTTP_HEADERS, headers)
+    assert ctx.span_id == span.context.span_id
+
+    spans = tracer.recorder.get_spans()
+    assert [s.operation_name for s in spans] == ['GET']
+
+
+def test_before_http_request_with_rules_of_unsampled_parent(tracer, rules):
+    parent = tracer.start_span(operation_name='parent')
+    parent.context.sampled = False
+    span, headers = _send('http://cache/api/v2/keys', parent)
+    assert utils.is_unsampled(span)
+    ctx = tracer.extract(opentracing.Format.HTTP_HEADERS, headers)
+    assert ctx.sampled is False
+
+
+def test_before_http_request_with_rules_without_parent(tracer, rules):
+    span, headers = _send('http://cache/api/v2/keys', None)
+    assert headers == {}
+    assert tracer.recorder.get_spans() == []
@@ -0,0 +1,156 @@
+# Copyright (c) 2017 Uber Technologies, Inc.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+from __future__ import absolute_import
+from __future__ import absolute_import
+
+import pytest
+
+from opentracing_instrumentation.config import CONFIG
+from opentracing_instrumentation.http_router import Router, regex_template
+from opentracing_instrumentation.http_server import WSGIRequestWrapper
+
+TEMPLATES = [
+    '/users',
+    '/users/{id}',
+    '/users/me',
+    '/users/{id}/orders/{order_id}',
+    '/reports/{name}.json',
+    '/reports/{name}.csv',
+    '/static/{filename:path}',
+]
+
+
+@pytest.mark.parametrize('path,template', [
+    ('/users', '/users'),
+    ('/users/', '/users'),
+    ('/users/12345', '/users/{id}'),
+    ('/users/me', '/users/me'),
+    ('/users/me/orders/1', '/users/{id}/orders/{order_id}'),
+    ('/reports/daily.json', '/reports/{name}.json'),
+    ('/reports/daily.csv', '/reports/{name}.csv'),
+    ('/static/css/site.css', '/static/{filename:path}'),
+    ('/users/1/orders', None),
+    ('/reports/daily.xml', None),
+    ('/', None),
+])
+def test_match(path, template):
+    assert Router(TEMPLATES).match(path) == template
+
+
+def test_regex_routes():
+    router = Router(templates=['/users/{id}'], regex_routes=[
+        (r'^/v\d+/items/(\d+)$', '/v{}/items/{}'),
+    ])
+    assert router.match('/users/1') == '/users/{id}'
+    assert router.match('/v2/items/42') == '/v{}/items/{}'
+    assert router.match('/v2/items/x') is None
+
+
+def test_rest_parameter_must_be_last():
+    with pytest.raises(ValueError):
+        Router(['/static/{path:path}/x'])
+
+
+@pytest.mark.parametrize('pattern,template', [
+    (r'^/users/(?P<id>[0-9]+)/?$', '/users/{id}/'),
+    (r'/files/(.*)$', '/files/{}'),
+    (r'^/a\.b/(?:x|y)/(?P<n>\d+)\Z', '/a.b/{}/{n}'),
+])
+def test_regex_template(pattern, template):
+    assert regex_template(pattern) == template
+
+
+def test_from_werkzeug():
+    routing = pytest.importorskip('werkzeug.routing')
+    url_map = routing.Map([
+        routing.Rule('/users/<int:user_id>'),
+        routing.Rule('/users/<user_id>/avatar.<any(png, jpg):ext>'),
+        routing.Rule('/static/<path:filename>'),
+    ])
+    router = Router.from_werkzeug(url_map)
+    assert router.match('/users/1') == '/users/{user_id}'
+    assert router.match('/users/1/avatar.png') == \
+        '/users/{user_id}/avatar.{ext}'
+    assert router.match('/static/a/b.css') == '/static/{filename:path}'
+
+
+def test_from_django():
+    pytest.importorskip('django')
+    from django.conf import settings
+    if not settings.configured:
+        settings.configure()
+    from django.urls import include, path, re_path
+
+    def view(request):
+        pass
+
+    urlpatterns = [
+        path('users/<int:pk>/', view),
+        path('api/', include([
+            path('orders/<slug:order_id>', view),
+            re_path(r'^items/(?P<item_id>\d+)/$', view),
+        ])),
+    ]
+    router = Router.from_django(urlpatterns)
+    assert router.match('/users/1/') == '/users/{pk}/'
+    assert router.match('/api/orders/abc') == '/api/orders/{order_id}'
+    assert router.match('/api/items/7/') == '/api/items/{item_id}/'
+    assert router.match('/api/items/x/') is None
+
+
+def test_from_tornado():
+    web = pytest.importorskip('tornado.web')
+    app = web.Application([
+        (r'/users/([0-9]+)', web.RequestHandler),
+        (r'/files/(?P<name>.*)', web.RequestHandler),
+    ])
+    router = Router.from_tornado(app)
+    assert router.match('/users/12') == '/users/{}'
+    assert router.match('/files/a/b') == '/files/{name}'
+    assert router.match('/users/x') is None
+
+
+@pytest.fixture
+def router():
+    CONFIG.http_server_router = Router(TEMPLATES)
+    try:
+        yield CONFIG.http_server_router
+    finally:
+        CONFIG.http_server_router = None
+
+
+def _wsgi_request(path, script_name=''):
+    return WSGIRequestWrapper.from_wsgi_environ({
+        'wsgi.url_scheme': 'http',
+        'REQUEST_METHOD': 'GET',
+        'SCRIPT_NAME': script_name,
+        'PATH_INFO': path,
+        'HTTP_HOST': 'localhost',
+    })
+
+
+def test_operation(router):
+    assert _wsgi_request('/users/1').operation == 'GET:/users/{id}'
+    assert _wsgi_request('/users/1', '/api').operation == 'GET:/users/{id}'
+    assert _wsgi_request('/unknown/1').operation == 'GET'
+
+
+def test_operation_without_router():
+    assert _wsgi_request('/users/1').operation == 'GET'
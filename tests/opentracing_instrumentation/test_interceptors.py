@@ -0,0 +1,171 @@
+# Copyright (c) 2017 Uber Technologies, Inc.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+from __future__ import absolute_import
+from __future__ import absolute_import
+
+import mock
+import pytest
+
+from opentracing_instrumentation.http_client import (
+    AbstractRequestWrapper,
+    before_http_request,
+)
+from opentracing_instrumentation.http_server import WSGIRequestWrapper
+from opentracing_instrumentation.http_server import before_request
+from opentracing_instrumentation.interceptors import (
+    ClientInterceptors,
+    OpenTracingInterceptor,
+    ServerInterceptors,
+)
+
+
+class RecordingInterceptor(OpenTracingInterceptor):
+    def __init__(self, name, calls, hosts=None, url_pattern=None,
+                 path_pattern=None):
+        self.name = name
+        self.calls = calls
+        self.hosts = hosts
+        self.url_pattern = url_pattern
+        self.path_pattern = path_pattern
+
+    def process(self, request, span):
+        self.calls.append(self.name)
+        span.set_tag('intercepted.by', self.name)
+
+
+class Request(AbstractRequestWrapper):
+    def __init__(self, url, host):
+        self.url = url
+        self.host = host
+
+    @property
+    def method(self):
+        return 'GET'
+
+    @property
+    def full_url(self):
+        return self.url
+
+    @property
+    def host_port(self):
+        return self.host, 80
+
+
+@pytest.fixture
+def calls():
+    calls = []
+    try:
+        yield calls
+    finally:
+        ClientInterceptors.clear()
+        ServerInterceptors.clear()
+
+
+def send(url='http://users/api/v1/users', host='users'):
+    before_http_request(request=Request(url, host),
+                        current_span_extractor=lambda: None).finish()
+
+
+def test_registry_publishes_immutable_chain(calls):
+    first = RecordingInterceptor('first', calls)
+    second = RecordingInterceptor('second', calls)
+    ClientInterceptors.append(second)
+    interceptors = ClientInterceptors.get_interceptors()
+    ClientInterceptors.insert(0, first)
+
+    assert interceptors == [second]
+    # callers may change the returned list, but not the registry
+    interceptors.append(first)
+    assert ClientInterceptors.get_interceptors() == [first, second]
+    assert [process for process, _ in ClientInterceptors.get_chain()] == \
+        [first.process, second.process]
+
+    ClientInterceptors.clear()
+    assert ClientInterceptors.get_interceptors() == []
+    assert ClientInterceptors.get_chain() == ()
+
+
+def test_registry_rejects_other_objects():
+    with pytest.raises(ValueError):
+        ClientInterceptors.append(mock.Mock())
+    assert ClientInterceptors.get_interceptors() == []
+
+
+def test_interceptors_run_in_order(tracer, calls):
+    ClientInterceptors.append(RecordingInterceptor('second', calls))
+    ClientInterceptors.insert(0, RecordingInterceptor('first', calls))
+    send()
+    assert calls == ['first', 'second']
+
+
+def test_interceptor_filters(tracer, calls):
+    ClientInterceptors.append(RecordingInterceptor(
+        'users', calls, hosts=['users']))
+    ClientInterceptors.append(RecordingInterceptor(
+        'api', calls, url_pattern=r'/api/v\d+/'))
+    ClientInterceptors.append(RecordingInterceptor(
+        'both', calls, hosts=['orders'], url_pattern='/api/'))
+
+    send('http://users/api/v1/users', 'users')
+    assert calls == ['users', 'api']
+    del calls[:]
+    send('http://orders/health', 'orders')
+    assert calls == []
+    send('http://orders/api/orders', 'orders')
+    assert calls == ['both']
+
+
+def receive(tracer, path, query=''):
+    request = WSGIRequestWrapper.from_wsgi_environ({
+        'wsgi.url_scheme': 'http',
+        'REQUEST_METHOD': 'GET',
+        'SCRIPT_NAME': '',
+        'PATH_INFO': path,
+        'QUERY_STRING': query,
+        'HTTP_HOST': 'localhost',
+    })
+    return before_request(request=request, tracer=tracer)
+
+
+def test_server_interceptors(tracer, calls):
+    ServerInterceptors.append(RecordingInterceptor('all', calls))
+    span = receive(tracer, '/health')
+    assert calls == ['all']
+    assert span.tags['intercepted.by'] == 'all'
+    # the registries are separate
+    assert ClientInterceptors.get_interceptors() == []
+    send()
+    assert calls == ['all']
+
+
+def test_server_interceptor_filters(tracer, calls):
+    ServerInterceptors.append(RecordingInterceptor(
+        'tenants', calls, path_pattern=r'/tenants/[^/]+/'))
+    ServerInterceptors.append(RecordingInterceptor(
+        'debug', calls, url_pattern=r'[?&]debug=1'))
+
+    receive(tracer, '/tenants/acme/users')
+    assert calls == ['tenants']
+    del calls[:]
+    receive(tracer, '/users/tenants/acme/', 'debug=1')
+    assert calls == ['debug']
+    del calls[:]
+    receive(tracer, '/users')
+    assert calls == []
@@ -19,12 +19,21 @@
 # THE SOFTWARE.
 from __future__ import absolute_import
 
+import sqlite3
+
+import pytest
 from mock import patch
 
 import opentracing
 from opentracing.scope_managers import ThreadLocalScopeManager
 from opentracing_instrumentation.local_span import func_span
 from opentracing_instrumentation.client_hooks._dbapi2 import db_span, _COMMIT
+from opentracing_instrumentation.client_hooks._dbapi2 import sql_fingerprint
+from opentracing_instrumentation.client_hooks._dbapi2 import \
+    SQL_CACHE_MAX_STATEMENT_LENGTH
+from opentracing_instrumentation.client_hooks._dbapi2 import sql_params_tags
+from opentracing_instrumentation.client_hooks._dbapi2 import CursorWrapper
+from opentracing_instrumentation.config import CONFIG
 from opentracing_instrumentation.client_hooks._singleton import singleton
 from opentracing_instrumentation import span_in_context
 
@@ -63,6 +72,125 @@ def test_db_span():
             assert span is child_span
 
 
+def test_db_span_tags(tracer):
+    parent = tracer.start_span(operation_name='parent')
+    statements = [
+        "  SELECT * FROM users\n WHERE id = 42 AND name = 'x'  ",
+        b"SELECT * FROM users WHERE id = 7 AND name = 'it''s'",
+        _COMMIT,
+    ]
+    with span_in_context(span=parent):
+        for statement in statements:
+            with db_span(statement, 'MySQLdb'):
+                pass
+
+    first, second, commit = tracer.recorder.get_spans()
+    assert first.operation_name == 'MySQLdb:SELECT'
+    assert first.tags['sql'] == \
+        'SELECT * FROM users WHERE id = ? AND name = ?'
+    assert second.operation_name == 'MySQLdb:SELECT'
+    assert second.tags['sql'] is first.tags['sql']
+    assert commit.operation_name == 'MySQLdb:commit'
+    assert 'sql' not in commit.tags
+
+
+def test_db_span_of_long_statement(tracer):
+    statement = '\n INSERT INTO t VALUES ' + \
+        ', '.join("(%d, 'x')" % i for i in range(1000)) + ' '
+    assert len(statement) > SQL_CACHE_MAX_STATEMENT_LENGTH
+    parent = tracer.start_span(operation_name='parent')
+    with span_in_context(span=parent), \
+            patch('opentracing_instrumentation.client_hooks._dbapi2.'
+                  'sql_fingerprint') as fingerprint:
+        with db_span(statement, 'MySQLdb'):
+            pass
+        with db_span(statement.encode('utf-8'), 'MySQLdb'):
+            pass
+    fingerprint.assert_not_called()
+
+    for span in tracer.recorder.get_spans():
+        assert span.operation_name == 'MySQLdb:INSERT'
+        assert span.tags['sql'] == statement.strip()
+
+
+@pytest.mark.parametrize('statement,fingerprint', [
+    ('SELECT 1', 'SELECT ?'),
+    ('SELECT * FROM t1 WHERE x = 1.5', 'SELECT * FROM t1 WHERE x = ?'),
+    ("INSERT INTO t VALUES ('a', 'b''c', %s)",
+     'INSERT INTO t VALUES (?, ?, %s)'),
+    ('SELECT $1, $2 FROM t', 'SELECT $1, $2 FROM t'),
+    ('SELECT\n\tname\nFROM users', 'SELECT name FROM users'),
+])
+def test_sql_fingerprint(statement, fingerprint):
+    assert sql_fingerprint(statement) == fingerprint
+
+
+ROWS = [(i, 'name-%d' % i) for i in range(1000)]
+
+
+@pytest.mark.parametrize('policy,many,parameters,expected', [
+    ('all', True, ROWS, {'sql.params': ROWS}),
+    ('off', True, ROWS, {}),
+    ('count', True, ROWS, {'sql.params.rows': 1000,
+                           'sql.params.size': 1000 * (8 + 6)}),
+    ('first_rows', True, ROWS, {'sql.params.rows': 1000,
+                                'sql.params.size': 1000 * (8 + 6),
+                                'sql.params': ROWS[:10]}),
+    ('byte_budget', True, ROWS, {'sql.params.rows': 1000,
+                                 'sql.params.size': 1000 * (8 + 6),
+                                 'sql.params': ROWS[:10]}),
+    ('count', True, iter(ROWS), {}),
+    ('count', False, {'id': 1, 'name': 'x' * 10}, {'sql.params.size': 18}),
+    ('first_rows', False, (1, 'x'), {'sql.params.size': 9,
+                                     'sql.params': (1, 'x')}),
+    ('byte_budget', False, ('x' * 141, ), {'sql.params.size': 141}),
+])
+def test_sql_params_tags(monkeypatch, policy, many, parameters, expected):
+    # the first ten rows are 14 bytes each
+    monkeypatch.setattr(CONFIG, 'sql_params_max_bytes', 140)
+    assert sql_params_tags(parameters, many=many, policy=policy) == expected
+
+
+def test_sql_params_tags_invalid_policy():
+    with pytest.raises(ValueError):
+        sql_params_tags((1, ), policy='everything')
+
+
+def test_sql_params_tags_invalid_configured_policy(monkeypatch, caplog):
+    monkeypatch.setattr(CONFIG, 'sql_params_policy', 'everything')
+    monkeypatch.setattr(CONFIG, 'sql_executemany_params_policy', 'rows')
+    assert sql_params_tags((1, )) == {'sql.params': (1, )}
+    assert sql_params_tags(ROWS[:2], many=True) == {
+        'sql.params.rows': 2, 'sql.params.size': 2 * (8 + 6)}
+    assert sql_params_tags((2, )) == {'sql.params': (2, )}
+    warnings = [r for r in caplog.records if r.levelname == 'WARNING']
+    assert len(warnings) == 2
+
+
+def test_sql_params_tags_byte_budget_of_empty_rows():
+    rows = [(None, )] * 5000
+    tags = sql_params_tags(rows, many=True, policy='byte_budget')
+    assert tags['sql.params.rows'] == 5000
+    assert tags['sql.params.size'] == 0
+    assert tags['sql.params'] == rows[:1000]
+
+
+def test_executemany_params(tracer):
+    connection = sqlite3.connect(':memory:')
+    cursor = CursorWrapper(cursor=connection.cursor(), module_name='sqlite3')
+    cursor.execute('CREATE TABLE users (id INTEGER, name TEXT)')
+    parent = tracer.start_span(operation_name='parent')
+    with span_in_context(span=parent):
+        cursor.executemany('INSERT INTO users VALUES (?, ?)', ROWS)
+        cursor.execute('SELECT * FROM users WHERE id = ?', (1, ))
+
+    insert, select = tracer.recorder.get_spans()
+    assert insert.tags['sql.params.rows'] == 1000
+    assert insert.tags['sql.params.size'] == 1000 * (8 + 6)
+    assert 'sql.params' not in insert.tags
+    assert select.tags['sql.params'] == (1, )
+
+
 def test_singleton():
     data = [1]
 
@@ -6,7 +6,8 @@ import pytest
 from opentracing_instrumentation.client_hooks import install_all_patches
 
 
-HOOKS_WITH_PATCHERS = ('boto3', 'celery', 'mysqldb', 'sqlalchemy', 'requests')
+HOOKS_WITH_PATCHERS = ('aiopg', 'asyncpg', 'boto3', 'celery', 'mysqldb',
+                       'sqlalchemy', 'requests')
 
 
 @pytest.mark.skipif(os.environ.get('TEST_MISSING_MODULES_HANDLING') != '1',
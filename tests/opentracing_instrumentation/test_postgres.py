@@ -154,4 +154,7 @@ def test_execute_sql(tracer, engine, connection, method, query):
         getattr(cur, method)(query, params)
         last_span = tracer.recorder.get_spans()[-1]
         assert last_span.operation_name == 'psycopg2:SELECT'
-        assert last_span.tags['sql.params'] == params
+        if method == 'executemany':
+            assert last_span.tags['sql.params.rows'] == 1
+        else:
+            assert last_span.tags['sql.params'] == params
@@ -19,8 +19,10 @@
 # THE SOFTWARE.
 
 from builtins import object
+from collections import Counter
 import redis
 import random
+import threading
 
 import opentracing
 from opentracing.ext import tags
@@ -77,6 +79,7 @@ class StartSpan(object):
     def __call__(self, *args, **kwargs):
         self.kwargs = kwargs
         self.args = args
+        self.span.tags.update(kwargs.get('tags') or {})
         return self.span
 
 
@@ -151,3 +154,193 @@ def test_key_is_cleared(monkeypatch, client, key):
     span, start_span = spans(monkeypatch)
     client.echo('hello world')
     assert 'redis.key' not in span.tags
+
+
+@pytest.fixture()
+def fake_client():
+    fakeredis = pytest.importorskip('fakeredis')
+    return fakeredis.FakeStrictRedis()
+
+
+def test_pipeline(tracer, fake_client):
+    with fake_client.pipeline(transaction=False) as pipe:
+        pipe.set('foo', 'bar')
+        pipe.set(b'baz', 1)
+        pipe.get('foo')
+        assert pipe.execute() == [True, True, b'bar']
+
+    span, = tracer.recorder.get_spans()
+    assert span.operation_name == 'redis:pipeline'
+    assert span.tags[tags.SPAN_KIND] == tags.SPAN_KIND_RPC_CLIENT
+    assert span.tags[tags.PEER_SERVICE] == 'redis'
+    assert span.tags['redis.transaction'] is False
+    assert span.tags['redis.pipeline.length'] == 3
+    assert span.tags['redis.pipeline.commands'] == 'GET:1,SET:2'
+    # SET foo bar, SET baz 1, GET foo
+    assert span.tags['redis.pipeline.payload_size'] == 9 + 7 + 6
+
+
+def test_transaction(tracer, fake_client):
+    with fake_client.pipeline() as pipe:
+        pipe.incr('counter')
+        pipe.incr('counter')
+        assert pipe.execute() == [1, 2]
+
+    span, = tracer.recorder.get_spans()
+    assert span.operation_name == 'redis:transaction'
+    assert span.tags['redis.transaction'] is True
+    assert span.tags['redis.pipeline.commands'] == 'INCRBY:2'
+
+
+def test_watched_transaction(tracer, fake_client):
+    fake_client.set('counter', 1)
+    with fake_client.pipeline() as pipe:
+        pipe.watch('counter')
+        value = int(pipe.get('counter'))
+        pipe.multi()
+        pipe.set('counter', value + 1)
+        pipe.execute()
+    assert fake_client.get('counter') == b'2'
+
+    operation_names = [span.operation_name
+                       for span in tracer.recorder.get_spans()]
+    assert operation_names == [
+        'redis:SET', 'redis:WATCH', 'redis:GET', 'redis:transaction',
+        'redis:GET',
+    ]
+    span = tracer.recorder.get_spans()[3]
+    assert span.tags['redis.transaction'] is True
+    assert span.tags['redis.pipeline.length'] == 1
+
+
+def test_empty_pipeline(tracer, fake_client):
+    assert fake_client.pipeline().execute() == []
+    assert tracer.recorder.get_spans() == []
+
+
+def test_pipeline_error(tracer, fake_client):
+    fake_client.set('foo', 'bar')
+    with fake_client.pipeline(transaction=False) as pipe:
+        pipe.incr('foo')
+        with pytest.raises(redis.ResponseError):
+            pipe.execute()
+
+    span = tracer.recorder.get_spans()[-1]
+    assert span.operation_name == 'redis:pipeline'
+    assert span.tags['error'] is True
+
+
+@pytest.mark.parametrize('call,operation_name,expected_tags', [
+    (lambda c: c.get('foo'), 'redis:GET', {'redis.key': 'foo'}),
+    (lambda c: c.setex('foo', 60, VAL), 'redis:SETEX',
+     {'redis.key': 'foo', 'redis.ttl': 60}),
+    (lambda c: c.hset('hash', 'field', 1), 'redis:HSET',
+     {'redis.key': 'hash'}),
+    (lambda c: c.execute_command('lpush', 'list', 1), 'redis:lpush',
+     {'redis.key': 'list'}),
+    (lambda c: c.ping(), 'redis:PING', {}),
+])
+def test_command_tags(tracer, fake_client, call, operation_name,
+                      expected_tags):
+    call(fake_client)
+
+    span, = tracer.recorder.get_spans()
+    assert span.operation_name == operation_name
+    assert span.tags[tags.SPAN_KIND] == tags.SPAN_KIND_RPC_CLIENT
+    assert span.tags[tags.PEER_SERVICE] == 'redis'
+    command_tags = {key: value for key, value in span.tags.items()
+                    if key.startswith('redis.')}
+    assert command_tags == expected_tags
+
+
+def test_redis_client(tracer):
+    fakeredis = pytest.importorskip('fakeredis')
+    fakeredis.FakeRedis().get('foo')
+
+    span, = tracer.recorder.get_spans()
+    assert span.operation_name == 'redis:GET'
+    assert span.tags['redis.key'] == 'foo'
+
+
+def test_command_tags_key_position():
+    assert strict_redis.command_tags('BITOP', ('AND', 'dest', 'a')) == \
+        (('redis.key', 'dest'), )
+    assert strict_redis.command_tags('XINFO STREAM', ('stream', )) == \
+        (('redis.key', 'stream'), )
+    assert strict_redis.command_tags('GET', ()) == ()
+    assert strict_redis.command_tags('EVAL', ('return 1', 0)) == ()
+
+
+def test_concurrent_commands(thread_safe_tracer, fake_client):
+    def worker(i):
+        for _ in range(20):
+            fake_client.get('key-%d' % i)
+            fake_client.echo('hello')
+
+    threads = [threading.Thread(target=worker, args=(i, ))
+               for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    keys = Counter(span.tags.get('redis.key')
+                   for span in thread_safe_tracer.recorder.get_spans())
+    assert keys == Counter(dict([(None, 160)] + [
+        ('key-%d' % i, 20) for i in range(8)]))
+
+
+def test_peer_tags():
+    pool = redis.ConnectionPool(host='10.0.0.1', port=6380)
+    peer_tags = strict_redis.peer_tags(pool)
+    assert peer_tags == {
+        tags.SPAN_KIND: tags.SPAN_KIND_RPC_CLIENT,
+        tags.PEER_SERVICE: 'redis',
+        tags.PEER_HOST_IPV4: '10.0.0.1',
+        tags.PEER_PORT: 6380,
+    }
+    # computed once per pool
+    assert strict_redis.peer_tags(pool) is peer_tags
+    assert strict_redis.peer_tags(redis.ConnectionPool()) is not peer_tags
+
+
+def test_deprecated_client_peer_tags():
+    client = redis.StrictRedis(host='cache', port=6380)
+    with pytest.deprecated_call():
+        peer_tags = client.peer_tags()
+    assert peer_tags == [(tags.PEER_HOSTNAME, 'cache'),
+                         (tags.PEER_PORT, 6380)]
+
+
+def test_pipeline_tags_of_bytes_commands():
+    commands = [((b'GET', 'a'), {}), ((b'SET', 'a', 1), {}),
+                (('GET', 'b'), {})]
+    assert dict(strict_redis.pipeline_tags(commands))[
+        'redis.pipeline.commands'] == 'GET:2,SET:1'
+
+
+def test_peer_tags_unix_socket():
+    pool = redis.ConnectionPool(
+        connection_class=redis.UnixDomainSocketConnection,
+        path='/tmp/redis.sock')
+    peer_tags = strict_redis.peer_tags(pool)
+    assert peer_tags[tags.PEER_ADDRESS] == '/tmp/redis.sock'
+    assert tags.PEER_HOSTNAME not in peer_tags
+
+
+def test_peer_tags_sentinel():
+    from redis.sentinel import Sentinel, SentinelConnectionPool
+    pool = SentinelConnectionPool('mymaster', Sentinel([]))
+    peer_tags = strict_redis.peer_tags(pool)
+    assert peer_tags['redis.sentinel.service'] == 'mymaster'
+    assert peer_tags[tags.PEER_SERVICE] == 'redis'
+
+
+def test_span_tags_are_copied(tracer, fake_client):
+    fake_client.get('foo')
+    fake_client.ping()
+    get_span, ping_span = tracer.recorder.get_spans()
+    assert get_span.tags['redis.key'] == 'foo'
+    assert 'redis.key' not in ping_span.tags
+    assert 'redis.key' not in strict_redis.peer_tags(
+        fake_client.connection_pool)
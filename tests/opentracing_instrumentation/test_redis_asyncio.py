@@ -0,0 +1,143 @@
+# Copyright (c) 2016 Uber Technologies, Inc.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+# Python 3.6+ only, see collect_ignore in tests/conftest.py
+
+import asyncio
+
+import pytest
+from opentracing.ext import tags
+
+from opentracing_instrumentation import span_in_context
+from opentracing_instrumentation.client_hooks import strict_redis
+
+fakeredis_aioredis = pytest.importorskip('fakeredis.aioredis')
+
+pytestmark = pytest.mark.skipif(
+    strict_redis.redis_asyncio_client is None,
+    reason='redis.asyncio is not available')
+
+
+@pytest.fixture(autouse=True)
+def patch_redis():
+    strict_redis.install_patches()
+    try:
+        yield
+    finally:
+        strict_redis.reset_patches()
+
+
+def run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+def test_execute_command(contextvars_tracer):
+    async def get():
+        client = fakeredis_aioredis.FakeRedis()
+        await client.set('foo', 'bar')
+        return await client.get('foo')
+
+    assert run(get()) == b'bar'
+
+    set_span, get_span = contextvars_tracer.recorder.get_spans()
+    assert set_span.operation_name == 'redis:SET'
+    assert get_span.operation_name == 'redis:GET'
+    assert get_span.tags['redis.key'] == 'foo'
+    assert get_span.tags[tags.SPAN_KIND] == tags.SPAN_KIND_RPC_CLIENT
+    assert get_span.tags[tags.PEER_SERVICE] == 'redis'
+
+
+def test_parent_span_across_awaits(contextvars_tracer):
+    client = fakeredis_aioredis.FakeRedis()
+
+    async def handle_request(name):
+        parent = contextvars_tracer.start_span(operation_name=name)
+        with span_in_context(parent):
+            await asyncio.sleep(0)
+            await client.incr(name)
+        parent.finish()
+        return parent
+
+    async def handle_requests():
+        return await asyncio.gather(handle_request('first'),
+                                    handle_request('second'))
+
+    parents = run(handle_requests())
+
+    spans = [span for span in contextvars_tracer.recorder.get_spans()
+             if span.operation_name == 'redis:INCRBY']
+    assert len(spans) == 2
+    for parent in parents:
+        child, = [span for span in spans
+                  if span.tags['redis.key'] == parent.operation_name]
+        assert child.parent_id == parent.context.span_id
+
+
+def test_pipeline(contextvars_tracer):
+    async def execute():
+        client = fakeredis_aioredis.FakeRedis()
+        async with client.pipeline(transaction=False) as pipe:
+            pipe.set('foo', 'bar')
+            pipe.get('foo')
+            return await pipe.execute()
+
+    assert run(execute()) == [True, b'bar']
+
+    span, = contextvars_tracer.recorder.get_spans()
+    assert span.operation_name == 'redis:pipeline'
+    assert span.tags['redis.transaction'] is False
+    assert span.tags['redis.pipeline.commands'] == 'GET:1,SET:1'
+
+
+def test_watched_transaction(contextvars_tracer):
+    async def increment():
+        client = fakeredis_aioredis.FakeRedis()
+        await client.set('counter', 1)
+        async with client.pipeline() as pipe:
+            await pipe.watch('counter')
+            value = int(await pipe.get('counter'))
+            pipe.multi()
+            pipe.set('counter', value + 1)
+            await pipe.execute()
+        return await client.get('counter')
+
+    assert run(increment()) == b'2'
+
+    operation_names = [span.operation_name
+                       for span in contextvars_tracer.recorder.get_spans()]
+    assert operation_names == [
+        'redis:SET', 'redis:WATCH', 'redis:GET', 'redis:transaction',
+        'redis:GET',
+    ]
+
+
+def test_reset_patches():
+    redis_class = strict_redis.redis_asyncio_client.Redis
+    patched = redis_class.execute_command
+    strict_redis.reset_patches()
+    try:
+        assert redis_class.execute_command is not patched
+        assert not strict_redis.ORIG_ASYNC_METHODS
+    finally:
+        strict_redis.install_patches()
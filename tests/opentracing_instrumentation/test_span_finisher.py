@@ -0,0 +1,154 @@
+# Copyright (c) 2016 Uber Technologies, Inc.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+from __future__ import absolute_import
+
+import time
+
+import mock
+import pytest
+
+from opentracing_instrumentation import http_server, utils
+from opentracing_instrumentation.config import CONFIG
+from opentracing_instrumentation.span_finisher import (
+    BackgroundSpanFinisher,
+    DROP_NEWEST,
+    DROP_OLDEST,
+    FINISH_INLINE,
+)
+
+
+@pytest.fixture
+def finisher():
+    # spans are only finished by close() or flush() in these tests
+    finisher = BackgroundSpanFinisher(max_queue_size=2, flush_interval=60)
+    with mock.patch.object(CONFIG, 'span_finisher', finisher):
+        yield finisher
+    finisher.close()
+
+
+def test_start_child_span(tracer, finisher):
+    with utils.start_child_span('child', tags={'x': 'y'}) as span:
+        pass
+    assert span.duration == -1
+    assert finisher.close(timeout=5)
+
+    recorded_span, = tracer.recorder.get_spans()
+    assert recorded_span is span.__wrapped__
+    assert recorded_span.tags == {'x': 'y'}
+    assert recorded_span.duration >= 0
+    assert finisher.enqueued == finisher.finished == 1
+
+
+def test_before_request(tracer, finisher):
+    request = mock.MagicMock()
+    request.method = 'GET'
+    span = http_server.before_request(request=request)
+    span.finish()
+    assert finisher.flush(timeout=5)
+    assert tracer.recorder.get_spans() == [span.__wrapped__]
+
+
+def test_background_thread(tracer):
+    finisher = BackgroundSpanFinisher(flush_interval=0.001)
+    finisher.finish(tracer.start_span(operation_name='span'))
+    deadline = time.time() + 5
+    while not tracer.recorder.get_spans() and time.time() < deadline:
+        time.sleep(0.001)
+    assert finisher.finished == 1
+    finisher.close()
+
+
+def test_error_in_context_manager(tracer, finisher):
+    with pytest.raises(ValueError):
+        with utils.start_child_span('child'):
+            raise ValueError()
+    finisher.flush(timeout=5)
+    recorded_span, = tracer.recorder.get_spans()
+    assert recorded_span.tags['error'] is True
+
+
+@pytest.mark.parametrize('drop_policy,finished,dropped', [
+    (DROP_NEWEST, ['a', 'b'], 1),
+    (DROP_OLDEST, ['b', 'c'], 1),
+    (FINISH_INLINE, ['c', 'a', 'b'], 0),
+])
+def test_drop_policy(tracer, drop_policy, finished, dropped):
+    finisher = BackgroundSpanFinisher(max_queue_size=2,
+                                      drop_policy=drop_policy)
+    # keep the background thread from draining the queue
+    with mock.patch.object(finisher, '_start'):
+        for name in ('a', 'b', 'c'):
+            finisher.finish(tracer.start_span(operation_name=name))
+    finisher.close()
+
+    operations = [s.operation_name for s in tracer.recorder.get_spans()]
+    assert operations == finished
+    assert finisher.dropped == dropped
+    assert finisher.finished == len(finished)
+
+
+def test_finish_errors_are_counted():
+    finisher = BackgroundSpanFinisher()
+    span = mock.MagicMock()
+    span.finish.side_effect = RuntimeError()
+    finisher.finish(span, finish_time=123)
+    finisher.close(timeout=5)
+    span.finish.assert_called_once_with(finish_time=123)
+    assert finisher.errors == 1
+
+
+def test_finish_after_close(tracer):
+    finisher = BackgroundSpanFinisher()
+    finisher.close()
+    finisher.finish(tracer.start_span(operation_name='late'))
+    assert len(tracer.recorder.get_spans()) == 1
+
+
+def test_invalid_drop_policy():
+    with pytest.raises(ValueError):
+        BackgroundSpanFinisher(drop_policy='block')
+
+
+def test_chained_calls_are_deferred(tracer, finisher):
+    span = finisher.wrap(tracer.start_span(operation_name='span'))
+    assert span.set_tag('x', 'y').log_kv({'event': 'e'}) is span
+    span.set_operation_name('renamed').set_baggage_item('k', 'v').finish()
+    assert tracer.recorder.get_spans() == []
+    assert finisher.flush(timeout=5)
+
+    recorded_span, = tracer.recorder.get_spans()
+    assert recorded_span.operation_name == 'renamed'
+    assert recorded_span.tags == {'x': 'y'}
+    assert recorded_span.context.baggage == {'k': 'v'}
+
+
+def test_restarted_after_fork(tracer):
+    finisher = BackgroundSpanFinisher(flush_interval=60)
+    finisher.finish(tracer.start_span(operation_name='parent'))
+    thread = finisher._thread
+    with mock.patch('os.getpid', return_value=-1):
+        # what the fork hook or the pid check of the child process does
+        if not finisher._check_pid:
+            finisher._after_fork()
+        finisher.finish(tracer.start_span(operation_name='child'))
+    assert finisher._thread is not thread
+    assert finisher._thread.is_alive()
+    finisher.close(timeout=5)
+    assert finisher.finished == 2
@@ -0,0 +1,115 @@
+# Copyright (c) 2016 Uber Technologies, Inc.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+# Python 3.6+ only, see collect_ignore in tests/conftest.py
+
+import asyncio
+
+import pytest
+
+from opentracing_instrumentation import span_in_context
+from opentracing_instrumentation.client_hooks import \
+    sqlalchemy as sqlalchemy_hooks
+
+pytest.importorskip('aiosqlite')
+sqlalchemy_asyncio = pytest.importorskip('sqlalchemy.ext.asyncio')
+
+from sqlalchemy import text  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def patch_sqlalchemy():
+    sqlalchemy_hooks.install_patches()
+    try:
+        yield
+    finally:
+        sqlalchemy_hooks.reset_patches()
+
+
+@pytest.fixture(params=[True, False], ids=['gr_context', 'no_gr_context'])
+def gr_context(request, monkeypatch):
+    # without gr_context, the greenlets of SQLAlchemy do not share the
+    # contextvars of the awaiting task
+    from sqlalchemy.util import _concurrency_py3k
+    if not request.param:
+        monkeypatch.setattr(_concurrency_py3k, '_has_gr_context', False)
+    return request.param
+
+
+def run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+def test_parent_span_across_greenlets(contextvars_tracer, gr_context):
+    engine = sqlalchemy_asyncio.create_async_engine('sqlite+aiosqlite://')
+
+    async def handle_request(name):
+        parent = contextvars_tracer.start_span(operation_name=name)
+        with span_in_context(parent):
+            async with engine.connect() as connection:
+                await asyncio.sleep(0)
+                result = await connection.execute(text('SELECT 1'))
+                assert result.scalar() == 1
+        parent.finish()
+        return parent
+
+    async def main():
+        try:
+            return await asyncio.gather(
+                handle_request('first'), handle_request('second'))
+        finally:
+            await engine.dispose()
+
+    parents = run(main())
+
+    spans = [span for span in contextvars_tracer.recorder.get_spans()
+             if span.operation_name.startswith('SQL ')]
+    assert len(spans) == 2
+    for parent in parents:
+        children = [span for span in spans
+                    if span.parent_id == parent.context.span_id]
+        assert len(children) == 1
+        assert children[0].context.trace_id == parent.context.trace_id
+
+
+def test_no_parent_span(contextvars_tracer):
+    engine = sqlalchemy_asyncio.create_async_engine('sqlite+aiosqlite://')
+
+    async def query():
+        try:
+            async with engine.connect() as connection:
+                await connection.execute(text('SELECT 1'))
+        finally:
+            await engine.dispose()
+
+    run(query())
+    for span in contextvars_tracer.recorder.get_spans():
+        assert span.parent_id is None
+
+
+def test_without_contextvars(contextvars_tracer, monkeypatch):
+    from opentracing_instrumentation.client_hooks import _sqlalchemy_async
+    assert _sqlalchemy_async._carries_span()
+    monkeypatch.setattr(_sqlalchemy_async, 'ContextVarsScopeManager', None)
+    assert not _sqlalchemy_async._carries_span()
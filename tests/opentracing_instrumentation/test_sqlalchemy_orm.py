@@ -0,0 +1,186 @@
+# Copyright (c) 2016 Uber Technologies, Inc.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import pytest
+from sqlalchemy import Column, ForeignKey, Integer, String, create_engine
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import joinedload, relationship, selectinload
+from sqlalchemy.orm import sessionmaker, subqueryload
+
+from opentracing_instrumentation import span_in_context
+from opentracing_instrumentation.client_hooks import sqlalchemy_orm
+
+Base = declarative_base()
+
+
+class Author(Base):
+    __tablename__ = 'author'
+    id = Column(Integer, primary_key=True)
+    name = Column(String(50))
+    books = relationship('Book', back_populates='author')
+
+
+class Book(Base):
+    __tablename__ = 'book'
+    id = Column(Integer, primary_key=True)
+    title = Column(String(50))
+    author_id = Column(Integer, ForeignKey('author.id'))
+    author = relationship('Author', back_populates='books')
+
+
+@pytest.fixture(autouse=True)
+def patch_sqlalchemy_orm():
+    sqlalchemy_orm.install_patches()
+    try:
+        yield
+    finally:
+        sqlalchemy_orm.reset_patches()
+
+
+@pytest.fixture
+def session():
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def parent_span(tracer):
+    span = tracer.start_span(operation_name='parent')
+    with span_in_context(span):
+        yield span
+
+
+def orm_spans(tracer):
+    return [span for span in tracer.recorder.get_spans()
+            if span.operation_name.startswith('sqlalchemy:')]
+
+
+def test_commit_and_flush(tracer, parent_span, session):
+    session.add_all([Author(name='a'), Author(name='b')])
+    session.commit()
+
+    flush, commit = orm_spans(tracer)
+    assert flush.operation_name == 'sqlalchemy:flush'
+    assert flush.parent_id == commit.context.span_id
+    assert commit.parent_id == parent_span.context.span_id
+    # two INSERTs in the flush, and BEGIN is implicit in sqlite3
+    assert flush.tags['sqlalchemy.statements'] == 2
+    assert flush.tags['sqlalchemy.rows'] == 2
+    assert commit.tags['sqlalchemy.statements'] == 2
+    assert commit.tags['sqlalchemy.rows'] == 2
+
+
+def test_clean_flush_is_not_traced(tracer, parent_span, session):
+    session.query(Author).all()
+    session.flush()
+    assert orm_spans(tracer) == []
+
+
+def add_authors(session):
+    for name in ('a', 'b', 'c'):
+        session.add(Author(name=name, books=[Book(title=name + '1'),
+                                              Book(title=name + '2')]))
+    session.commit()
+    session.expunge_all()
+
+
+def test_lazy_loads(tracer, session):
+    add_authors(session)
+
+    parent = tracer.start_span(operation_name='parent')
+    with span_in_context(parent):
+        authors = session.query(Author).order_by(Author.id).all()
+        assert [len(author.books) for author in authors] == [2, 2, 2]
+
+    lazy_loads = orm_spans(tracer)
+    assert len(lazy_loads) == 3
+    for span in lazy_loads:
+        assert span.operation_name == 'sqlalchemy:lazyload'
+        assert span.parent_id == parent.context.span_id
+        assert span.tags['sqlalchemy.relationship'] == 'Author.books'
+        assert span.tags['sqlalchemy.statements'] == 1
+        assert span.tags['sqlalchemy.rows'] == 2
+
+
+@pytest.mark.parametrize('option,operation_name,relationship', [
+    (selectinload, 'sqlalchemy:selectinload', 'Author.books'),
+    (subqueryload, 'sqlalchemy:subqueryload', None),
+])
+def test_eager_loads(tracer, session, option, operation_name,
+                     relationship):
+    add_authors(session)
+
+    parent = tracer.start_span(operation_name='parent')
+    with span_in_context(parent):
+        authors = session.query(Author).options(option(Author.books)).all()
+        assert [len(author.books) for author in authors] == [2, 2, 2]
+
+    span, = orm_spans(tracer)
+    assert span.operation_name == operation_name
+    assert span.parent_id == parent.context.span_id
+    assert span.tags.get('sqlalchemy.relationship') == relationship
+    assert span.tags['sqlalchemy.statements'] == 1
+    assert span.tags['sqlalchemy.rows'] == 6
+
+
+def test_joined_loads_are_not_traced(tracer, session):
+    add_authors(session)
+
+    parent = tracer.start_span(operation_name='parent')
+    with span_in_context(parent):
+        authors = session.query(Author).options(
+            joinedload(Author.books)).all()
+        assert [len(author.books) for author in authors] == [2, 2, 2]
+    assert orm_spans(tracer) == []
+
+
+def test_without_parent(tracer, session):
+    session.add(Author(name='a'))
+    session.commit()
+    assert orm_spans(tracer) == []
+
+
+def test_failed_commit(tracer, parent_span, session):
+    session.add_all([Author(id=1, name='a'), Author(id=1, name='b')])
+    with pytest.raises(Exception):
+        session.commit()
+
+    flush, commit = orm_spans(tracer)
+    assert flush.tags['error'] is True
+    assert commit.tags['error'] is True
+    assert sqlalchemy_orm._get_operation() is None
+
+
+def test_missing_loader_method_is_skipped():
+    from sqlalchemy.orm.strategies import LazyLoader
+
+    class RenamedLoader(LazyLoader):
+        pass
+
+    patcher = sqlalchemy_orm.patcher
+    patcher._patch(RenamedLoader, '_load_for_state', 'sqlalchemy:lazyload',
+                   sqlalchemy_orm._relationship_tags)
+    assert (RenamedLoader, '_load_for_state') not in patcher.original_methods
+    assert '_load_for_state' not in RenamedLoader.__dict__
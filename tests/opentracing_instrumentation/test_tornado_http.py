@@ -40,7 +40,8 @@ from opentracing_instrumentation.http_server import (
     TornadoRequestWrapper,
     before_request
 )
-from opentracing_instrumentation.interceptors import OpenTracingInterceptor
+from opentracing_instrumentation.interceptors import (
+    ClientInterceptors, OpenTracingInterceptor)
 
 
 class Handler(tornado.web.RequestHandler):
@@ -115,10 +116,10 @@ def test_http_fetch_with_interceptor(base_url, http_client, tornado_http_patch,
         span = tracer.start_span('test')
         trace_id = '{:x}'.format(span.context.trace_id)
 
-        with patch('opentracing_instrumentation.http_client.ClientInterceptors') as MockClientInterceptors:
-            mock_interceptor = Mock(spec=OpenTracingInterceptor)
-            MockClientInterceptors.get_interceptors.return_value = [mock_interceptor]
-
+        mock_interceptor = Mock(spec=OpenTracingInterceptor, hosts=None,
+                                url_pattern=None, path_pattern=None)
+        ClientInterceptors.append(mock_interceptor)
+        try:
             with span_in_stack_context(span):
                 response = make_downstream_call()
             response = yield response  # cannot yield when in StackContext context
@@ -127,6 +128,8 @@ def test_http_fetch_with_interceptor(base_url, http_client, tornado_http_patch,
             assert mock_interceptor.process.call_args_list[0][1]['span'].tracer == tracer
 
             span.finish()
+        finally:
+            ClientInterceptors.clear()
 
     assert response.code == 200
     assert response.body.decode('utf-8') == trace_id
@@ -0,0 +1,216 @@
+# Copyright (c) 2016 Uber Technologies, Inc.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+# Python 3.6+ only, see collect_ignore in tests/conftest.py
+
+import asyncio
+
+import pytest
+
+from opentracing_instrumentation import get_current_span, span_in_context
+from opentracing_instrumentation import traced_function
+
+
+def run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+def extract_call_site_tag(span, *_, **kwargs):
+    if 'call_site_tag' in kwargs:
+        span.set_tag('call_site_tag', kwargs['call_site_tag'])
+
+
+@traced_function(on_start=extract_call_site_tag)
+async def coroutine(delay, call_site_tag=None):
+    current = get_current_span()
+    await asyncio.sleep(delay)
+    assert get_current_span() is current
+    return current
+
+
+@traced_function
+async def failing_coroutine():
+    await asyncio.sleep(0)
+    raise ValueError('boom')
+
+
+@traced_function(require_active_trace=True)
+async def coroutine_require_active_trace():
+    return get_current_span()
+
+
+@traced_function(name='numbers')
+async def async_generator(count):
+    for i in range(count):
+        await asyncio.sleep(0)
+        yield i, get_current_span()
+
+
+@traced_function
+async def echo():
+    received = None
+    while True:
+        try:
+            received = yield received, get_current_span()
+        except KeyError as e:
+            received = 'caught %s' % e
+
+
+def test_coroutine(contextvars_tracer):
+    async def main():
+        parent = contextvars_tracer.start_span('parent')
+        with span_in_context(parent):
+            return parent, await coroutine(0.01, call_site_tag='tag')
+
+    parent, current = run(main())
+    span, = contextvars_tracer.recorder.get_spans()
+    assert span is current
+    assert span.operation_name == 'coroutine'
+    assert span.parent_id == parent.context.span_id
+    assert span.tags == {'call_site_tag': 'tag'}
+    # the span covers the awaited time, not just the coroutine creation
+    assert span.duration >= 0.01
+
+
+def test_concurrent_tasks(contextvars_tracer):
+    async def main():
+        parent = contextvars_tracer.start_span('parent')
+        with span_in_context(parent):
+            return await asyncio.gather(coroutine(0.02), coroutine(0.01))
+
+    first, second = run(main())
+    assert first is not second
+    assert len(contextvars_tracer.recorder.get_spans()) == 2
+
+
+def test_failing_coroutine(contextvars_tracer):
+    with pytest.raises(ValueError):
+        run(failing_coroutine())
+    span, = contextvars_tracer.recorder.get_spans()
+    assert span.tags == {'error': 'true'}
+    assert get_current_span() is None
+
+
+def test_coroutine_require_active_trace(contextvars_tracer):
+    assert run(coroutine_require_active_trace()) is None
+    assert contextvars_tracer.recorder.get_spans() == []
+
+
+def test_async_generator(contextvars_tracer):
+    async def main():
+        items = []
+        async for i, current in async_generator(3):
+            # the span is not current while the caller consumes items
+            assert get_current_span() is None
+            items.append((i, current))
+        return items
+
+    items = run(main())
+    span, = contextvars_tracer.recorder.get_spans()
+    assert span.operation_name == 'numbers'
+    assert items == [(0, span), (1, span), (2, span)]
+
+
+def test_async_generator_closed_early(contextvars_tracer):
+    async def main():
+        agen = async_generator(10)
+        async for i, _ in agen:
+            break
+        await agen.aclose()
+
+    run(main())
+    assert len(contextvars_tracer.recorder.get_spans()) == 1
+
+
+def test_async_generator_asend(contextvars_tracer):
+    async def main():
+        agen = echo()
+        await agen.asend(None)
+        received, current = await agen.asend(5)
+        await agen.aclose()
+        return received, current
+
+    received, current = run(main())
+    span, = contextvars_tracer.recorder.get_spans()
+    assert received == 5
+    assert current is span
+
+
+def test_async_generator_athrow(contextvars_tracer):
+    async def main():
+        agen = echo()
+        await agen.asend(None)
+        received, _ = await agen.athrow(KeyError('x'))
+        assert received == "caught 'x'"
+        with pytest.raises(ValueError):
+            await agen.athrow(ValueError('boom'))
+
+    run(main())
+    span, = contextvars_tracer.recorder.get_spans()
+    assert span.tags == {'error': 'true'}
+
+
+def test_async_generator_asend_require_active_trace(contextvars_tracer):
+    @traced_function(require_active_trace=True)
+    async def untraced_echo():
+        received = None
+        while True:
+            received = yield received
+
+    async def main():
+        agen = untraced_echo()
+        await agen.asend(None)
+        received = await agen.asend(5)
+        await agen.aclose()
+        return received
+
+    assert run(main()) == 5
+    assert contextvars_tracer.recorder.get_spans() == []
+
+
+def test_task_returned_by_regular_function(contextvars_tracer):
+    @traced_function
+    def schedule(loop):
+        return loop.create_task(asyncio.sleep(0.01))
+
+    loop = asyncio.new_event_loop()
+    try:
+        task = schedule(loop)
+        assert contextvars_tracer.recorder.get_spans() == []
+        loop.run_until_complete(task)
+    finally:
+        loop.close()
+    span, = contextvars_tracer.recorder.get_spans()
+    assert span.duration >= 0.01
+
+
+def test_current_span_without_private_contextvar(contextvars_tracer,
+                                                  monkeypatch):
+    from opentracing_instrumentation import request_context
+    monkeypatch.setattr(request_context, '_SCOPE', None)
+
+    span = contextvars_tracer.start_span('parent')
+    with span_in_context(span):
+        assert get_current_span() is span
+    assert get_current_span() is None
@@ -29,6 +29,8 @@ from opentracing.mocktracer import MockTracer
 from opentracing.scope_managers.tornado import TornadoScopeManager
 from opentracing.scope_managers import ThreadLocalScopeManager
 
+import tornado.concurrent
+import tornado.ioloop
 import tornado.stack_context
 from tornado.concurrent import is_future
 from tornado import gen
@@ -242,6 +244,54 @@ class TracedRegularFunctionDecoratorTest(PrepareMixin, unittest.TestCase):
             assert tracer.scope_manager.active is scope
 
 
+    def test_require_active_trace_with_parent(self):
+        tracer = opentracing.tracer
+
+        parent = tracer.start_span('hello')
+        with tracer.scope_manager.activate(parent, True):
+            r = self.client.regular_require_active_trace(123)
+            assert r == 'oh yeah'
+        span, _ = tracer.finished_spans()
+        assert span.operation_name == 'regular_require_active_trace'
+        assert span.parent_id == parent.context.span_id
+
+    def test_non_callable_start_hook_is_ignored(self):
+        @traced_function(on_start='not callable')
+        def func():
+            return 'oh yeah'
+
+        assert func() == 'oh yeah'
+        span, = opentracing.tracer.finished_spans()
+        assert span.tags == {}
+
+    def test_coroutine_without_stack_context(self):
+        tracer = opentracing.tracer
+
+        parent = tracer.start_span('hello')
+        with tracer.scope_manager.activate(parent, True):
+            future = self.client.coro(123)
+        assert future.result() == 'oh yeah'
+        span, _ = tracer.finished_spans()
+        assert span.operation_name == 'coro'
+        assert span.parent_id == parent.context.span_id
+
+    def test_future_returned_by_regular_function(self):
+        future = tornado.concurrent.Future()
+
+        @traced_function
+        def func():
+            return future
+
+        assert func() is future
+        # the span lasts until the future is done
+        assert opentracing.tracer.finished_spans() == []
+        future.set_result('oh yeah')
+        # run the done callbacks
+        tornado.ioloop.IOLoop.current().run_sync(lambda: future)
+        span, = opentracing.tracer.finished_spans()
+        assert span.operation_name == 'func'
+
+
 class TracedCoroFunctionDecoratorTest(PrepareMixin, AsyncTestCase):
 
     scope_manager = TornadoScopeManager
@@ -0,0 +1,204 @@
+# Copyright (c) 2016 Uber Technologies, Inc.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+from __future__ import absolute_import
+
+import mock
+import opentracing
+from basictracer import BasicTracer
+
+from opentracing_instrumentation import span_in_context, utils
+from opentracing_instrumentation.client_hooks._dbapi2 import db_span
+from opentracing_instrumentation import http_client
+from opentracing_instrumentation.http_client import before_http_request
+
+
+def _unsampled_span(tracer):
+    span = tracer.start_span(operation_name='parent')
+    span.context.sampled = False
+    return span
+
+
+def test_is_unsampled(tracer):
+    assert not utils.is_unsampled(None)
+    assert not utils.is_unsampled(tracer.start_span(operation_name='x'))
+    assert utils.is_unsampled(_unsampled_span(tracer))
+
+    jaeger_like_span = mock.MagicMock()
+    jaeger_like_span.is_sampled.return_value = False
+    assert utils.is_unsampled(jaeger_like_span)
+    jaeger_like_span.is_sampled.return_value = True
+    assert not utils.is_unsampled(jaeger_like_span)
+
+    # tracers without a sampling decision are treated as sampled
+    noop_span = opentracing.Tracer().start_span(operation_name='x')
+    assert not utils.is_unsampled(noop_span)
+
+
+def test_start_child_span_of_sampled_parent(tracer):
+    parent = tracer.start_span(operation_name='parent')
+    child = utils.start_child_span('child', parent=parent)
+    assert child.context.trace_id == parent.context.trace_id
+    assert not utils.is_unsampled(child)
+
+
+def test_start_child_span_of_unsampled_parent(tracer):
+    parent = _unsampled_span(tracer)
+    with mock.patch.object(tracer, 'start_span') as start_span:
+        child = utils.start_child_span('child', parent=parent,
+                                       tags={'x': 'y'})
+        grandchild = utils.start_child_span('grandchild', parent=child)
+    start_span.assert_not_called()
+    assert child.context is parent.context
+    assert grandchild.context is parent.context
+    assert utils.is_unsampled(child)
+    assert utils.is_unsampled(grandchild)
+
+    child.set_tag('a', 'b')
+    child.finish()
+    assert tracer.recorder.get_spans() == []
+
+
+def test_baggage_of_unsampled_span(tracer):
+    parent = _unsampled_span(tracer)
+    parent.set_baggage_item('user', 'alice')
+    child = utils.start_child_span('child', parent=parent)
+    grandchild = utils.start_child_span('grandchild', parent=child)
+    assert grandchild.set_baggage_item('request', 'r1') is grandchild
+
+    assert grandchild.get_baggage_item('user') == 'alice'
+    assert grandchild.get_baggage_item('request') == 'r1'
+    assert child.get_baggage_item('request') is None
+    assert grandchild.context.sampled is False
+    headers = {}
+    tracer.inject(grandchild.context, opentracing.Format.HTTP_HEADERS,
+                  headers)
+    ctx = tracer.extract(opentracing.Format.HTTP_HEADERS, headers)
+    assert ctx.baggage == {'user': 'alice', 'request': 'r1'}
+
+    # contexts without with_baggage_item() cannot carry the baggage
+    noop_child = utils._UnsampledSpan(tracer=tracer,
+                                      context=opentracing.SpanContext())
+    noop_child.set_baggage_item('request', 'r1')
+    assert noop_child.get_baggage_item('request') is None
+
+
+def test_db_span_of_unsampled_parent(tracer):
+    parent = _unsampled_span(tracer)
+    with span_in_context(parent):
+        with db_span('select * from X', 'MySQLdb') as span:
+            assert utils.is_unsampled(span)
+    assert tracer.recorder.get_spans() == []
+
+
+def test_before_http_request_of_unsampled_parent(tracer):
+    parent = _unsampled_span(tracer)
+    headers = {}
+    request = mock.MagicMock(header_carrier=headers)
+    span = before_http_request(request=request,
+                               current_span_extractor=lambda: parent)
+    assert utils.is_unsampled(span)
+    ctx = tracer.extract(opentracing.Format.HTTP_HEADERS, headers)
+    assert ctx.trace_id == parent.context.trace_id
+    assert ctx.sampled is False
+
+
+class _RequestWrapper(http_client.AbstractRequestWrapper):
+    def __init__(self):
+        self.headers = []
+
+    def add_header(self, key, value):
+        self.headers.append((key, value))
+
+
+def test_inject_headers_with_add_headers(tracer):
+    span = tracer.start_span(operation_name='request')
+    request = _RequestWrapper()
+    http_client.inject_headers(span, request)
+    ctx = tracer.extract(opentracing.Format.HTTP_HEADERS,
+                         dict(request.headers))
+    assert ctx.trace_id == span.context.trace_id
+
+
+def test_inject_headers_of_propagator_registered_later():
+    tracer = BasicTracer()
+    span = tracer.start_span(operation_name='request')
+    with mock.patch.object(opentracing, 'tracer', tracer):
+        request = _RequestWrapper()
+        http_client.inject_headers(span, request)
+        assert request.headers == []
+
+        tracer.register_required_propagators()
+        request = _RequestWrapper()
+        http_client.inject_headers(span, request)
+        ctx = tracer.extract(opentracing.Format.HTTP_HEADERS,
+                             dict(request.headers))
+        assert ctx.trace_id == span.context.trace_id
+
+        propagator = mock.Mock()
+        tracer.register_propagator(opentracing.Format.HTTP_HEADERS,
+                                   propagator)
+        http_client.inject_headers(span, _RequestWrapper())
+        propagator.inject.assert_called_once_with(span.context, {})
+
+
+def test_inject_headers_of_unsupported_format():
+    tracer = mock.MagicMock()
+    tracer.inject.side_effect = opentracing.UnsupportedFormatException
+    span = mock.MagicMock()
+    with mock.patch.object(opentracing, 'tracer', tracer):
+        for _ in range(2):
+            request = _RequestWrapper()
+            http_client.inject_headers(span, request)
+            assert request.headers == []
+    # the format may be supported later, e.g. by a tracer's plugin
+    assert tracer.inject.call_count == 2
+
+
+class _DictTracer(opentracing.Tracer):
+    """A tracer that is neither no-op nor a BasicTracer."""
+
+    def inject(self, span_context, format, carrier):
+        if format != opentracing.Format.HTTP_HEADERS:
+            raise opentracing.UnsupportedFormatException(format)
+        carrier['trace-id'] = 'abc'
+
+
+def test_inject_headers_of_custom_tracer():
+    tracer = _DictTracer()
+    span = tracer.start_span('request')
+    with mock.patch.object(opentracing, 'tracer', tracer):
+        request = _RequestWrapper()
+        http_client.inject_headers(span, request)
+        assert request.headers == [('trace-id', 'abc')]
+
+        headers = {}
+        request = mock.MagicMock(header_carrier=headers)
+        http_client.inject_headers(span, request)
+        assert headers == {'trace-id': 'abc'}
+
+
+def test_inject_headers_of_noop_tracer():
+    tracer = opentracing.Tracer()
+    request = _RequestWrapper()
+    with mock.patch.object(tracer, 'inject') as inject, \
+            mock.patch.object(opentracing, 'tracer', tracer):
+        http_client.inject_headers(tracer.start_span('request'), request)
+    inject.assert_not_called()
+    assert request.headers == []
@@ -20,7 +20,11 @@
 
 from __future__ import absolute_import
 import mock
+import pytest
+from opentracing_instrumentation import config
+from opentracing_instrumentation.http_server import AbstractRequestWrapper
 from opentracing_instrumentation.http_server import WSGIRequestWrapper
+from opentracing_instrumentation.http_server import _extract_carrier
 
 
 def test_creates_instance():
@@ -91,16 +95,53 @@ def test_url():
         'https://bender.com/Farnsworth/PlanetExpress?Bender=antiquing'
 
 
+def test_url_is_not_shared_between_servers():
+    environ = {
+        'wsgi.url_scheme': 'http',
+        'SERVER_NAME': 'bender.com',
+        'SERVER_PORT': '8888',
+        'PATH_INFO': '/Planet Express',
+    }
+    for _ in range(2):
+        request = WSGIRequestWrapper.from_wsgi_environ(environ)
+        assert request.full_url == 'http://bender.com:8888/Planet%20Express'
+
+    request = WSGIRequestWrapper.from_wsgi_environ(
+        dict(environ, HTTP_HOST='fry.com'))
+    assert request.full_url == 'http://fry.com/Planet%20Express'
+    request = WSGIRequestWrapper.from_wsgi_environ(
+        dict(environ, SCRIPT_NAME='/api'))
+    assert request.full_url == \
+        'http://bender.com:8888/api/Planet%20Express'
+
+
+def test_path():
+    environ = {
+        'wsgi.url_scheme': 'http',
+        'SERVER_NAME': 'bender.com',
+        'SERVER_PORT': '8888',
+        'SCRIPT_NAME': '/api',
+        'PATH_INFO': '/Planet Express',
+    }
+    request = WSGIRequestWrapper.from_wsgi_environ(environ)
+    assert request.path == '/api/Planet Express'
+    # the generic implementation agrees
+    assert AbstractRequestWrapper.path.fget(request) == request.path
+
+
 def test_caller():
     environ = {
         'HTTP_Custom-Caller-Header': 'Zapp',
     }
-    from opentracing_instrumentation import config
 
     with mock.patch.object(config.CONFIG, 'caller_name_headers',
                            ['XXX', 'Custom-Caller-Header']):
         request = WSGIRequestWrapper.from_wsgi_environ(environ)
-        assert request.caller_name == 'Zapp'
+        assert request.caller_name is None
+        with mock.patch.object(config.CONFIG, 'wsgi_irregular_headers',
+                               True):
+            request = WSGIRequestWrapper.from_wsgi_environ(environ)
+            assert request.caller_name == 'Zapp'
 
     environ['HTTP_XXX'] = 'DOOP'
     with mock.patch.object(config.CONFIG, 'caller_name_headers',
@@ -108,3 +149,56 @@ def test_caller():
         request = WSGIRequestWrapper.from_wsgi_environ(environ)
         # header XXX is earlier in the list ==> higher priority
         assert request.caller_name == 'DOOP'
+
+
+def test_headers_view():
+    environ = {
+        'HTTP_X_FOO': 'bar',
+        'HTTP_Custom-Caller-Header': 'Zapp',
+        'HTTP_UBERCTX_KEY': 'value',
+        'CONTENT_TYPE': 'text/plain',
+    }
+    request = WSGIRequestWrapper.from_wsgi_environ(environ)
+    headers = request.headers
+
+    assert headers['x-foo'] == 'bar'
+    assert headers['X-Foo'] == 'bar'
+    # keys that are not normalized are only seen by iteration
+    assert headers.get('custom-caller-header') is None
+    assert headers.get('content-type') is None
+    assert 'x-bar' not in headers
+    assert headers._headers is None  # nothing materialized so far
+
+    assert dict(headers) == WSGIRequestWrapper._parse_wsgi_headers(environ)
+    assert headers['custom-caller-header'] == 'Zapp'
+
+    headers = WSGIRequestWrapper.from_wsgi_environ(environ).headers
+    with mock.patch.object(config.CONFIG, 'wsgi_irregular_headers', True):
+        assert headers.get('custom-caller-header') == 'Zapp'
+        assert headers.get('content-type') is None
+    assert headers._headers is None
+    assert len(headers) == 3
+    assert list(headers.iter_prefixed(('uberctx-', ))) == \
+        [('uberctx-key', 'value')]
+
+
+@pytest.mark.parametrize('names,prefixes,expected', [
+    ([], (), {'uber-trace-id': '1:2:0:1', 'uberctx-key': 'value',
+              'cookie': 'a=b'}),
+    (['uber-trace-id'], (), {'uber-trace-id': '1:2:0:1'}),
+    (['uber-trace-id', 'jaeger-debug-id'], ['uberctx-'],
+     {'uber-trace-id': '1:2:0:1', 'uberctx-key': 'value'}),
+])
+def test_propagation_headers(names, prefixes, expected):
+    environ = {
+        'HTTP_UBER_TRACE_ID': '1:2:0:1',
+        'HTTP_UBERCTX_KEY': 'value',
+        'HTTP_COOKIE': 'a=b',
+    }
+    request = WSGIRequestWrapper.from_wsgi_environ(environ)
+    with mock.patch.object(config.CONFIG, 'propagation_headers', names), \
+            mock.patch.object(config.CONFIG, 'propagation_header_prefixes',
+                              prefixes):
+        assert _extract_carrier(request.headers) == expected
+        # other header containers go through the generic code path
+        assert _extract_carrier(dict(request.headers)) == expected